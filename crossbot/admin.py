@@ -119,3 +119,10 @@ class CommonTimeAdminTemplate(admin.ModelAdmin):
 
 
 admin.site.register(models.QueryShorthand)
+admin.site.register(models.OutboxMessage)
+admin.site.register(models.ParticipationStreak)
+admin.site.register(models.ResultsSummary)
+admin.site.register(models.DataVersion)
+admin.site.register(models.UserStats)
+admin.site.register(models.PersonalBest)
+admin.site.register(models.TimeRollup)
@@ -1,10 +1,19 @@
 from django_cron import CronJobBase, Schedule
+from django.core.cache import cache
 from django.utils import timezone
 
+import time
+
 from datetime import timedelta
 
-from crossbot.models import MiniCrosswordTime
+from crossbot.models import (MiniCrosswordTime, TIME_MODELS, TimeRollup,
+                             UserStats)
+from crossbot.plotcache import PLOT_CACHE
+from crossbot.slack import outbox
 from crossbot.slack.api import post_message
+from crossbot.slack.parser import date as parse_date
+from crossbot.settings import (USER_STATS_BUDGET_SECONDS,
+                               USER_STATS_CHUNK_SIZE)
 
 import logging
 
@@ -25,8 +34,8 @@ class ReleaseAnnouncement(CronJobBase):
         msgs = ['Good evening crossworders!']
         msgs += [
             '{u} is on a {n}-day streak! {emoji}'.format(
-                u=u, n=len(streak), emoji=':fire:' * len(streak))
-            for u, streak in announce_data['streaks']
+                u=u, n=n, emoji=':fire:' * n)
+            for u, n in announce_data['streaks']
         ]
 
         # now add the other winners
@@ -65,8 +74,8 @@ class MorningAnnouncement(CronJobBase):
 
         msgs += [
             '{u} is currently on a {n}-day streak! {emoji}'.format(
-                u=u, n=len(streak), emoji=':fire:' * len(streak))
-            for u, streak in announce_data['streaks']
+                u=u, n=n, emoji=':fire:' * n)
+            for u, n in announce_data['streaks']
         ]
 
         # now add the other winners
@@ -91,3 +100,120 @@ class MorningAnnouncement(CronJobBase):
         channel = 'C58PXJTNU'
         response = post_message(channel, text=message)
         return "Ran morning announcement at {}\n{}".format(now, message)
+
+
+class DrainOutbox(CronJobBase):
+    """Deliver queued Slack messages that no worker has gotten to."""
+    schedule = Schedule(run_every_mins=1)
+    code = 'crossbot.drain_outbox'
+
+    def do(self):
+        return "Delivered {} outbox messages".format(outbox.drain())
+
+
+class RollUserStats(CronJobBase):
+    """Keep everyone's leaderboard stats up to date.
+
+    Once there's a new puzzle, everyone's stats are recomputed as of today,
+    which moves the windows along and picks up any edits made in the admin.
+    In between, the users CBUser.add_time and remove_time queued are. Users
+    are done a chunk at a time (see UserStats.rebuild), so /add never waits
+    long behind it. Once the budget is used up the job stops, and the next run
+    picks up the users whose stats are still queued or not as of today.
+    """
+    schedule = Schedule(run_every_mins=1)
+    code = 'crossbot.roll_user_stats'
+
+    # the date each game was last rolled all the way to, by game
+    ROLLED_KEY = 'crossbot.roll_user_stats.rolled'
+
+    def do(self,
+           budget=USER_STATS_BUDGET_SECONDS,
+           chunk_size=USER_STATS_CHUNK_SIZE):
+        start = time.monotonic()
+        today = parse_date('now')
+        rolled = cache.get(self.ROLLED_KEY) or {}
+
+        done = 0
+        for i, time_model in enumerate(TIME_MODELS):
+            game_start = time.monotonic()
+            # a game nobody has played has no stats, so it's checked every
+            # time, but that's cheap
+            rolling = (rolled.get(time_model.game) != today
+                       or not UserStats.as_of_date(time_model))
+            users = self.users(time_model, today if rolling else None)
+            if not users and not rolling:
+                continue
+
+            for chunk_start in range(0, len(users), chunk_size):
+                elapsed = time.monotonic() - start
+                if elapsed > budget:
+                    logger.warning('out of time after %.1fs, %d %s users left',
+                                   elapsed,
+                                   len(users) - chunk_start, time_model.game)
+                    return ("Recomputed stats for {} users, out of time at "
+                            "{}".format(done, time_model.game))
+
+                chunk = users[chunk_start:chunk_start + chunk_size]
+                UserStats.rebuild(time_model, today, chunk)
+                done += len(chunk)
+
+            rolled[time_model.game] = today
+            cache.set(self.ROLLED_KEY, rolled, None)
+            logger.info('recomputed %s stats for %d users (%d/%d) in %.1fs',
+                        time_model.game, len(users), i + 1, len(TIME_MODELS),
+                        time.monotonic() - game_start)
+
+        return "Stats as of {}, recomputed {} users in {:.1f}s".format(
+            today, done,
+            time.monotonic() - start)
+
+    @staticmethod
+    def users(time_model, as_of=None):
+        """The slackids whose stats in the game are queued, in order.
+
+        Given `as_of`, also those with times or stats in the game (whose times
+        may all have been deleted) that don't have stats as of then.
+        """
+        stats = UserStats.objects.filter(game=time_model.game).order_by()
+        users = set(
+            stats.filter(dirty=True).values_list('user_id',
+                                                 flat=True).distinct())
+        if as_of is not None:
+            everyone = set()
+            for rows in (time_model.objects.order_by(), stats):
+                everyone.update(
+                    rows.values_list('user_id', flat=True).distinct())
+            everyone.difference_update(
+                stats.filter(as_of=as_of).values_list('user_id', flat=True))
+            users |= everyone
+        return sorted(users)
+
+
+class RollupTimes(CronJobBase):
+    """Rebuild the weekly and monthly rollups of everyone's times.
+
+    add_time and remove_time keep them up to date after this first runs, so
+    this is for edits made in the admin.
+    """
+    schedule = Schedule(run_at_times=['04:30'])
+    code = 'crossbot.rollup_times'
+
+    def do(self):
+        start = time.monotonic()
+        counts = [(time_model.game, TimeRollup.rebuild(time_model))
+                  for time_model in TIME_MODELS]
+        return "Rebuilt rollups ({}) in {:.1f}s".format(
+            ', '.join('{} {}'.format(game, count) for game, count in counts),
+            time.monotonic() - start)
+
+
+class SweepMedia(CronJobBase):
+    """Delete generated images that are too old, or take up too much room."""
+    schedule = Schedule(run_every_mins=60)
+    code = 'crossbot.sweep_media'
+
+    def do(self):
+        stats = PLOT_CACHE.sweep()
+        return ("Deleted {} expired and {} least recently used plots, "
+                "{} left ({} bytes)".format(*stats))
@@ -0,0 +1,72 @@
+"""Fewer points for lines too long to see every point of, with numpy.
+
+A plot of a few years of days has more points than pixels, so most of the
+time spent drawing them is wasted. lttb picks the points that keep the
+shape of a line, see "Downsampling Time Series for Visual Representation"
+(Steinarsson, 2013).
+"""
+
+import numpy as np
+
+
+def lttb(x, y, threshold):
+    """The indexes of `threshold` of the points (x, y), by Largest Triangle
+    Three Buckets. `x` must be increasing.
+
+    The first and last points are always kept. The others are split into
+    buckets, and from each the point making the largest triangle with the
+    point kept before it and the average of the next bucket is kept.
+    """
+    n = len(x)
+    threshold = max(threshold, 3)
+    if n <= threshold:
+        return np.arange(n)
+
+    # threshold - 2 buckets between the first and last points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indexes = np.empty(threshold, dtype=int)
+    indexes[0], indexes[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = end, edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # twice the area, which is just as good for comparing
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indexes[i + 1] = a
+    return indexes
+
+
+def downsample(x, y, threshold, max_gap):
+    """About `threshold` of the points (x, y) of a line, without its NaNs.
+
+    The line is split where consecutive points are more than `max_gap`
+    apart, so gaps that would show at this resolution still do. Each piece
+    gets its share of the points.
+
+    Returns:
+        (x, y) arrays, with a NaN in y after each piece but the last, to
+        break the line there.
+    """
+    scored = ~np.isnan(y)
+    x, y = x[scored], y[scored]
+    if not len(x):
+        return x, y
+
+    breaks = np.flatnonzero(np.diff(x) > max_gap) + 1
+    pieces_x, pieces_y = [], []
+    for piece_x, piece_y in zip(np.split(x, breaks), np.split(y, breaks)):
+        share = int(round(threshold * len(piece_x) / len(x)))
+        kept = lttb(piece_x, piece_y, share)
+        # break the line at the last point, where it's already been drawn to
+        pieces_x += [piece_x[kept], piece_x[-1:]]
+        pieces_y += [piece_y[kept], [np.nan]]
+    return np.concatenate(pieces_x[:-1]), np.concatenate(pieces_y[:-1])
@@ -0,0 +1,59 @@
+"""Compare the cost of parsing commands with and without the fast path."""
+
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from crossbot.slack.handler import Handler
+from crossbot.slack.parser import ParserException
+
+COMMANDS = [
+    'add :32',
+    'add 1:07 2018-08-01',
+    '-r add 12:30',
+    'times',
+    'times 2018-08-01',
+    'delete 2018-08-01',
+    'missed 3',
+    'announce',
+    'plot -n 30 --times',
+    'sql select count(*) from mini_crossword_time',
+]
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n',
+            '--number',
+            type=int,
+            default=2000,
+            help='Parses per command per measurement. Default %(default)s.')
+
+    def handle(self, *args, **options):
+        number = options['number']
+        parser = Handler(deferred_workers=0).parser
+
+        def full(text):
+            try:
+                parser.parser.parse_args(text.split())
+            except ParserException:
+                pass
+
+        def fast(text):
+            try:
+                parser.parse(text)
+            except ParserException:
+                pass
+
+        self.stdout.write('{:<45} {:>10} {:>10} {:>8}'.format(
+            'command', 'argparse', 'parse', 'speedup'))
+        for text in COMMANDS:
+            # best of 3, in microseconds per parse
+            t_full, t_fast = (min(
+                timeit.repeat(lambda: func(text), number=number, repeat=3)) /
+                              number * 1e6 for func in (full, fast))
+            self.stdout.write('{:<45} {:>8.1f}us {:>8.1f}us {:>7.1f}x'.format(
+                text, t_full, t_fast, t_full / t_fast))
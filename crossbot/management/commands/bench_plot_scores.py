@@ -0,0 +1,190 @@
+"""Compare the old per-entry plot scoring loops with the numpy matrix versions.
+
+Scores synthetic entries in memory, so no database is needed.
+"""
+
+import argparse
+import datetime
+import random
+import statistics
+import timeit
+
+from collections import defaultdict, namedtuple
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+
+from crossbot.slack.commands import plot
+
+Entry = namedtuple('Entry', ['user', 'date', 'seconds'])
+
+
+def loop_normalized_scores(entries, args):
+    """get_normalized_scores as it was, looping over dates and users."""
+
+    times_by_date = defaultdict(dict)
+    for e in entries:
+        times_by_date[e.date][e.user] = e.seconds
+
+    sorted_dates = sorted(times_by_date.keys())
+
+    MAX_SCORE = 1.5
+    FAILURE_PENALTY = -2
+
+    def mk_score(mean, t, stdev):
+        if t < 0:
+            return FAILURE_PENALTY
+        if stdev == 0:
+            return 0
+
+        score = (mean - t) / stdev
+        return np.clip(score, -MAX_SCORE, MAX_SCORE)
+
+    scores = {}
+    for date, user_times in times_by_date.items():
+        times = [t for t in user_times.values() if t is not None]
+        times = [t if t >= 0 else max(times) + 60 for t in times]
+        q1, q3 = np.percentile(times, [25, 75])
+        stdev = statistics.pstdev(times)
+        o1, o3 = q1 - stdev, q3 + stdev
+        times = [t for t in times if o1 <= t <= o3]
+        mean = statistics.mean(times)
+        stdev = statistics.pstdev(times, mean)
+        scores[date] = {
+            userid: mk_score(mean, t, stdev)
+            for userid, t in user_times.items() if t is not None
+        }
+
+    new_score_weight = 1 - args.smooth
+    running = {}
+
+    weighted_scores = defaultdict(dict)
+    for date in sorted_dates:
+        for user, score in scores[date].items():
+            old_score = running.get(user)
+            new_score = (
+                score * new_score_weight + old_score * (1 - new_score_weight)
+                if old_score is not None else score)
+            weighted_scores[user][date] = running[user] = new_score
+
+    return weighted_scores
+
+
+def loop_times(entries, args):
+    times = defaultdict(dict)
+    for e in entries:
+        if e.seconds >= 0:
+            times[e.user][e.date] = e.seconds
+    return times
+
+
+def loop_win_streaks(entries, args):
+    best_time = defaultdict(lambda: 99999999999999)
+    for e in entries:
+        if e.seconds >= 0:
+            best_time[e.date] = min(best_time[e.date], e.seconds)
+
+    times = defaultdict(dict)
+    for e in entries:
+        if e.seconds == best_time[e.date]:
+            times[e.user][e.date] = e.seconds
+    return times
+
+
+def loop_streaks(entries, args):
+    times = defaultdict(dict)
+    for e in entries:
+        times[e.user][e.date] = e.seconds
+    return times
+
+
+# name, old, new
+SCORE_FUNCTIONS = [
+    ('normalized', loop_normalized_scores, plot.get_normalized_scores),
+    ('times', loop_times, plot.get_times),
+    ('win-streaks', loop_win_streaks, plot.get_win_streaks),
+    ('streaks', loop_streaks, plot.get_streaks),
+]
+
+
+def make_entries(days, users, participation=0.7, fail_rate=0.05, seed=0):
+    """Random entries for `users` players over `days` days."""
+    rng = random.Random(seed)
+    end = datetime.date(2019, 1, 1)
+    entries = []
+    for i in range(days):
+        date = end - datetime.timedelta(days=i)
+        players = [u for u in range(users) if rng.random() < participation]
+        for user in players or [0]:
+            if rng.random() < fail_rate:
+                seconds = -1
+            else:
+                seconds = max(1, int(rng.gauss(40, 15)))
+            entries.append(Entry('user{}'.format(user), date, seconds))
+    entries.sort(key=lambda e: (e.date, e.user))
+    return entries
+
+
+def same_scores(old, new):
+    if set(old) != set(new):
+        return False
+    for user in old:
+        if set(old[user]) != set(new[user]):
+            return False
+        if not np.allclose([old[user][d] for d in old[user]],
+                           [new[user][d] for d in old[user]]):
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            nargs='+',
+            default=[1, 30, 1000],
+            help='Date ranges to score. Default %(default)s.')
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=30,
+            help='Number of players. Default %(default)s.')
+        parser.add_argument(
+            '-n',
+            '--number',
+            type=int,
+            default=5,
+            help='Runs of each implementation. Default %(default)s.')
+
+    def handle(self, *args, **options):
+        plot_args = argparse.Namespace(smooth=0.7, table=None)
+        number = options['number']
+
+        self.stdout.write('{:<12} {:>6} {:>8} {:>10} {:>10} {:>8}'.format(
+            'function', 'days', 'entries', 'loop', 'numpy', 'speedup'))
+        for days in options['days']:
+            entries = make_entries(days, options['users'])
+            times = plot.time_matrix(entries)
+            for name, old, new in SCORE_FUNCTIONS:
+                assert same_scores(
+                    old(entries, plot_args),
+                    new(plot.time_matrix(entries), plot_args)[0].as_dict()), (
+                        '{} implementations disagree'.format(name))
+
+                t_old = min(
+                    timeit.repeat(
+                        lambda: old(entries, plot_args),
+                        number=1,
+                        repeat=number))
+                t_new = min(
+                    timeit.repeat(
+                        lambda: new(times, plot_args), number=1,
+                        repeat=number))
+                self.stdout.write(
+                    '{:<12} {:>6} {:>8} {:>8.2f}ms {:>8.2f}ms {:>7.1f}x'.
+                    format(name, days, len(entries), t_old * 1000,
+                           t_new * 1000, t_old / t_new))
@@ -0,0 +1,147 @@
+"""Compare drawing a line per stretch of days with a line per player.
+
+Renders synthetic plot specs in this process, so no database or render
+processes are needed.
+"""
+
+import datetime
+import os
+import random
+import tempfile
+import timeit
+
+import numpy as np
+
+from django.core.management.base import BaseCommand
+from matplotlib.image import imread
+
+from crossbot import render
+from crossbot.slack.commands import plot
+
+
+def draw_segments(ax, spec, colors):
+    """render.draw_lines as it was, with a line for each stretch of days."""
+    for series, color in zip(spec['series'], colors):
+        dates = render.mdates.date2num(series['dates'])
+        label = series['label']
+        values = np.array(series['values'], dtype=float)
+        # the (start, end) of each run of values without a NaN
+        scored = np.concatenate([[False], ~np.isnan(values), [False]])
+        edges = np.flatnonzero(np.diff(scored.astype(int)))
+        for start, end in zip(edges[::2], edges[1::2]):
+            ax.plot(
+                dates[start:end],
+                values[start:end],
+                series['fmt'],
+                label=label,
+                color=series['color'] or color,
+                alpha=series['alpha'])
+            # make sure that we don't put anyone in the legend twice
+            label = '_nolegend_'
+
+
+def make_spec(days, users, participation=0.7, seed=0):
+    """A plot spec of random times for `users` players over `days` days."""
+    rng = random.Random(seed)
+    end = datetime.date(2019, 1, 1)
+    dates = [end - datetime.timedelta(days=i) for i in range(days, -1, -1)]
+    markers = ['-o', '-X', '-s', '-^']
+    series = [{
+        'label':
+        'user{}'.format(user),
+        'dates':
+        dates,
+        'values': [
+            max(1, int(rng.gauss(40, 15)))
+            if rng.random() < participation else float('nan') for _ in dates
+        ],
+        'fmt':
+        markers[user % len(markers)],
+        'color':
+        None,
+        'alpha':
+        0.7,
+    } for user in range(users)]
+    return {
+        'size': plot.figure_size(days),
+        'series': series,
+        'kind': 'lines',
+        'colormap': 'nipy_spectral',
+        'first': dates[0],
+        'last': dates[-1],
+        'yscale': 'linear',
+        'ytick': 10,
+        'yformat': 'minutes',
+        'ylabel': None,
+    }
+
+
+def count_segments(values):
+    scored = ~np.isnan(np.array(values, dtype=float))
+    return int(np.count_nonzero(scored[1:] & ~scored[:-1]) + scored[0])
+
+
+def same_picture(a, b, tolerance=0.01):
+    """Whether the pngs at `a` and `b` are the same size, and differ in less
+    than `tolerance` of their pixels. Antialiasing is slightly different
+    where the lines are joined instead of separate.
+    """
+    a, b = imread(a), imread(b)
+    if a.shape != b.shape:
+        return False
+    return (a != b).any(axis=2).mean() < tolerance
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            nargs='+',
+            default=[7, 30, 365],
+            help='Date ranges to draw. Default %(default)s.')
+        parser.add_argument(
+            '--users',
+            type=int,
+            nargs='+',
+            default=[5, 30],
+            help='Numbers of players. Default %(default)s.')
+        parser.add_argument(
+            '-n',
+            '--number',
+            type=int,
+            default=3,
+            help='Runs of each implementation. Default %(default)s.')
+
+    def handle(self, *args, **options):
+        number = options['number']
+
+        self.stdout.write('{:>6} {:>6} {:>9} {:>10} {:>10} {:>8}'.format(
+            'days', 'users', 'segments', 'segments', 'series', 'speedup'))
+        with tempfile.TemporaryDirectory() as tmp:
+            old_path = os.path.join(tmp, 'old.png')
+            new_path = os.path.join(tmp, 'new.png')
+            for days in options['days']:
+                for users in options['users']:
+                    spec = make_spec(days, users)
+
+                    def old():
+                        render.render(spec, old_path, draw_segments)
+
+                    def new():
+                        render.render(spec, new_path)
+
+                    t_old = min(timeit.repeat(old, number=1, repeat=number))
+                    t_new = min(timeit.repeat(new, number=1, repeat=number))
+                    assert same_picture(old_path, new_path), (
+                        'the plots differ for {} days of {} users'.format(
+                            days, users))
+
+                    segments = sum(
+                        count_segments(s['values']) for s in spec['series'])
+                    self.stdout.write(
+                        '{:>6} {:>6} {:>9} {:>8.0f}ms {:>8.0f}ms {:>7.1f}x'.
+                        format(days, users, segments, t_old * 1000,
+                               t_new * 1000, t_old / t_new))
@@ -0,0 +1,75 @@
+"""Measure how long a fresh worker takes to load crossbot, and its memory use.
+
+Each run starts a new interpreter that sets up Django and imports
+crossbot.slack, just like a gunicorn worker handling its first slash command.
+`eager` runs also import everything the old command registry did at startup
+(numpy, matplotlib and a YAML parse of the items), for comparison.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand
+
+WORKER = '''
+import json, multiprocessing, resource, sys, time
+
+start = time.perf_counter()
+
+import django
+django.setup()
+import crossbot.slack
+
+if {eager}:
+    import numpy, matplotlib.pyplot, yaml
+    from crossbot.models import ITEMS_YAML
+    with open(ITEMS_YAML) as f:
+        yaml.safe_load(f)
+
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    # kilobytes on linux
+    'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'numpy': 'numpy' in sys.modules,
+    # processes it started, like render processes
+    'children': len(multiprocessing.active_children()),
+}}))
+'''
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n',
+            '--number',
+            type=int,
+            default=5,
+            help='Workers to start per mode. Default %(default)s.')
+
+    def run_worker(self, eager):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+        out = subprocess.check_output(
+            [sys.executable, '-c',
+             WORKER.format(eager=eager)], env=env)
+        # the last line, in case anything logged to stdout
+        return json.loads(out.decode().strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        self.stdout.write('{:<8} {:>10} {:>10} {:>8}'.format(
+            'mode', 'startup', 'max rss', 'modules'))
+
+        for mode, eager in [('lazy', False), ('eager', True)]:
+            runs = [self.run_worker(eager) for _ in range(options['number'])]
+            self.stdout.write('{:<8} {:>8.0f}ms {:>8.1f}MB {:>8}'.format(
+                mode,
+                statistics.median(r['seconds'] for r in runs) * 1000,
+                max(r['maxrss'] for r in runs) / 1024,
+                max(r['modules'] for r in runs),
+            ))
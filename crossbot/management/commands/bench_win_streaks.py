@@ -0,0 +1,148 @@
+"""Compare the old per-winner win streak loop with the single window query.
+
+Synthetic times are added inside a transaction that is rolled back at the end,
+so the database is left as it was.
+"""
+
+import datetime
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+
+from crossbot.models import CBUser, MiniCrosswordTime, ResultsSummary
+
+
+class Rollback(Exception):
+    pass
+
+
+def loop_current_win_streaks(cls, date):
+    """current_win_streaks as it was, scanning the times for every winner."""
+
+    def winning_times():
+        values = cls.objects.filter(
+            seconds__gt=0).values_list('date').annotate(
+                winning_time=Min('seconds'))
+        return {date: winning_time for date, winning_time in values}
+
+    def winners(date):
+        entries = list(cls.objects.filter(seconds__gt=0, date=date))
+        if not entries:
+            return []
+        best = min(e.seconds for e in entries)
+        return [e for e in entries if e.seconds == best]
+
+    def wins(user, qs):
+        wins = winning_times()
+        return [
+            e for e in qs.filter(seconds__gt=0, user=user)
+            if e.seconds == wins[e.date]
+        ]
+
+    result = {}
+    qs = cls.objects.filter(date__lte=date)
+    for w in winners(date):
+        streaks = cls.streaks(wins(w.user, qs))
+        if streaks and streaks[-1][-1].date == date:
+            result[w.user] = streaks[-1]
+    return result
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=3,
+            help='Years of history to generate. Default %(default)s.')
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=30,
+            help='Number of players. Default %(default)s.')
+        parser.add_argument(
+            '--participation',
+            type=float,
+            default=0.5,
+            help='Chance a player plays on a given day. Default %(default)s.')
+        parser.add_argument(
+            '-n',
+            '--number',
+            type=int,
+            default=3,
+            help='Runs of each implementation. Default %(default)s.')
+
+    def generate(self, options):
+        rng = random.Random(0)
+        users = [
+            CBUser.objects.create(slackid='UBENCH{}'.format(i))
+            for i in range(options['users'])
+        ]
+        # a few regulars win most days, so there are real streaks
+        skill = {user: rng.uniform(0.5, 2) for user in users}
+
+        end = datetime.date.today()
+        start = end - datetime.timedelta(days=365 * options['years'])
+        times = []
+        day = start
+        while day <= end:
+            for user in users:
+                if rng.random() < options['participation']:
+                    times.append(
+                        MiniCrosswordTime(
+                            user=user,
+                            date=day,
+                            seconds=int(rng.gauss(40, 10) * skill[user]) or 1))
+            day += datetime.timedelta(days=1)
+
+        MiniCrosswordTime.objects.bulk_create(times, batch_size=500)
+        ResultsSummary.rebuild()
+        return end, len(times)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        date, count = self.generate(options)
+        self.stdout.write('{} times over {} years for {} users'.format(
+            count, options['years'], options['users']))
+
+        loop = loop_current_win_streaks(MiniCrosswordTime, date)
+        window = MiniCrosswordTime.current_win_streaks(date)
+        assert loop == window, 'implementations disagree'
+
+        number = options['number']
+        t_loop = min(
+            timeit.repeat(
+                lambda: loop_current_win_streaks(MiniCrosswordTime, date),
+                number=1,
+                repeat=number))
+        t_window = min(
+            timeit.repeat(
+                lambda: MiniCrosswordTime.current_win_streaks(date),
+                number=1,
+                repeat=number))
+        t_stats = min(
+            timeit.repeat(
+                lambda: MiniCrosswordTime.win_streak_stats(date),
+                number=1,
+                repeat=number))
+
+        self.stdout.write('{:<28} {:>10}'.format('implementation', 'best'))
+        self.stdout.write('{:<28} {:>8.1f}ms'.format('per-winner loop',
+                                                     t_loop * 1000))
+        self.stdout.write('{:<28} {:>8.1f}ms'.format('window query + entries',
+                                                     t_window * 1000))
+        self.stdout.write('{:<28} {:>8.1f}ms'.format('window query alone',
+                                                     t_stats * 1000))
+        self.stdout.write('speedup {:.1f}x'.format(t_loop / t_window))
@@ -0,0 +1,14 @@
+"""Precompile items.yaml into items.json, which is much faster to load."""
+
+from django.core.management.base import BaseCommand
+
+from crossbot.models import ITEMS_JSON, compile_items
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def handle(self, *args, **options):
+        items = compile_items()
+        self.stdout.write('Compiled {} items to {}'.format(
+            len(items), ITEMS_JSON))
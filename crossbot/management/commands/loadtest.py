@@ -0,0 +1,387 @@
+"""Flood the slash command endpoint with signed requests and report latency.
+
+By default, requests go straight to crossbot.views.slash_command from
+--concurrency threads in this process, against the configured database. That
+adds times for ULOAD* users, so it only runs against a test or scratch
+database (one with "test" or "scratch" in its name) unless you pass
+--i-know-this-writes, and deletes their times and users afterwards. With
+--url, requests are POSTed to a running server instead; start it with
+CROSSBOT_SLACK_API_URL set to the stub Slack that this command runs (see
+--stub-port), so nothing reaches slack.com.
+"""
+
+import collections
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import numpy as np
+import requests
+
+from django import db
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+from django.urls import reverse
+
+import settings
+
+DEFAULT_MIX = 'add=60,times=25,announce=10,plot=3,sql=2'
+
+# the requests' users are USER_PREFIX<n>, and their channel CHANNEL
+USER_PREFIX = 'ULOAD'
+CHANNEL = 'CLOADTEST'
+# words in the name of a database that's fine to write to
+SCRATCH_WORDS = ('test', 'scratch', 'memory')
+
+
+def make_text(command, rng):
+    """Make a realistic slash command of type `command`."""
+    if command == 'add':
+        seconds = rng.randint(10, 300)
+        date = datetime.date.today() - datetime.timedelta(
+            days=rng.randint(0, 365))
+        return 'add {}:{:02} {}'.format(seconds // 60 or '', seconds % 60,
+                                        date)
+    if command == 'times':
+        return 'times'
+    if command == 'announce':
+        return 'announce'
+    if command == 'plot':
+        return rng.choice(['plot', 'plot -n 14 --times', 'plot --streaks'])
+    if command == 'sql':
+        return 'sql select count(*) from mini_crossword_time'
+    raise CommandError('Unknown command in mix: {}'.format(command))
+
+
+def parse_mix(mix):
+    """Parse 'add=60,times=40' into (commands, weights)."""
+    try:
+        pairs = [item.split('=') for item in mix.split(',')]
+        commands = [command for command, _ in pairs]
+        weights = [float(weight) for _, weight in pairs]
+    except ValueError:
+        raise CommandError('--mix should look like {}'.format(DEFAULT_MIX))
+    for command in commands:
+        make_text(command, random.Random())
+    return commands, weights
+
+
+def sign(body, timestamp):
+    """Sign a request body the way Slack does, see validate_slack_request."""
+    return 'v0=' + hmac.new(
+        key=settings.SLACK_SECRET_SIGNING_KEY,
+        msg=b'v0:' + bytes(timestamp, 'utf8') + b':' + body,
+        digestmod=hashlib.sha256).hexdigest()
+
+
+def is_lock_error(exc):
+    return (isinstance(exc, db.OperationalError)
+            and 'locked' in str(exc).lower())
+
+
+def is_scratch_database(settings_dict):
+    """Whether the database in `settings_dict` looks like a throwaway one."""
+    name = os.path.basename(str(settings_dict['NAME'])).lower()
+    return any(word in name for word in SCRATCH_WORDS)
+
+
+def delete_load_rows():
+    """Delete the load test users, and their times the way the remove command
+    would, so the results and stats of everyone else are right again.
+
+    Returns:
+        The number of times deleted.
+    """
+    from crossbot.models import (CBUser, CrosswordTime, EasySudokuTime,
+                                 MiniCrosswordTime, OutboxMessage)
+
+    deleted = 0
+    users = CBUser.objects.filter(slackid__startswith=USER_PREFIX)
+    for time_model in (MiniCrosswordTime, CrosswordTime, EasySudokuTime):
+        times = time_model.objects.filter(
+            user__in=users).select_related('user')
+        for time in times:
+            time.user.remove_time(time_model, time.date)
+            deleted += 1
+    users.delete()
+    OutboxMessage.objects.filter(channel=CHANNEL).delete()
+    return deleted
+
+
+class StubSlackHandler(BaseHTTPRequestHandler):
+    """Answers every Slack call (and delayed response) successfully."""
+
+    def do_GET(self):
+        self.do_POST()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.record(self.path.split('?')[0])
+
+        body = json.dumps({'ok': True, 'ts': '1', 'members': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubSlackServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port):
+        super().__init__(('127.0.0.1', port), StubSlackHandler)
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+
+    def record(self, path):
+        with self.lock:
+            self.calls[path] += 1
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_address[1])
+
+
+class LockErrorCounter(logging.Handler):
+    """Counts logged database lock errors, e.g. from deferred commands."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def emit(self, record):
+        if record.exc_info and is_lock_error(record.exc_info[1]):
+            self.count += 1
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Slash command URL of a running server, '
+            'e.g. http://127.0.0.1:8000/slack/. Default is in-process.')
+        parser.add_argument(
+            '-c',
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Requests in flight at once. Default %(default)s.')
+        parser.add_argument(
+            '-n',
+            '--requests',
+            type=int,
+            default=500,
+            help='Total requests to send. Default %(default)s.')
+        parser.add_argument(
+            '--mix',
+            default=DEFAULT_MIX,
+            help='Relative weights of each command. Default %(default)s.')
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Number of distinct users sending commands. '
+            'Default %(default)s.')
+        parser.add_argument(
+            '--stub-port',
+            type=int,
+            default=0,
+            help='Port for the stub Slack. Default is any free port.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+        parser.add_argument(
+            '--i-know-this-writes',
+            action='store_true',
+            help='Run in-process even though the configured database '
+            "doesn't look like a test or scratch one.")
+
+    def handle(self, *args, **options):
+        if not (options['url'] or options['i_know_this_writes']
+                or is_scratch_database(db.connection.settings_dict)):
+            raise CommandError(
+                'In-process load tests write to the configured database '
+                '({}). Point DATABASES at a test or scratch copy, use --url, '
+                'or pass --i-know-this-writes.'.format(
+                    db.connection.settings_dict['NAME']))
+        commands, weights = parse_mix(options['mix'])
+        rng = random.Random(options['seed'])
+
+        stub = StubSlackServer(options['stub_port'])
+        threading.Thread(
+            target=stub.serve_forever, args=(0.1, ), daemon=True).start()
+        self.stdout.write('Stub Slack API listening at {}api/'.format(
+            stub.url))
+
+        work = queue.Queue()
+        for _ in range(options['requests']):
+            command = rng.choices(commands, weights)[0]
+            user = USER_PREFIX + str(rng.randrange(options['users']))
+            work.put((command, {
+                'type': 'event_callback',
+                'text': make_text(command, rng),
+                'response_url': stub.url + 'response/',
+                'trigger_id': 'loadtest',
+                'channel_id': CHANNEL,
+                'user_id': user,
+                'user_name': user.lower(),
+            }))
+
+        if options['url']:
+            send = self.http_sender(options['url'])
+        else:
+            send = self.local_sender()
+            from crossbot.slack import api
+            api.CLIENT.base_url = stub.url + 'api/'
+
+        lock_errors = LockErrorCounter()
+        logging.getLogger().addHandler(lock_errors)
+
+        results = []
+        results_lock = threading.Lock()
+
+        def worker():
+            session = requests.Session()
+            try:
+                while True:
+                    try:
+                        command, data = work.get_nowait()
+                    except queue.Empty:
+                        return
+                    start = time.perf_counter()
+                    outcome = send(session, data)
+                    latency = time.perf_counter() - start
+                    with results_lock:
+                        results.append((command, latency, outcome))
+            finally:
+                db.connection.close()
+
+        start = time.perf_counter()
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if not options['url']:
+            self.wait_for_deferred()
+        logging.getLogger().removeHandler(lock_errors)
+        stub.shutdown()
+
+        self.report(results, elapsed, lock_errors.count, stub.calls)
+
+        if not options['url']:
+            self.stdout.write('')
+            self.stdout.write('Deleted {} load test times'.format(
+                delete_load_rows()))
+
+    def local_sender(self):
+        from crossbot.views import slash_command
+        factory = RequestFactory()
+        path = reverse('slash_command')
+
+        def send(session, data):
+            body = urlencode(data)
+            timestamp = str(time.time())
+            request = factory.post(
+                path,
+                body,
+                content_type='application/x-www-form-urlencoded',
+                HTTP_X_SLACK_REQUEST_TIMESTAMP=timestamp,
+                HTTP_X_SLACK_SIGNATURE=sign(body.encode(), timestamp))
+            try:
+                response = slash_command(request)
+            except Exception as e:
+                return 'locked' if is_lock_error(e) else 'error'
+            return 'ok' if response.status_code == 200 else 'error'
+
+        return send
+
+    def http_sender(self, url):
+        def send(session, data):
+            body = urlencode(data).encode()
+            timestamp = str(time.time())
+            try:
+                response = session.post(
+                    url,
+                    data=body,
+                    timeout=30,
+                    headers={
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                        'X-Slack-Request-Timestamp': timestamp,
+                        'X-Slack-Signature': sign(body, timestamp),
+                    })
+            except requests.RequestException:
+                return 'error'
+            if response.status_code == 200:
+                return 'ok'
+            if b'database is locked' in response.content:
+                return 'locked'
+            return 'error'
+
+        return send
+
+    def wait_for_deferred(self, timeout=60):
+        from crossbot.slack import _HANDLER
+        if not _HANDLER.deferred:
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            stats = _HANDLER.deferred.stats()
+            if not stats['queued'] and not stats['running']:
+                return
+            time.sleep(0.1)
+        self.stderr.write('Gave up waiting for deferred commands')
+
+    def report(self, results, elapsed, background_lock_errors, slack_calls):
+        outcomes = collections.Counter(outcome for _, _, outcome in results)
+        self.stdout.write('{} requests in {:.2f}s, {:.1f} requests/s'.format(
+            len(results), elapsed,
+            len(results) / elapsed))
+        self.stdout.write(
+            'ok: {ok}, errors: {error}, database locked: {locked} '
+            '(+{background} in background threads)'.format(
+                ok=outcomes['ok'],
+                error=outcomes['error'],
+                locked=outcomes['locked'],
+                background=background_lock_errors))
+
+        self.stdout.write('')
+        self.stdout.write('{:<10} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+            'command', 'count', 'p50', 'p95', 'p99', 'max'))
+        by_command = collections.defaultdict(list)
+        for command, latency, _ in results:
+            by_command[command].append(latency)
+            by_command['all'].append(latency)
+        for command, latencies in sorted(
+                by_command.items(), key=lambda kv: kv[0] == 'all'):
+            p50, p95, p99, top = np.percentile(latencies, [50, 95, 99, 100])
+            self.stdout.write(
+                '{:<10} {:>6} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms'.
+                format(command, len(latencies), p50 * 1000, p95 * 1000,
+                       p99 * 1000, top * 1000))
+
+        self.stdout.write('')
+        self.stdout.write('Stub Slack calls: {}'.format(
+            ', '.join('{} {}'.format(path, count)
+                      for path, count in sorted(slack_calls.items()))
+            or 'none'))
@@ -0,0 +1,36 @@
+"""Rebuild tables kept alongside the times from all recorded times."""
+
+from django.core.management.base import BaseCommand
+
+from crossbot.models import (TIME_MODELS, ParticipationStreak, PersonalBest,
+                             ResultsSummary, TimeRollup)
+
+
+def rebuild_time_rollups():
+    return sum(TimeRollup.rebuild(time_model) for time_model in TIME_MODELS)
+
+
+# the rebuild for each table, and what it counts
+TABLES = {
+    'results': (ResultsSummary.rebuild, 'results summaries'),
+    'streaks': (ParticipationStreak.rebuild, 'streaks'),
+    'personal_bests': (PersonalBest.rebuild, 'personal bests'),
+    'time_rollups': (rebuild_time_rollups, 'rollups'),
+}
+
+
+class Command(BaseCommand):
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tables',
+            nargs='+',
+            choices=list(TABLES),
+            metavar='table',
+            help='One or more of: {}'.format(', '.join(TABLES)))
+
+    def handle(self, *args, tables, **options):
+        for table in tables:
+            rebuild, counted = TABLES[table]
+            self.stdout.write('Rebuilt {} {}'.format(rebuild(), counted))
@@ -0,0 +1,159 @@
+"""Generated images in MEDIA_ROOT, kept to a maximum age and size.
+
+Everything crossbot draws for Slack to show is saved through a MediaStore
+(so far just plots, see crossbot.plotcache), which names its files
+<prefix><name><suffix> so it can tell them apart from anything else in
+MEDIA_ROOT. A file's modification time is when it was last used. Files unused
+for MEDIA_TTL_SECONDS are deleted, and then the least recently used until the
+rest fit in MEDIA_MAX_BYTES. Saving a file sweeps its store, and so does the
+SweepMedia cron job, so old files go away even when nothing new is drawn.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from collections import namedtuple
+
+from django.conf import settings
+
+from .settings import MEDIA_MAX_BYTES, MEDIA_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# a half written file is left behind if its worker dies, and is deleted once
+# it's this old, since no render takes this long
+TMP_SECONDS = 60 * 60
+
+# what a sweep deleted, and the files and bytes left
+SweepStats = namedtuple('SweepStats', ['expired', 'evicted', 'files', 'bytes'])
+
+
+class MediaStore:
+    """Files named <prefix><name><suffix> in `directory` (MEDIA_ROOT by
+    default), deleted once they're unused for `ttl_seconds` or don't fit in
+    `max_bytes`.
+    """
+
+    def __init__(self,
+                 prefix,
+                 suffix,
+                 directory=None,
+                 ttl_seconds=MEDIA_TTL_SECONDS,
+                 max_bytes=MEDIA_MAX_BYTES):
+        self.prefix = prefix
+        self.suffix = suffix
+        self._directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    @property
+    def directory(self):
+        return self._directory or settings.MEDIA_ROOT
+
+    def filename(self, name):
+        return self.prefix + name + self.suffix
+
+    def path(self, name):
+        return os.path.join(self.directory, self.filename(name))
+
+    def touch(self, name):
+        """Mark the file for `name` as used.
+
+        Returns:
+            Whether there is one.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def save(self, name, write):
+        """Save the file for `name` with `write(path)`, and return its file
+        name.
+        """
+        path = self.path(name)
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+                                         threading.get_ident())
+        try:
+            write(tmp_path)
+            # replace, so other workers never see a half written file
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.sweep(keep=path)
+        return self.filename(name)
+
+    def files(self):
+        """(mtime, path, size) of each of the store's files, and a list of its
+        temporary files' (mtime, path).
+        """
+        files = []
+        tmp_files = []
+        for entry in os.scandir(self.directory):
+            name = entry.name
+            if not name.startswith(self.prefix):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                # another worker got to it first
+                continue
+            if name.endswith(self.suffix):
+                files.append((stat.st_mtime, entry.path, stat.st_size))
+            elif name.endswith('.tmp'):
+                tmp_files.append((stat.st_mtime, entry.path))
+        return files, tmp_files
+
+    def sweep(self, keep=None, now=None):
+        """Delete the expired files, then the least recently used until the
+        rest fit in max_bytes. The file at `keep` is never deleted.
+
+        Returns:
+            SweepStats.
+        """
+        now = time.time() if now is None else now
+        files, tmp_files = self.files()
+
+        for mtime, path in tmp_files:
+            if now - mtime > TMP_SECONDS:
+                remove_file(path)
+
+        expired = evicted = 0
+        total = sum(size for _, _, size in files)
+        left = 0
+        for mtime, path, size in sorted(files):
+            if path != keep:
+                if self.ttl_seconds and now - mtime > self.ttl_seconds:
+                    expired += remove_file(path)
+                    total -= size
+                    continue
+                if total > self.max_bytes:
+                    evicted += remove_file(path)
+                    total -= size
+                    continue
+            left += 1
+
+        stats = SweepStats(expired, evicted, left, total)
+        if expired or evicted:
+            logger.info(
+                'deleted %d expired and %d least recently used %s*%s, '
+                '%d left (%d bytes)', expired, evicted, self.prefix,
+                self.suffix, left, total)
+        return stats
+
+
+def remove_file(path):
+    """Delete the file at `path`, unless another worker got to it first.
+
+    Returns:
+        1 if this deleted it, otherwise 0.
+    """
+    try:
+        os.remove(path)
+        return 1
+    except FileNotFoundError:
+        return 0
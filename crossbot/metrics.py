@@ -0,0 +1,307 @@
+"""Prometheus metrics for commands and Slack calls, merged across workers.
+
+Each process records into its own `Registry`, which every so often writes a
+snapshot to a JSON file named after its pid in METRICS_DIR. The metrics view
+merges the snapshots of the workers that are still running, deleting the
+rest, and renders them in the Prometheus text format. Prometheus sees a
+dead worker's counters disappear as a counter reset, which rate() handles.
+https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from contextlib import contextmanager
+
+from django import db
+
+from .mediastore import remove_file
+from .settings import METRICS_DIR
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# name: (type, help)
+METRICS = {
+    'crossbot_command_seconds': ('histogram', 'Time spent running a command.'),
+    'crossbot_command_errors_total': ('counter',
+                                      'Commands that raised an exception.'),
+    'crossbot_command_db_queries_total':
+    ('counter', 'Database queries made by commands.'),
+    'crossbot_command_db_seconds_total':
+    ('counter', 'Time commands spent in database queries.'),
+    'crossbot_parse_errors_total': ('counter',
+                                    'Requests that could not be parsed.'),
+    'crossbot_slack_seconds': ('histogram',
+                               'Time spent calling Slack, including retries.'),
+    'crossbot_slack_errors_total': ('counter', 'Slack calls that failed.'),
+    'crossbot_plot_cache_total': ('counter',
+                                  'Plot render cache lookups, by result.'),
+}
+
+
+def _key(labels):
+    return json.dumps(labels, sort_keys=True)
+
+
+def _alive(pid):
+    """Whether there's a process with `pid`."""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # it's someone else's
+        return True
+    return True
+
+
+class Registry:
+    """This process's metrics, periodically saved to `directory`."""
+
+    def __init__(self, directory=METRICS_DIR, flush_interval=1):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0
+        # tells this process's snapshots from those of an earlier process
+        # that had the same pid
+        self.token = uuid.uuid4().hex
+
+    def inc(self, name, labels, amount=1):
+        key = _key(labels)
+        with self.lock:
+            values = self.counters.setdefault(name, {})
+            values[key] = values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = _key(labels)
+        with self.lock:
+            values = self.histograms.setdefault(name, {})
+            if key not in values:
+                values[key] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'sum': 0,
+                    'count': 0,
+                }
+            histogram = values[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(
+                json.dumps({
+                    'counters': self.counters,
+                    'histograms': self.histograms,
+                }))
+
+    def path(self):
+        return os.path.join(
+            self.directory, 'metrics_{}_{}.json'.format(
+                os.getpid(), self.token))
+
+    def snapshot_files(self):
+        """The paths of the snapshots of the workers that are still running.
+
+        The snapshots of dead workers are deleted, and so are the older ones
+        of a pid that has been reused.
+        """
+        by_pid = {}
+        for entry in os.scandir(self.directory):
+            name = entry.name
+            if not (name.startswith('metrics_') and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len('metrics_'):].split('_')[0])
+                mtime = entry.stat().st_mtime
+            except (ValueError, FileNotFoundError):
+                continue
+
+            if _alive(pid):
+                by_pid.setdefault(pid, []).append((mtime, entry.path))
+            else:
+                remove_file(entry.path)
+
+        paths = []
+        for files in by_pid.values():
+            files.sort()
+            for _, path in files[:-1]:
+                remove_file(path)
+            paths.append(files[-1][1])
+        return sorted(paths)
+
+    def flush(self, force=False):
+        """Save a snapshot for the metrics view, at most every so often."""
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+
+        path = self.path()
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f)
+            # replace, so readers never see a half written file
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception('could not save metrics to %s', path)
+
+    def collect(self):
+        """Return the running workers' snapshots merged together."""
+        self.flush(force=True)
+
+        merged = {'counters': {}, 'histograms': {}}
+        for path in self.snapshot_files():
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                logger.exception('could not read metrics from %s', path)
+                continue
+
+            for name, values in snapshot['counters'].items():
+                counters = merged['counters'].setdefault(name, {})
+                for key, value in values.items():
+                    counters[key] = counters.get(key, 0) + value
+
+            for name, values in snapshot['histograms'].items():
+                histograms = merged['histograms'].setdefault(name, {})
+                for key, histogram in values.items():
+                    if key not in histograms:
+                        histograms[key] = histogram
+                        continue
+                    total = histograms[key]
+                    total['buckets'] = [
+                        a + b
+                        for a, b in zip(total['buckets'], histogram['buckets'])
+                    ]
+                    total['sum'] += histogram['sum']
+                    total['count'] += histogram['count']
+
+        return merged
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'))
+
+
+def _labels(key, **extra):
+    labels = dict(json.loads(key), **extra)
+    if not labels:
+        return ''
+    pairs = ('{}="{}"'.format(k, _escape(v))
+             for k, v in sorted(labels.items()))
+    return '{' + ','.join(pairs) + '}'
+
+
+def render(snapshot):
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text) in sorted(METRICS.items()):
+        if kind == 'counter':
+            values = snapshot['counters'].get(name)
+        else:
+            values = snapshot['histograms'].get(name)
+        if not values:
+            continue
+
+        lines.append('# HELP {} {}'.format(name, help_text))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for key, value in sorted(values.items()):
+            if kind == 'counter':
+                lines.append('{}{} {}'.format(name, _labels(key), value))
+                continue
+            for bound, count in zip(LATENCY_BUCKETS, value['buckets']):
+                lines.append('{}_bucket{} {}'.format(name,
+                                                     _labels(key, le=bound),
+                                                     count))
+            lines.append('{}_bucket{} {}'.format(name, _labels(key, le='+Inf'),
+                                                 value['count']))
+            lines.append('{}_sum{} {}'.format(name, _labels(key),
+                                              value['sum']))
+            lines.append('{}_count{} {}'.format(name, _labels(key),
+                                                value['count']))
+    return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class QueryTimer:
+    """A database execute wrapper that counts and times queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+@contextmanager
+def track_command(command):
+    """Record the latency, queries and errors of running `command`."""
+    labels = {'command': command.__name__}
+    queries = QueryTimer()
+    start = time.perf_counter()
+    try:
+        with db.connection.execute_wrapper(queries):
+            yield
+    except:
+        REGISTRY.inc('crossbot_command_errors_total', labels)
+        raise
+    finally:
+        REGISTRY.observe('crossbot_command_seconds', labels,
+                         time.perf_counter() - start)
+        REGISTRY.inc('crossbot_command_db_queries_total', labels,
+                     queries.count)
+        REGISTRY.inc('crossbot_command_db_seconds_total', labels,
+                     queries.seconds)
+        REGISTRY.flush()
+
+
+@contextmanager
+def track_slack(endpoint):
+    """Record the latency and errors of a call to Slack."""
+    labels = {'endpoint': endpoint}
+    start = time.perf_counter()
+    try:
+        yield
+    except:
+        REGISTRY.inc('crossbot_slack_errors_total', labels)
+        raise
+    finally:
+        REGISTRY.observe('crossbot_slack_seconds', labels,
+                         time.perf_counter() - start)
+        REGISTRY.flush()
+
+
+def parse_error():
+    REGISTRY.inc('crossbot_parse_errors_total', {})
+    REGISTRY.flush()
+
+
+def plot_cache(result):
+    REGISTRY.inc('crossbot_plot_cache_total', {'result': result})
+    REGISTRY.flush()
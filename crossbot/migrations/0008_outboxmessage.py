@@ -0,0 +1,40 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0007_add_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('channel', models.CharField(max_length=20)),
+                ('text', models.TextField()),
+                ('emoji', models.CharField(blank=True, max_length=100)),
+                ('options', models.TextField(default='{}')),
+                ('message_ts', models.CharField(blank=True, max_length=30)),
+                ('attempts', models.IntegerField(default=0)),
+                ('next_attempt',
+                 models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='outboxmessage',
+            index=models.Index(
+                fields=['channel', 'id'],
+                name='crossbot_ou_channel_2e0c84_idx'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+import datetime
+
+# time model, game
+TIME_MODELS = [
+    ('MiniCrosswordTime', 'mini_crossword'),
+    ('CrosswordTime', 'crossword'),
+    ('EasySudokuTime', 'easy_sudoku'),
+]
+
+
+def build_streaks(apps, schema_editor):
+    ParticipationStreak = apps.get_model('crossbot', 'ParticipationStreak')
+    one_day = datetime.timedelta(days=1)
+
+    streaks = []
+    for model_name, game in TIME_MODELS:
+        times = (apps.get_model('crossbot', model_name).objects.order_by(
+            'user', 'date').values_list('user', 'date'))
+        streak = None
+        for user_id, date in times:
+            if (streak and streak.user_id == user_id
+                    and streak.end + one_day == date):
+                streak.end = date
+                streak.length += 1
+            else:
+                streak = ParticipationStreak(
+                    user_id=user_id, game=game, start=date, end=date, length=1)
+                streaks.append(streak)
+
+    ParticipationStreak.objects.bulk_create(streaks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0008_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipationStreak',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('game', models.CharField(max_length=20)),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('length', models.IntegerField()),
+                ('user',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     to='crossbot.CBUser')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='participationstreak',
+            index=models.Index(
+                fields=['user', 'game', 'end'],
+                name='crossbot_pa_user_id_32cc19_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='participationstreak',
+            unique_together={('user', 'game', 'start')},
+        ),
+        migrations.RunPython(build_streaks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+from django.db import migrations, models
+
+import statistics
+
+from itertools import groupby
+from operator import itemgetter
+
+# time model, game
+TIME_MODELS = [
+    ('MiniCrosswordTime', 'mini_crossword'),
+    ('CrosswordTime', 'crossword'),
+    ('EasySudokuTime', 'easy_sudoku'),
+]
+
+
+def build_summaries(apps, schema_editor):
+    ResultsSummary = apps.get_model('crossbot', 'ResultsSummary')
+
+    for model_name, game in TIME_MODELS:
+        times = (apps.get_model(
+            'crossbot', model_name).objects.order_by('date').values_list(
+                'date', 'user_id', 'seconds'))
+        for date, day in groupby(times, itemgetter(0)):
+            day = list(day)
+            solved = [seconds for _, _, seconds in day if seconds > 0]
+            winning_time = min(solved) if solved else None
+            summary = ResultsSummary.objects.create(
+                game=game,
+                date=date,
+                winning_time=winning_time,
+                solvers=len(solved),
+                fails=len(day) - len(solved),
+                median=statistics.median(solved) if solved else None)
+            summary.winners.set([
+                user_id for _, user_id, seconds in day
+                if seconds == winning_time
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0009_participationstreak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultsSummary',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('game', models.CharField(max_length=20)),
+                ('date', models.DateField()),
+                ('winning_time', models.IntegerField(blank=True, null=True)),
+                ('solvers', models.IntegerField(default=0)),
+                ('fails', models.IntegerField(default=0)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('winners',
+                 models.ManyToManyField(
+                     blank=True,
+                     related_name='winning_summaries',
+                     to='crossbot.CBUser')),
+            ],
+            options={
+                'unique_together': {('game', 'date')},
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
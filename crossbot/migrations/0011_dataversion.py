@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+import uuid
+
+GAMES = ['mini_crossword', 'crossword', 'easy_sudoku']
+
+
+def create_versions(apps, schema_editor):
+    DataVersion = apps.get_model('crossbot', 'DataVersion')
+    for game in GAMES:
+        DataVersion.objects.create(game=game, token=uuid.uuid4().hex)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0010_resultssummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('game',
+                 models.CharField(
+                     max_length=20, primary_key=True, serialize=False)),
+                ('token', models.CharField(max_length=32)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
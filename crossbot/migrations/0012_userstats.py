@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0011_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('game', models.CharField(max_length=20)),
+                ('window', models.IntegerField()),
+                ('as_of', models.DateField()),
+                ('played', models.IntegerField(default=0)),
+                ('solves', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('user',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     to='crossbot.CBUser')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(
+                fields=['game', 'window'], name='crossbot_us_game_029739_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='userstats',
+            unique_together={('user', 'game', 'window')},
+        ),
+    ]
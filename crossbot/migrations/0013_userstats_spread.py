@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0012_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='p25',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='p75',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='stdev',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,83 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+
+# time model, game
+TIME_MODELS = [
+    ('MiniCrosswordTime', 'mini_crossword'),
+    ('CrosswordTime', 'crossword'),
+    ('EasySudokuTime', 'easy_sudoku'),
+]
+
+# PersonalBest.ANY_DAY and KEEP
+ANY_DAY = 7
+KEEP = 3
+
+
+def build_personal_bests(apps, schema_editor):
+    PersonalBest = apps.get_model('crossbot', 'PersonalBest')
+
+    bests = []
+    for model_name, game in TIME_MODELS:
+        times = (apps.get_model(
+            'crossbot', model_name).objects.filter(seconds__gt=0).order_by(
+                'user', 'seconds', 'date').values_list('user', 'date',
+                                                       'seconds'))
+        for user_id, user_times in groupby(times, itemgetter(0)):
+            counts = defaultdict(int)
+            for _, date, seconds in user_times:
+                for weekday in (ANY_DAY, date.weekday()):
+                    if counts[weekday] < KEEP:
+                        counts[weekday] += 1
+                        bests.append(
+                            PersonalBest(
+                                user_id=user_id,
+                                game=game,
+                                weekday=weekday,
+                                date=date,
+                                seconds=seconds))
+
+    PersonalBest.objects.bulk_create(bests, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0013_userstats_spread'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalBest',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('game', models.CharField(max_length=20)),
+                ('weekday', models.IntegerField()),
+                ('date', models.DateField()),
+                ('seconds', models.IntegerField()),
+                ('user',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     to='crossbot.CBUser')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='personalbest',
+            index=models.Index(
+                fields=['user', 'game', 'weekday', 'seconds'],
+                name='crossbot_pe_user_id_ffac01_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='personalbest',
+            unique_together={('user', 'game', 'weekday', 'date')},
+        ),
+        migrations.RunPython(build_personal_bests, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0014_personalbest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimeRollup',
+            fields=[
+                ('id',
+                 models.AutoField(
+                     auto_created=True,
+                     primary_key=True,
+                     serialize=False,
+                     verbose_name='ID')),
+                ('game', models.CharField(max_length=20)),
+                ('period', models.CharField(max_length=5)),
+                ('start', models.DateField()),
+                ('played', models.IntegerField()),
+                ('participation', models.FloatField()),
+                ('solves', models.IntegerField()),
+                ('mean', models.FloatField(blank=True, null=True)),
+                ('median', models.FloatField(blank=True, null=True)),
+                ('min', models.FloatField(blank=True, null=True)),
+                ('user',
+                 models.ForeignKey(
+                     on_delete=django.db.models.deletion.CASCADE,
+                     to='crossbot.CBUser')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timerollup',
+            index=models.Index(
+                fields=['game', 'period', 'start'],
+                name='crossbot_ti_game_441ff6_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timerollup',
+            unique_together={('user', 'game', 'period', 'start')},
+        ),
+    ]
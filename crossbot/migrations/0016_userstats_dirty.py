@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0015_timerollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='dirty',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crossbot', '0016_userstats_dirty'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dataversion',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20,
+                primary_key=True,
+                serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='participationstreak',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='personalbest',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='resultssummary',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='timerollup',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='userstats',
+            name='game',
+            field=models.CharField(
+                choices=[('mini_crossword', 'Mini crossword'),
+                         ('crossword', 'Crossword'),
+                         ('easy_sudoku', 'Easy sudoku')],
+                max_length=20),
+        ),
+    ]
@@ -1,24 +1,90 @@
 """Crossbot Django models."""
 
 import datetime
+import hashlib
+import json
 import logging
 import random
+import statistics
+import threading
+import uuid
 
-from operator import attrgetter
+from collections import defaultdict, namedtuple
+from itertools import groupby
+from operator import attrgetter, itemgetter
 from os import path
 
-import yaml
-
 from django.contrib.auth.models import User
 from django.contrib.staticfiles.templatetags.staticfiles import static
-from django.db import models, transaction
+from django.core.cache import cache
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 
-from .settings import CROSSBUCKS_PER_SOLVE, ITEM_DROP_RATE
+from .settings import (CROSSBUCKS_PER_SOLVE, ITEM_DROP_RATE,
+                       OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_SECONDS)
+from .timefmt import fmt_seconds
 
 logger = logging.getLogger(__name__)
 
 
+class IdentityCache:
+    """A per-process cache of CBUser rows, keyed by slackid.
+
+    Every gunicorn worker has its own entries, so any change to a CBUser
+    (other than to its crossbucks) bumps a generation token kept in the shared
+    Django cache, and each worker drops all of its entries when it sees a new
+    token. Only committed rows are cached, and lookups hand out fresh CBUser
+    instances, so callers are free to modify them.
+    """
+
+    GENERATION_KEY = 'crossbot.cbuser.generation'
+
+    def __init__(self):
+        self.entries = {}
+        self.generation = None
+        self.lock = threading.Lock()
+
+    def get(self, slackid):
+        """Returns (user or None, generation to pass to `put` on a miss)."""
+        generation = cache.get(self.GENERATION_KEY)
+        with self.lock:
+            if generation != self.generation:
+                self.entries = {}
+                self.generation = generation
+            values = self.entries.get(slackid)
+
+        if values is None:
+            return None, generation
+        field_names = [f.attname for f in CBUser._meta.concrete_fields]
+        return CBUser.from_db('default', field_names, values), generation
+
+    def put(self, user, generation):
+        values = tuple(
+            getattr(user, f.attname) for f in CBUser._meta.concrete_fields)
+
+        def put():
+            with self.lock:
+                # don't cache what we read before someone else's change
+                if generation == self.generation:
+                    self.entries[user.slackid] = values
+
+        # a row from an uncommitted transaction might get rolled back
+        transaction.on_commit(put)
+
+    def invalidate(self, slackid):
+        with self.lock:
+            self.entries.pop(slackid, None)
+        transaction.on_commit(lambda: cache.set(self.GENERATION_KEY,
+                                                uuid.uuid4().hex, None))
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+
 # TODO: switch from return codes to exceptions to help with transactions???
 #       or, we can use set_rollback
 #       https://stackoverflow.com/questions/39332010/django-how-to-rollback-transaction-atomic-without-raising-exception
@@ -43,26 +109,43 @@ class CBUser(models.Model):
         on_delete=models.SET_NULL,
         related_name='cb_user')
 
+    identity_cache = IdentityCache()
+
     @classmethod
     def from_slackid(cls, slackid, slackname=None, create=True):
         """Gets or creates the user with slackid, updating slackname.
 
+        Users are served from the identity cache when possible, and only
+        written to if they are new or their slackname changed.
+
         Returns:
             The CBUser if it exists or create=True, None otherwise.
         """
-        if create and slackname:
-            return cls.objects.update_or_create(
-                slackid=slackid, defaults={'slackname': slackname})[0]
-        if create:
-            return cls.objects.get_or_create(slackid=slackid)[0]
-        try:
-            user = cls.objects.get(slackid=slackid)
-            if slackname:
-                user.slackname = slackname
-                user.save()
-            return user
-        except cls.DoesNotExist:
-            return None
+        user, generation = cls.identity_cache.get(slackid)
+        if user is None:
+            try:
+                user = cls.objects.get(slackid=slackid)
+            except cls.DoesNotExist:
+                if not create:
+                    return None
+                user = cls.objects.get_or_create(
+                    slackid=slackid, defaults={'slackname': slackname
+                                               or ''})[0]
+            cls.identity_cache.put(user, generation)
+
+        if slackname and user.slackname != slackname:
+            user.slackname = slackname
+            user.save(update_fields=['slackname'])
+        return user
+
+    @classmethod
+    def name_from_slackid(cls, slackid):
+        """The display name for slackid, or slackid for unknown users."""
+        user = cls.from_slackid(slackid, create=False)
+        if user:
+            return str(user)
+        logger.debug("Can't find slack name for %s", slackid)
+        return slackid
 
     @classmethod
     def update_slacknames(cls):
@@ -122,11 +205,20 @@ class CBUser(models.Model):
             return (False, time)
 
         time = time_model.objects.create(user=self, date=date, seconds=seconds)
+        ParticipationStreak.add_day(self, time_model, date)
+        PersonalBest.add_solve(self, time_model, date, seconds)
+        winners = ResultsSummary.winner_set(time_model, date)
+        ResultsSummary.refresh(time_model, date)
+        DataVersion.bump(time_model.game)
+        # the user, and anyone who started or stopped winning that day
+        winners ^= ResultsSummary.winner_set(time_model, date)
+        UserStats.update(time_model, winners | {self.pk})
+        TimeRollup.update(self, time_model, date)
 
         # Give the user crossbucks
         self.refresh_from_db()  # refresh this object inside the transaction
         self.crossbucks += CROSSBUCKS_PER_SOLVE
-        self.save()
+        self.save(update_fields=['crossbucks'])
 
         return (True, time)
 
@@ -150,14 +242,31 @@ class CBUser(models.Model):
 
         time_str = str(time)
         time.delete()
+        ParticipationStreak.remove_day(self, time_model, date)
+        PersonalBest.remove_solve(self, time_model, date)
+        winners = ResultsSummary.winner_set(time_model, date)
+        ResultsSummary.refresh(time_model, date)
+        DataVersion.bump(time_model.game)
+        winners ^= ResultsSummary.winner_set(time_model, date)
+        UserStats.update(time_model, winners | {self.pk})
+        TimeRollup.update(self, time_model, date)
 
         # Take away crossbucks from the user
         self.refresh_from_db()  # refresh this object inside the transaction
         self.crossbucks -= CROSSBUCKS_PER_SOLVE
-        self.save()
+        self.save(update_fields=['crossbucks'])
 
         return time_str
 
+    def stats(self, time_model, window=30):
+        """This user's UserStats over the last `window` days, or None.
+
+        Args:
+            window: One of UserStats.WINDOWS.
+        """
+        return UserStats.objects.filter(
+            user=self, game=time_model.game, window=window).first()
+
     def times(self, time_model):
         """Returns a QuerySet with times this user has completed."""
         assert issubclass(time_model, CommonTime)
@@ -250,6 +359,67 @@ class CBUser(models.Model):
         return str(self.slackid)
 
 
+@receiver(post_save, sender=CBUser)
+@receiver(post_delete, sender=CBUser)
+def invalidate_cbuser(sender, instance, update_fields=None, **kwargs):
+    # crossbucks aren't trusted from the cache anyway, see CBUser.add_time
+    if update_fields and set(update_fields) == {'crossbucks'}:
+        return
+    CBUser.identity_cache.invalidate(instance.slackid)
+
+
+# Announcements are cached under the data version, so this is only how long
+# an unused snapshot sticks around
+ANNOUNCEMENT_CACHE_SECONDS = 24 * 60 * 60
+
+# Each user's win streaks with the gaps-and-islands trick, see
+# CommonTime.win_streak_stats
+WIN_STREAKS_SQL = '''
+WITH wins AS (
+    SELECT w.{user_id} AS user_id,
+           s.date AS date,
+           {day_number} - ROW_NUMBER() OVER (
+               PARTITION BY w.{user_id} ORDER BY s.date) AS island
+    FROM {summary} s
+    JOIN {winners} w ON w.{summary_id} = s.id
+    WHERE s.game = %s AND s.date <= %s
+), streaks AS (
+    SELECT user_id,
+           MIN(date) AS start_date,
+           MAX(date) AS end_date,
+           COUNT(*) AS length
+    FROM wins
+    GROUP BY user_id, island
+), ranked AS (
+    SELECT streaks.*,
+           ROW_NUMBER() OVER (
+               PARTITION BY user_id ORDER BY length DESC, start_date
+           ) AS streak_rank
+    FROM streaks
+)
+SELECT user_id,
+       MAX(CASE WHEN end_date = %s THEN start_date END),
+       MAX(CASE WHEN end_date = %s THEN length END),
+       MAX(CASE WHEN streak_rank = 1 THEN start_date END),
+       MAX(CASE WHEN streak_rank = 1 THEN length END)
+FROM ranked
+GROUP BY user_id
+'''
+
+# A user's win streaks as of some date. The current streak is (None, 0) if
+# they didn't win that day; the longest is the earliest one if tied.
+WinStreaks = namedtuple(
+    'WinStreaks',
+    ['current_start', 'current_length', 'longest_start', 'longest_length'])
+
+
+def _to_date(value):
+    # SQLite hands back dates from raw queries as strings
+    if isinstance(value, str):
+        return parse_date(value)
+    return value
+
+
 class CommonTime(models.Model):
     class Meta:
         unique_together = ("user", "date")
@@ -260,6 +430,9 @@ class CommonTime(models.Model):
     date = models.DateField()
     timestamp = models.DateTimeField(null=True, auto_now_add=True)
 
+    # names this kind of time in tables shared by all of them
+    game = None
+
     @classmethod
     def all_times(cls):
         return cls.objects.all()
@@ -275,10 +448,7 @@ class CommonTime(models.Model):
     def time_str(self):
         if self.is_fail():
             return 'fail'
-
-        minutes, seconds = divmod(self.seconds, 60)
-
-        return '{}:{:02}'.format(minutes, seconds)
+        return fmt_seconds(self.seconds)
 
     def __str__(self):
         return '{} - {} - {}'.format(self.user, self.time_str(), self.date)
@@ -309,34 +479,32 @@ class CommonTime(models.Model):
 
     @classmethod
     def winning_times(cls, qs=None):
-        # TODO is the isnull necessary?
         if qs is None:
-            qs = cls.objects.filter(seconds__isnull=False, seconds__gt=0)
-        values = qs.values_list('date').annotate(
-            winning_time=models.Min('seconds'))
+            values = ResultsSummary.objects.filter(
+                game=cls.game, winning_time__isnull=False).values_list(
+                    'date', 'winning_time')
+        else:
+            values = qs.values_list('date').annotate(
+                winning_time=models.Min('seconds'))
 
         return {date: winning_time for date, winning_time in values}
 
     @classmethod
     def winners(cls, date):
-        entries = cls.objects.filter(
-            seconds__isnull=False, seconds__gt=0, date=date)
-        try:
-            best = min(e.seconds for e in entries)
-            winners = [e for e in entries if e.seconds == best]
-            assert winners
-            return winners
-        except ValueError as e:
-            # entries was empty
+        summary = ResultsSummary.for_date(cls, date)
+        if summary is None or summary.winning_time is None:
             return []
+        return list(
+            cls.objects.filter(date=date,
+                               seconds=summary.winning_time).order_by('pk'))
 
     @classmethod
     def wins(cls, user, qs=None):
         if qs is None:
             qs = cls.objects
-        qs = qs.filter(seconds__isnull=False, seconds__gt=0, user=user)
-        wins = cls.winning_times()
-        return [e for e in qs if e.seconds == wins[e.date]]
+        won = ResultsSummary.objects.filter(
+            game=cls.game, winners=user).values('date')
+        return list(qs.filter(user=user, date__in=won).order_by('date'))
 
     @classmethod
     def win_streaks(cls, user, qs=None):
@@ -344,21 +512,99 @@ class CommonTime(models.Model):
         return cls.streaks(wins)
 
     @classmethod
-    # TODO: should this take a date or a timestamp?
+    def win_streak_stats(cls, date):
+        """Find every user's current and longest win streaks in one query.
+
+        Wins are numbered by date for each user, so the wins in a streak all
+        have the same date minus number ("gaps and islands"). Needs window
+        functions, so SQLite 3.25+ or Postgres.
+
+        Returns:
+            {user_id: WinStreaks} for each user who won on or before `date`.
+            A current streak is one that includes `date`.
+        """
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+
+        if connection.vendor == 'sqlite':
+            day_number = 'julianday(s.date)'
+        else:
+            day_number = "(s.date - DATE '2000-01-01')"
+
+        winners = ResultsSummary.winners.through
+        sql = WIN_STREAKS_SQL.format(
+            day_number=day_number,
+            summary=ResultsSummary._meta.db_table,
+            winners=winners._meta.db_table,
+            summary_id=winners._meta.get_field('resultssummary').column,
+            user_id=winners._meta.get_field('cbuser').column,
+        )
+        date_param = connection.ops.adapt_datefield_value(date)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [cls.game, date_param, date_param, date_param])
+            rows = cursor.fetchall()
+
+        return {
+            user_id: WinStreaks(
+                _to_date(current_start), current_length or 0,
+                _to_date(longest_start), longest_length)
+            for (user_id, current_start, current_length, longest_start,
+                 longest_length) in rows
+        }
+
+    @classmethod
     def current_win_streaks(cls, date):
+        """Returns {user: [times in their win streak]} for streaks to `date`."""
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+
+        current = {
+            user_id: stats.current_start
+            for user_id, stats in cls.win_streak_stats(date).items()
+            if stats.current_length
+        }
+        if not current:
+            return {}
+
+        times = cls.objects.filter(
+            user_id__in=current,
+            date__gte=min(current.values()),
+            date__lte=date).select_related('user').order_by('date')
+
         result = {}
-        # get the win streaks up to this date
-        qs = cls.objects.filter(date__lte=date)
-        for w in cls.winners(date):
-            streaks = cls.win_streaks(w.user, qs)
-            latest_streak = streaks[-1]
-            # only include the streak if it comes up to this day
-            if latest_streak[-1].date == date:
-                result[w.user] = latest_streak
+        for time in times:
+            if time.date >= current[time.user_id]:
+                result.setdefault(time.user, []).append(time)
         return result
 
     @classmethod
     def announcement_data(cls, date):
+        """Who is on a win streak and who won, for announcing on `date`.
+
+        This is cached until the times change (see DataVersion), so the
+        announce command and the cron jobs can all use it freely.
+
+        Returns:
+            A dict with the 'streaks' as (name, length) pairs, the names of
+            the other 'winners_today' and 'winners_yesterday', and the game
+            'links'.
+        """
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+
+        # names are cached too, so renames also need a new snapshot
+        key = 'crossbot.announcement.{}.{}.{}.{}'.format(
+            cls.game, date, DataVersion.get(cls.game),
+            cache.get(IdentityCache.GENERATION_KEY))
+        data = cache.get(key)
+        if data is None:
+            data = cls._announcement_data(date)
+            cache.set(key, data, ANNOUNCEMENT_CACHE_SECONDS)
+        return data
+
+    @classmethod
+    def _announcement_data(cls, date):
         streaks = [(u, s) for u, s in cls.current_win_streaks(date).items()
                    if len(s) > 1]
         # sort by streak length, descending
@@ -381,7 +627,7 @@ class CommonTime(models.Model):
         }
 
         return {
-            'streaks': streaks,
+            'streaks': [(str(u), len(s)) for u, s in streaks],
             'winners_today': winners1,
             'winners_yesterday': winners2,
             'links': games
@@ -390,47 +636,25 @@ class CommonTime(models.Model):
     @classmethod
     # TODO: should this be in model?
     def announcement_message(cls, date):
-
-        # get the long streaks
-        streaks = [(u, s) for u, s in cls.current_win_streaks(date).items()
-                   if len(s) > 1]
-        # sort by streak length, descending
-        streaks.sort(key=lambda x: len(x[1]), reverse=True)
-        streakers = set(u for u, s in streaks)
-
-        # get the winners who were not included in the long streaks
-        winners1 = [
-            w.user for w in cls.winners(date) if w.user not in streakers
-        ]
-        yest = date - datetime.timedelta(days=1)
-        winners2 = [
-            w.user for w in cls.winners(yest) if w.user not in streakers
-        ]
+        data = cls.announcement_data(date)
 
         # start with the streak messages
         msgs = [
             '{u} is on a {n}-day streak! {emoji}'.format(
-                u=u, n=len(streak), emoji=':fire:' * len(streak))
-            for u, streak in streaks
+                u=u, n=n, emoji=':fire:' * n) for u, n in data['streaks']
         ]
 
         # now add the other winners
-        also = ' also' if streakers else ''
-        if winners1:
-            msgs.append(', '.join(str(u) for u in winners1) + also + ' won.')
-        if winners2:
-            msgs.append(', '.join(str(u) for u in winners2) + also +
+        also = ' also' if data['streaks'] else ''
+        if data['winners_today']:
+            msgs.append(', '.join(data['winners_today']) + also + ' won.')
+        if data['winners_yesterday']:
+            msgs.append(', '.join(data['winners_yesterday']) + also +
                         ' won the day before.')
 
-        games = {
-            "mini crossword": "https://www.nytimes.com/crosswords/game/mini",
-            "easy sudoku":
-            "https://www.nytimes.com/crosswords/game/sudoku/easy"
-        }
-
         msgs.append("Play today's:")
-        for game in games:
-            msgs.append("{} : {}".format(game, games[game]))
+        for game, link in data['links'].items():
+            msgs.append("{} : {}".format(game, link))
 
         return '\n'.join(msgs)
 
@@ -444,15 +668,777 @@ class CommonTime(models.Model):
 
 
 class MiniCrosswordTime(CommonTime):
-    pass
+    game = 'mini_crossword'
 
 
 class CrosswordTime(CommonTime):
-    pass
+    game = 'crossword'
 
 
 class EasySudokuTime(CommonTime):
-    pass
+    game = 'easy_sudoku'
+
+
+TIME_MODELS = (MiniCrosswordTime, CrosswordTime, EasySudokuTime)
+GAMES = [(time_model.game, time_model.game.replace('_', ' ').capitalize())
+         for time_model in TIME_MODELS]
+
+
+class GameModel(models.Model):
+    """A model with rows for each game, kept alongside the times."""
+
+    class Meta:
+        abstract = True
+
+    # the `game` of a CommonTime subclass
+    game = models.CharField(max_length=20, choices=GAMES)
+
+
+class DataVersion(GameModel):
+    """A token that changes whenever a game's times do, for cache keys.
+
+    Tokens are random rather than counters, so a version from a rolled back
+    transaction (or another database) is never reused.
+    """
+
+    game = models.CharField(max_length=20, choices=GAMES, primary_key=True)
+    token = models.CharField(max_length=32)
+
+    @classmethod
+    def get(cls, game):
+        token = cls.objects.filter(game=game).values_list(
+            'token', flat=True).first()
+        return token or ''
+
+    @classmethod
+    def bump(cls, game):
+        token = uuid.uuid4().hex
+        if not cls.objects.filter(game=game).update(token=token):
+            cls.objects.create(game=game, token=token)
+
+    def __str__(self):
+        return '{} - {}'.format(self.game, self.token)
+
+
+class ParticipationStreak(GameModel):
+    """A run of consecutive days that a user submitted a time for a game.
+
+    Kept up to date by CBUser.add_time and remove_time, so streaks can be
+    looked up without loading a user's whole history. Rebuild the table from
+    the times with `./manage.py rebuild_tables streaks`.
+    """
+
+    class Meta:
+        unique_together = (('user', 'game', 'start'), )
+        indexes = [models.Index(fields=['user', 'game', 'end'])]
+
+    user = models.ForeignKey(CBUser, on_delete=models.CASCADE)
+    start = models.DateField()
+    end = models.DateField()
+    length = models.IntegerField()
+
+    def days_before(self, date):
+        """The number of days of this streak before `date`."""
+        return (date - self.start).days
+
+    def set_dates(self, start, end):
+        self.start = start
+        self.end = end
+        self.length = (end - start).days + 1
+        self.save()
+
+    @classmethod
+    def streaks(cls, user, time_model):
+        return cls.objects.filter(user=user, game=time_model.game)
+
+    @classmethod
+    def containing(cls, user, time_model, date):
+        """The streak that includes `date`, or None."""
+        return cls.streaks(user, time_model).filter(
+            start__lte=date, end__gte=date).first()
+
+    @classmethod
+    def current(cls, user, time_model):
+        """The user's latest streak, or None."""
+        return cls.streaks(user, time_model).order_by('-end').first()
+
+    @classmethod
+    def longest(cls, user, time_model):
+        """The user's longest streak (the earliest, if tied), or None."""
+        return cls.streaks(user, time_model).order_by('-length',
+                                                      'start').first()
+
+    @classmethod
+    def gaps(cls, user, time_model, start, end):
+        """The runs of days from `start` to `end` without a time, latest first.
+
+        The gaps are between the streaks, so this walks the streaks in one
+        query instead of looking at every time.
+
+        Yields:
+            (first, last) date pairs, inclusive.
+        """
+        one_day = datetime.timedelta(days=1)
+        streaks = cls.streaks(user, time_model).filter(
+            end__gte=start, start__lte=end).order_by('-end')
+
+        day = end
+        for streak in streaks.iterator():
+            if streak.end < day:
+                yield max(streak.end + one_day, start), day
+            if streak.start <= start:
+                return
+            day = streak.start - one_day
+        if day >= start:
+            yield start, day
+
+    @classmethod
+    def add_day(cls, user, time_model, date):
+        """Record a new time on `date`, extending or joining streaks.
+
+        Returns:
+            The streak that now includes `date`.
+        """
+        one_day = datetime.timedelta(days=1)
+        streaks = cls.streaks(user, time_model)
+
+        streak = cls.containing(user, time_model, date)
+        if streak:
+            return streak
+
+        before = streaks.filter(end=date - one_day).first()
+        after = streaks.filter(start=date + one_day).first()
+
+        if before and after:
+            # this day joins two streaks
+            end = after.end
+            after.delete()
+            before.set_dates(before.start, end)
+            return before
+        if before:
+            before.set_dates(before.start, date)
+            return before
+        if after:
+            after.set_dates(date, after.end)
+            return after
+        return cls.objects.create(
+            user=user, game=time_model.game, start=date, end=date, length=1)
+
+    @classmethod
+    def remove_day(cls, user, time_model, date):
+        """Forget the time on `date`, shortening or splitting its streak."""
+        one_day = datetime.timedelta(days=1)
+
+        streak = cls.containing(user, time_model, date)
+        if not streak:
+            return
+
+        if streak.start == streak.end:
+            streak.delete()
+        elif date == streak.start:
+            streak.set_dates(date + one_day, streak.end)
+        elif date == streak.end:
+            streak.set_dates(streak.start, date - one_day)
+        else:
+            end = streak.end
+            streak.set_dates(streak.start, date - one_day)
+            cls.objects.create(
+                user=user,
+                game=time_model.game,
+                start=date + one_day,
+                end=end,
+                length=(end - date).days)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recompute every streak from the times tables.
+
+        Returns:
+            The number of streaks.
+        """
+        cls.objects.all().delete()
+
+        one_day = datetime.timedelta(days=1)
+        streaks = []
+        for time_model in TIME_MODELS:
+            times = time_model.objects.order_by('user', 'date').values_list(
+                'user', 'date')
+            streak = None
+            for user_id, date in times:
+                if (streak and streak.user_id == user_id
+                        and streak.end + one_day == date):
+                    streak.end = date
+                    streak.length += 1
+                else:
+                    streak = cls(
+                        user_id=user_id,
+                        game=time_model.game,
+                        start=date,
+                        end=date,
+                        length=1)
+                    streaks.append(streak)
+
+        cls.objects.bulk_create(streaks)
+        return len(streaks)
+
+    def __str__(self):
+        return '{} - {} - {} days from {}'.format(self.user, self.game,
+                                                  self.length, self.start)
+
+
+class ResultsSummary(GameModel):
+    """The results of one game on one date.
+
+    Kept up to date by CBUser.add_time and remove_time, so winners can be
+    found without scanning the times tables. Rebuild the table from the times
+    with `./manage.py rebuild_tables results`.
+    """
+
+    class Meta:
+        unique_together = (('game', 'date'), )
+
+    date = models.DateField()
+
+    # None if nobody has solved it
+    winning_time = models.IntegerField(null=True, blank=True)
+    winners = models.ManyToManyField(
+        CBUser, blank=True, related_name='winning_summaries')
+    solvers = models.IntegerField(default=0)
+    fails = models.IntegerField(default=0)
+    median = models.FloatField(null=True, blank=True)
+
+    @classmethod
+    def for_date(cls, time_model, date):
+        return cls.objects.filter(game=time_model.game, date=date).first()
+
+    @classmethod
+    def refresh(cls, time_model, date):
+        """Recompute the summary for `date` from its times.
+
+        Returns:
+            The summary, or None if there are no times that day.
+        """
+        times = list(
+            time_model.objects.filter(date=date).values_list(
+                'user_id', 'seconds'))
+        if not times:
+            cls.objects.filter(game=time_model.game, date=date).delete()
+            return None
+
+        summary, _ = cls.objects.get_or_create(game=time_model.game, date=date)
+        summary.summarize(times)
+        summary.save()
+        summary.winners.set(summary.winner_ids(times))
+        return summary
+
+    @classmethod
+    def winner_set(cls, time_model, date):
+        """The ids of the users who won on `date`."""
+        return set(
+            cls.winners.through.objects.filter(
+                resultssummary__game=time_model.game,
+                resultssummary__date=date).values_list('cbuser_id', flat=True))
+
+    def summarize(self, times):
+        """Set the counts from a list of (user_id, seconds)."""
+        solved = [seconds for _, seconds in times if seconds > 0]
+        self.solvers = len(solved)
+        self.fails = len(times) - len(solved)
+        self.winning_time = min(solved) if solved else None
+        self.median = statistics.median(solved) if solved else None
+
+    def winner_ids(self, times):
+        return [
+            user_id for user_id, seconds in times
+            if seconds == self.winning_time
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recompute every summary from the times tables.
+
+        Returns:
+            The number of summaries.
+        """
+        cls.objects.all().delete()
+
+        count = 0
+        for time_model in TIME_MODELS:
+            times = time_model.objects.order_by('date').values_list(
+                'date', 'user_id', 'seconds')
+            for date, day in groupby(times, itemgetter(0)):
+                day = [(user_id, seconds) for _, user_id, seconds in day]
+                summary = cls(game=time_model.game, date=date)
+                summary.summarize(day)
+                summary.save()
+                summary.winners.set(summary.winner_ids(day))
+                count += 1
+
+        return count
+
+    def __str__(self):
+        return '{} - {} - {} solved'.format(self.game, self.date, self.solvers)
+
+
+class PersonalBest(GameModel):
+    """One of a user's fastest solves of a game, overall or on one weekday.
+
+    At least the KEEP fastest solves of each (user, game, weekday) are kept,
+    and kept up to date by CBUser.add_time and remove_time. So when a personal
+    best is removed the next best is already here. The lists are topped up to
+    KEEP + RESERVE, so the times only need to be looked at again once enough
+    removals take one below KEEP. Rebuild the table from the times with
+    `./manage.py rebuild_tables personal_bests`.
+    """
+
+    # the weekday of the overall bests, the others are date.weekday()
+    ANY_DAY = 7
+    KEEP = 3
+    RESERVE = 3
+
+    class Meta:
+        unique_together = (('user', 'game', 'weekday', 'date'), )
+        indexes = [models.Index(fields=['user', 'game', 'weekday', 'seconds'])]
+
+    user = models.ForeignKey(CBUser, on_delete=models.CASCADE)
+    weekday = models.IntegerField()
+    date = models.DateField()
+    seconds = models.IntegerField()
+
+    @classmethod
+    def ranked(cls, user, time_model, weekday=ANY_DAY):
+        """The kept solves, fastest first (the earliest, if tied)."""
+        return cls.objects.filter(
+            user=user, game=time_model.game, weekday=weekday).order_by(
+                'seconds', 'date')
+
+    @classmethod
+    def best(cls, user, time_model, weekday=ANY_DAY):
+        """The user's personal best, or None if they haven't solved one."""
+        return cls.ranked(user, time_model, weekday).first()
+
+    @classmethod
+    def bests(cls, user, time_model):
+        """A dict of weekday (or ANY_DAY) to the user's personal best."""
+        bests = {}
+        for pb in cls.objects.filter(
+                user=user, game=time_model.game).order_by('-seconds', '-date'):
+            bests[pb.weekday] = pb
+        return bests
+
+    @classmethod
+    def is_new(cls, user, time_model, date, weekday=ANY_DAY):
+        """Whether the solve on `date` beat the user's previous best."""
+        top = list(cls.ranked(user, time_model, weekday)[:2])
+        return (len(top) == 2 and top[0].date == date
+                and top[0].seconds < top[1].seconds)
+
+    @classmethod
+    def add_solve(cls, user, time_model, date, seconds):
+        """Record a new time on `date`, if it's one of the fastest."""
+        if seconds <= 0:
+            return
+
+        for weekday in (cls.ANY_DAY, date.weekday()):
+            kept = list(cls.ranked(user, time_model, weekday))
+            # below KEEP, the list has all of the user's solves. Otherwise
+            # there may be slower ones that aren't kept, so a solve slower
+            # than all of the kept ones can't go on the end.
+            if len(kept) >= cls.KEEP:
+                slowest = kept[-1]
+                if (seconds, date) > (slowest.seconds, slowest.date):
+                    continue
+                if len(kept) == cls.KEEP + cls.RESERVE:
+                    slowest.delete()
+            cls.objects.create(
+                user=user,
+                game=time_model.game,
+                weekday=weekday,
+                date=date,
+                seconds=seconds)
+
+    @classmethod
+    def remove_solve(cls, user, time_model, date):
+        """Forget the time on `date`, topping up the lists it was in that
+        are now too short."""
+        kept = cls.objects.filter(user=user, game=time_model.game, date=date)
+        weekdays = list(kept.values_list('weekday', flat=True))
+        kept.delete()
+        for weekday in weekdays:
+            kept = list(cls.ranked(user, time_model, weekday))
+            if len(kept) < cls.KEEP:
+                cls.top_up(user, time_model, weekday, kept)
+
+    @classmethod
+    def top_up(cls, user, time_model, weekday, kept):
+        """Fill the list of `kept` solves back up to KEEP + RESERVE with the
+        next fastest solves."""
+        solves = time_model.objects.filter(user=user, seconds__gt=0)
+        if weekday != cls.ANY_DAY:
+            # Django counts from Sunday = 1
+            solves = solves.filter(date__week_day=(weekday + 1) % 7 + 1)
+        if kept:
+            slowest = kept[-1]
+            solves = solves.filter(
+                models.Q(seconds__gt=slowest.seconds)
+                | models.Q(seconds=slowest.seconds, date__gt=slowest.date))
+        solves = solves.order_by('seconds', 'date').values_list(
+            'date', 'seconds')[:cls.KEEP + cls.RESERVE - len(kept)]
+        cls.objects.bulk_create(
+            cls(user=user,
+                game=time_model.game,
+                weekday=weekday,
+                date=date,
+                seconds=seconds) for date, seconds in solves)
+
+    @classmethod
+    def fastest(cls, user_id, time_model, times):
+        """Make the rows for a user from their (date, seconds) solves."""
+        counts = defaultdict(int)
+        for date, seconds in sorted(times, key=itemgetter(1, 0)):
+            for weekday in (cls.ANY_DAY, date.weekday()):
+                if counts[weekday] < cls.KEEP + cls.RESERVE:
+                    counts[weekday] += 1
+                    yield cls(
+                        user_id=user_id,
+                        game=time_model.game,
+                        weekday=weekday,
+                        date=date,
+                        seconds=seconds)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recompute every personal best from the times tables.
+
+        Returns:
+            The number of rows.
+        """
+        cls.objects.all().delete()
+
+        bests = []
+        for time_model in TIME_MODELS:
+            times = time_model.objects.filter(
+                seconds__gt=0).order_by('user').values_list(
+                    'user', 'date', 'seconds')
+            for user_id, user_times in groupby(times, itemgetter(0)):
+                bests.extend(
+                    cls.fastest(user_id, time_model,
+                                [(d, s) for _, d, s in user_times]))
+
+        cls.objects.bulk_create(bests, batch_size=500)
+        return len(bests)
+
+    def __str__(self):
+        return '{} - {} - {} on {}'.format(self.user, self.game, self.seconds,
+                                           self.date)
+
+
+class UserStats(GameModel):
+    """A user's results in one game over the last `window` days.
+
+    The leaderboard ranks these, so it never has to look at the times. Rows
+    are computed as of a date by the RollUserStats cron job, in chunks. It
+    recomputes them all once the date changes, since the windows move every
+    day, and in between recomputes the users CBUser.add_time and remove_time
+    queued (see `update`).
+    See CBUser.stats.
+    """
+
+    ALL_TIME = 0
+    WINDOWS = [7, 30, 365, ALL_TIME]
+
+    class Meta:
+        unique_together = (('user', 'game', 'window'), )
+        indexes = [models.Index(fields=['game', 'window'])]
+
+    user = models.ForeignKey(CBUser, on_delete=models.CASCADE)
+    # in days, or ALL_TIME
+    window = models.IntegerField()
+    as_of = models.DateField()
+    # queued to be recomputed, since the user's results changed
+    dirty = models.BooleanField(default=False)
+
+    played = models.IntegerField(default=0)
+    solves = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    # of the solves, None without any
+    mean = models.FloatField(null=True, blank=True)
+    median = models.FloatField(null=True, blank=True)
+    p25 = models.FloatField(null=True, blank=True)
+    p75 = models.FloatField(null=True, blank=True)
+    # population standard deviation
+    stdev = models.FloatField(null=True, blank=True)
+
+    @classmethod
+    def as_of_date(cls, time_model):
+        """The date the game's stats were computed for, or None.
+
+        While RollUserStats is partway through moving them along, this is
+        the older date.
+        """
+        return cls.objects.filter(game=time_model.game).aggregate(
+            as_of=models.Min('as_of'))['as_of']
+
+    @classmethod
+    def update(cls, time_model, user_ids):
+        """Queue some users' stats to be recomputed, after their results
+        changed.
+
+        RollUserStats recomputes them, so adding a time doesn't have to
+        read back everything the user (and everyone they won or lost a day
+        to) ever did. Until then their old stats stay on the leaderboard.
+        """
+        as_of = cls.as_of_date(time_model)
+        if as_of is None:
+            # nothing to update until RollUserStats first computes them
+            return
+
+        rows = cls.objects.filter(game=time_model.game, user__in=user_ids)
+        queued = set(rows.values_list('user_id', flat=True))
+        rows.update(dirty=True)
+        # a placeholder for new players, which doesn't count as having played
+        cls.objects.bulk_create(
+            cls(user_id=user_id,
+                game=time_model.game,
+                window=cls.ALL_TIME,
+                as_of=as_of,
+                dirty=True) for user_id in user_ids if user_id not in queued)
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, time_model, as_of, user_ids=None):
+        """Recompute everyone's stats in a game as of a date.
+
+        This does each window for all users at once, see crossbot.userstats.
+
+        Args:
+            user_ids: Only recompute these users' stats, if given.
+
+        Returns:
+            The number of users with stats.
+        """
+        # numpy is slow to import, and only needed here
+        import numpy as np
+        from .userstats import window_stats
+
+        slackids = {}
+
+        def index(slackid):
+            return slackids.setdefault(slackid, len(slackids))
+
+        times = time_model.objects.all()
+        wins = ResultsSummary.winners.through.objects.filter(
+            resultssummary__game=time_model.game)
+        rows = cls.objects.filter(game=time_model.game)
+        if user_ids is not None:
+            times = times.filter(user_id__in=user_ids)
+            wins = wins.filter(cbuser_id__in=user_ids)
+            rows = rows.filter(user_id__in=user_ids)
+
+        times = list(times.values_list('user_id', 'date', 'seconds'))
+        users = np.array([index(u) for u, _, _ in times], dtype=int)
+        dates = np.array([d.toordinal() for _, d, _ in times], dtype=int)
+        seconds = np.array([s for _, _, s in times], dtype=int)
+
+        wins = list(wins.values_list('cbuser_id', 'resultssummary__date'))
+        win_users = np.array([index(u) for u, _ in wins], dtype=int)
+        win_dates = np.array([d.toordinal() for _, d in wins], dtype=int)
+
+        slackids = list(slackids)
+        stats = []
+        for window in cls.WINDOWS:
+            start = (as_of - datetime.timedelta(days=window - 1)
+                     if window else datetime.date.min)
+            values = window_stats(
+                len(slackids), users, dates, seconds, win_users, win_dates,
+                start.toordinal(), as_of.toordinal())
+            # NaN means no solves
+            values = {
+                field: [None if np.isnan(v) else v for v in column.tolist()]
+                for field, column in values.items()
+            }
+            for i, slackid in enumerate(slackids):
+                stats.append(
+                    cls(user_id=slackid,
+                        game=time_model.game,
+                        window=window,
+                        as_of=as_of,
+                        **{
+                            field: column[i]
+                            for field, column in values.items()
+                        }))
+
+        rows.delete()
+        cls.objects.bulk_create(stats, batch_size=500)
+        return len(slackids)
+
+    def __str__(self):
+        return '{} - {} - {} days'.format(self.user, self.game, self.window
+                                          or 'all')
+
+
+class TimeRollup(GameModel):
+    """A user's times in one game over a week or a month.
+
+    Plots of long ranges draw these instead of a point per day, see plot.
+    The RollupTimes cron job rebuilds them every night, and once it has,
+    CBUser.add_time and remove_time keep the affected weeks and months up to
+    date.
+    """
+
+    WEEK = 'week'
+    MONTH = 'month'
+    PERIODS = [WEEK, MONTH]
+
+    class Meta:
+        unique_together = (('user', 'game', 'period', 'start'), )
+        indexes = [models.Index(fields=['game', 'period', 'start'])]
+
+    user = models.ForeignKey(CBUser, on_delete=models.CASCADE)
+    period = models.CharField(max_length=5)
+    # the Monday, or the 1st of the month
+    start = models.DateField()
+
+    played = models.IntegerField()
+    # the fraction of the days in the period played
+    participation = models.FloatField()
+    solves = models.IntegerField()
+    # of the solves, None without any
+    mean = models.FloatField(null=True, blank=True)
+    median = models.FloatField(null=True, blank=True)
+    min = models.FloatField(null=True, blank=True)
+
+    @classmethod
+    def period_start(cls, period, date):
+        """The first day of the week or month that `date` is in."""
+        if period == cls.WEEK:
+            return date - datetime.timedelta(days=date.weekday())
+        return date.replace(day=1)
+
+    @classmethod
+    def period_days(cls, period, start):
+        """The number of days in the week or month starting on `start`."""
+        if period == cls.WEEK:
+            return 7
+        next_month = (start + datetime.timedelta(days=31)).replace(day=1)
+        return (next_month - start).days
+
+    @classmethod
+    def period_end(cls, period, date):
+        """The last day of the week or month that `date` is in."""
+        start = cls.period_start(period, date)
+        return start + datetime.timedelta(
+            days=cls.period_days(period, start) - 1)
+
+    @classmethod
+    def built(cls, time_model):
+        """Whether the game's rollups have been built."""
+        return cls.objects.filter(game=time_model.game).exists()
+
+    @classmethod
+    def between(cls, time_model, period, start, end):
+        """The rollups of the weeks or months overlapping `start` to `end`."""
+        return cls.objects.filter(
+            game=time_model.game,
+            period=period,
+            start__range=(cls.period_start(period, start), end))
+
+    @classmethod
+    def summarize(cls, user_id, time_model, period, start, seconds):
+        """Make a user's rollup from their seconds in the period."""
+        solved = sorted(s for s in seconds if s > 0)
+        rollup = cls(
+            user_id=user_id,
+            game=time_model.game,
+            period=period,
+            start=start,
+            played=len(seconds),
+            participation=len(seconds) / cls.period_days(period, start),
+            solves=len(solved))
+        if solved:
+            rollup.mean = statistics.mean(solved)
+            rollup.median = statistics.median(solved)
+            rollup.min = solved[0]
+        return rollup
+
+    @classmethod
+    def update(cls, user, time_model, date):
+        """Recompute a user's week and month containing `date`."""
+        if not cls.built(time_model):
+            # nothing to update until the cron job first builds them
+            return
+
+        for period in cls.PERIODS:
+            start = cls.period_start(period, date)
+            end = start + datetime.timedelta(
+                days=cls.period_days(period, start) - 1)
+            seconds = list(
+                time_model.objects.filter(
+                    user=user, date__range=(start, end)).values_list(
+                        'seconds', flat=True))
+            cls.objects.filter(
+                user=user, game=time_model.game, period=period,
+                start=start).delete()
+            if seconds:
+                cls.summarize(user.pk, time_model, period, start,
+                              seconds).save()
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, time_model):
+        """Recompute every rollup of a game from its times.
+
+        This does each period for all users at once, see crossbot.rollups.
+
+        Returns:
+            The number of rows.
+        """
+        # numpy is slow to import, and only needed here
+        import numpy as np
+        from .rollups import period_stats
+
+        times = list(
+            time_model.objects.values_list('user_id', 'date', 'seconds'))
+        slackids = sorted({u for u, _, _ in times})
+        index = {slackid: i for i, slackid in enumerate(slackids)}
+        users = np.array([index[u] for u, _, _ in times], dtype=int)
+        dates = np.array([d.toordinal() for _, d, _ in times], dtype=int)
+        seconds = np.array([s for _, _, s in times], dtype=int)
+
+        rollups = []
+        for period in cls.PERIODS:
+            rows, starts, stats = period_stats(users, dates, seconds, period)
+            # NaN means no solves
+            stats = {
+                field: [None if np.isnan(v) else v for v in column.tolist()]
+                if column.dtype.kind == 'f' else column.tolist()
+                for field, column in stats.items()
+            }
+            for i, (row, ordinal) in enumerate(
+                    zip(rows.tolist(), starts.tolist())):
+                start = datetime.date.fromordinal(ordinal)
+                played = stats['played'][i]
+                rollups.append(
+                    cls(user_id=slackids[row],
+                        game=time_model.game,
+                        period=period,
+                        start=start,
+                        participation=played / cls.period_days(period, start),
+                        **{
+                            field: column[i]
+                            for field, column in stats.items()
+                        }))
+
+        cls.objects.filter(game=time_model.game).delete()
+        cls.objects.bulk_create(rollups, batch_size=500)
+        return len(rollups)
+
+    def __str__(self):
+        return '{} - {} - {} of {}'.format(self.user, self.game, self.period,
+                                           self.start)
 
 
 class MiniCrosswordModel(models.Model):
@@ -545,7 +1531,122 @@ class QueryShorthand(models.Model):
                                            self.command)
 
 
-# Items are stored in YAML (not the DB) but loaded here for convenience
+class OutboxMessage(models.Model):
+    """A Slack message, and optionally a reaction to it, waiting to be sent.
+
+    Messages are written in the same transaction as whatever caused them and
+    delivered later by crossbot.slack.outbox, oldest first in each channel.
+    """
+
+    class Meta:
+        indexes = [models.Index(fields=['channel', 'id'])]
+
+    # how long a drainer may work on a message before others can retry it
+    LEASE = datetime.timedelta(minutes=1)
+
+    channel = models.CharField(max_length=20)
+    text = models.TextField()
+    emoji = models.CharField(max_length=100, blank=True)
+    # extra chat.postMessage arguments, as JSON
+    options = models.TextField(default='{}')
+    # set once the message is posted, so a retry only redoes the reaction
+    message_ts = models.CharField(max_length=30, blank=True)
+
+    attempts = models.IntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def enqueue(cls, channel, text, emoji=None, **options):
+        return cls.objects.create(
+            channel=channel,
+            text=text,
+            emoji=emoji or '',
+            options=json.dumps(options))
+
+    def claim(self, now):
+        """Try to take the lease on this message.
+
+        Returns:
+            Whether or not we got it; only the holder may deliver it.
+        """
+        unclaimed = (models.Q(claimed_until__isnull=True)
+                     | models.Q(claimed_until__lt=now))
+        return bool(
+            OutboxMessage.objects.filter(pk=self.pk).filter(unclaimed).update(
+                claimed_until=now + self.LEASE))
+
+    def deliver(self):
+        """Send this message to Slack, deleting it if that worked.
+
+        Returns:
+            Whether or not the message is done with (delivered or given up on).
+        """
+        from crossbot.slack.api import post_message, react
+
+        try:
+            if not self.message_ts:
+                self.message_ts = post_message(
+                    self.channel, text=self.text, **json.loads(self.options))
+                self.save(update_fields=['message_ts'])
+            if self.emoji:
+                try:
+                    react(self.emoji, self.channel, self.message_ts)
+                except ValueError as e:
+                    # this is fine if a previous attempt got through
+                    if 'already_reacted' not in str(e):
+                        raise
+        except Exception as e:
+            self.attempts += 1
+            self.last_error = str(e)
+            if self.attempts >= OUTBOX_MAX_ATTEMPTS:
+                logger.error('giving up on outbox message %s: %s', self.pk,
+                             self.text)
+                self.delete()
+                return True
+
+            delay = OUTBOX_RETRY_SECONDS * 2**(self.attempts - 1)
+            logger.warning('outbox message %s failed (%s), retrying in %ss',
+                           self.pk, e, delay)
+            self.next_attempt = timezone.now() + datetime.timedelta(
+                seconds=delay)
+            self.claimed_until = None
+            self.save()
+            return False
+
+        self.delete()
+        return True
+
+    def __str__(self):
+        return '{} - {}'.format(self.channel, self.text)
+
+
+# Items are stored in YAML (not the DB) but loaded here for convenience.
+# Parsing YAML is slow, so they're loaded from a JSON copy when it's up to date.
+ITEMS_YAML = path.join(path.dirname(__file__), 'items.yaml')
+ITEMS_JSON = path.join(path.dirname(__file__), 'items.json')
+
+
+def compile_items():
+    """Parse items.yaml and save it to items.json, returning the items."""
+    import yaml
+
+    with open(ITEMS_YAML, 'rb') as f:
+        source = f.read()
+    compiled = {
+        'sha1': hashlib.sha1(source).hexdigest(),
+        'items': yaml.safe_load(source),
+    }
+
+    try:
+        with open(ITEMS_JSON, 'w') as f:
+            json.dump(compiled, f, indent=2, sort_keys=True)
+    except OSError:
+        logger.warning('could not write %s', ITEMS_JSON)
+
+    return compiled['items']
 
 
 class Item:
@@ -563,9 +1664,23 @@ class Item:
 
     @classmethod
     def load_items(cls):
-        with open(path.join(path.dirname(__file__), 'items.yaml')) as f:
-            for key, options in yaml.load(f).items():
-                cls.ITEMS[key] = Item(key, options)
+        with open(ITEMS_YAML, 'rb') as f:
+            sha1 = hashlib.sha1(f.read()).hexdigest()
+
+        try:
+            with open(ITEMS_JSON) as f:
+                compiled = json.load(f)
+        except (OSError, ValueError):
+            compiled = {}
+
+        if compiled.get('sha1') == sha1:
+            items = compiled['items']
+        else:
+            logger.info('%s is out of date, recompiling', ITEMS_JSON)
+            items = compile_items()
+
+        for key, options in items.items():
+            cls.ITEMS[key] = Item(key, options)
 
     @classmethod
     def from_key(cls, key):
@@ -0,0 +1,64 @@
+"""A cache of rendered plots on disk, shared by every worker.
+
+Plots are saved in MEDIA_ROOT as plot_<key>.png, where the key is a hash of
+everything that goes into the picture: the normalized arguments and the data
+being plotted (see plot_key). So the same plot asked for again reuses the
+file and its URL instead of being rendered again. Plots are touched when
+they're reused, and deleted once they're too old or too many (see
+crossbot.mediastore).
+"""
+
+import hashlib
+import threading
+
+from . import metrics
+from .mediastore import MediaStore
+
+PREFIX = 'plot_'
+SUFFIX = '.png'
+
+
+def plot_key(*parts):
+    """A key for the plot of `parts`, which are numpy arrays or anything
+    with a stable repr (strings, numbers, dates, tuples of those).
+    """
+    digest = hashlib.sha1()
+    for part in parts:
+        if hasattr(part, 'tobytes'):
+            digest.update(repr((part.dtype.str, part.shape)).encode())
+            digest.update(part.tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PlotCache(MediaStore):
+    """Rendered plots in `directory` (MEDIA_ROOT by default), by key."""
+
+    def __init__(self, directory=None, **kwargs):
+        super().__init__(PREFIX, SUFFIX, directory, **kwargs)
+        self.lock = threading.Lock()
+        # this process's lookups, the metrics have every worker's
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, result):
+        with self.lock:
+            if result == 'hit':
+                self.hits += 1
+            else:
+                self.misses += 1
+        metrics.plot_cache(result)
+
+    def get(self, key):
+        """The file name of the plot for `key`, or None if it isn't rendered.
+        """
+        if not self.touch(key):
+            self.count('miss')
+            return None
+        self.count('hit')
+        return self.filename(key)
+
+
+PLOT_CACHE = PlotCache()
@@ -0,0 +1,151 @@
+"""Draw plots from plain data, without Django.
+
+The plot commands describe a plot as a spec, a dict of lists, numbers and
+strings, so it can be sent to a crossbot.renderpool process to be drawn.
+Each render has a Figure of its own, without pyplot, so any number of
+threads can render at once.
+
+    {
+        # figure size in pixels, and dpi
+        'size': (width, height, dpi),
+        # each user's lines or bars, see below
+        'series': [...],
+        # 'lines' or 'bars'
+        'kind': 'lines',
+        # colormap for series without a color, None for matplotlib's colors
+        'colormap': 'nipy_spectral',
+        # the dates to show on the x axis, inclusive
+        'first': date,
+        'last': date,
+        # 'linear' or 'symlog'
+        'yscale': 'linear',
+        # y tick spacing, or None to let matplotlib choose
+        'ytick': 0.25,
+        # 'minutes' for 1:30, 'plain' for numbers, or None
+        'yformat': 'plain',
+        'ylabel': None,
+    }
+
+Each line series is {'label', 'dates', 'values', 'fmt', 'color', 'alpha'},
+with a value (or NaN) for each date. Each series is drawn as a single line,
+broken at the NaNs, which is much faster to draw than a line per stretch of
+days once there are a lot of them. Each bar series is {'label', 'starts',
+'lengths'}, one bar per start date.
+"""
+
+import matplotlib.dates as mdates
+import matplotlib.ticker as mticker
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+try:
+    from matplotlib import colormaps
+    get_cmap = colormaps.__getitem__
+except ImportError:
+    # before matplotlib 3.5
+    from matplotlib.cm import get_cmap
+
+from .timefmt import fmt_seconds
+
+# longer plots get a tick every so many days, weeks or months instead of
+# every day, since labelling thousands of ticks takes longer than drawing
+MAX_DAY_TICKS = 100
+
+
+def fmt_min(sec, pos):
+    return fmt_seconds(sec)
+
+
+def draw_lines(ax, spec, colors):
+    for series, color in zip(spec['series'], colors):
+        ax.plot(
+            mdates.date2num(series['dates']),
+            series['values'],
+            series['fmt'],
+            label=series['label'],
+            color=series['color'] or color,
+            alpha=series['alpha'])
+
+
+def format_y_axis(ax, spec):
+    ax.set_yscale(spec['yscale'])
+    if spec['ytick']:
+        ax.yaxis.set_major_locator(mticker.MultipleLocator(spec['ytick']))
+    if spec['yformat'] == 'minutes':
+        ax.yaxis.set_major_formatter(mticker.FuncFormatter(fmt_min))
+    elif spec['yformat'] == 'plain':
+        ax.yaxis.set_major_formatter(mticker.ScalarFormatter(useOffset=False))
+
+
+def draw_bars(ax, spec, colors):
+    thickness = 1
+    for i, series in enumerate(spec['series']):
+        ax.barh(
+            i * thickness,
+            series['lengths'],
+            thickness,
+            # centered on the days, like the points of a line
+            mdates.date2num(series['starts']) - 0.5,
+            label=series['label'])
+
+    ax.set_yticks([i * thickness for i in range(len(spec['series']))])
+    ax.set_yticklabels([series['label'] for series in spec['series']], size=6)
+
+
+def format_date_axis(fig, ax, first, last):
+    """Label the x axis from `first` to `last`, with a tick for every day if
+    there's room.
+    """
+    # otherwise matplotlib pads a single day out to years of daily ticks,
+    # which takes ages to draw
+    start, end = mdates.date2num([first, last])
+    ax.set_xlim(start - 0.5, end + 0.5)
+    ax.xaxis_date()
+
+    fig.autofmt_xdate()
+    if (last - first).days < MAX_DAY_TICKS:
+        ax.xaxis.set_major_locator(mdates.DayLocator())
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %-d'))  # May 3
+        # hack to prevent crashes on the regular crosswords
+        ax.xaxis.get_major_locator().MAXTICKS = 10000
+    else:
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.AutoDateFormatter(locator))
+
+
+def render(spec, path, draw=None):
+    """Draw `spec` and save it to `path` as a png.
+
+    `draw(ax, spec, colors)` replaces draw_lines or draw_bars, for comparing
+    them with other ways of drawing in benchmarks.
+    """
+    width, height, dpi = spec['size']
+    n_series = len(spec['series'])
+    if spec.get('colormap'):
+        cmap = get_cmap(spec['colormap'])
+        colors = [cmap(i / n_series) for i in range(n_series)]
+    else:
+        colors = [None] * n_series
+
+    # a Figure of our own rather than pyplot's, whose global state would
+    # need a lock to draw in more than one thread
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    if draw is None:
+        draw = draw_bars if spec['kind'] == 'bars' else draw_lines
+    draw(ax, spec, colors)
+    if spec['kind'] == 'lines':
+        format_y_axis(ax, spec)
+    if spec.get('ylabel'):
+        ax.set_ylabel(spec['ylabel'])
+
+    format_date_axis(fig, ax, spec['first'], spec['last'])
+    if spec['kind'] == 'lines' and n_series:
+        ax.legend(fontsize=6, loc='upper left')
+
+    with open(path, 'wb') as f:
+        fig.savefig(f, format='png', bbox_inches='tight')
+    return path
@@ -0,0 +1,196 @@
+"""A few processes that draw plots, so the web workers don't have to.
+
+Drawing a long range takes seconds, and the memory matplotlib uses stays with
+the process for good. So each web worker starts RENDER_WORKERS processes once
+it has loaded the app (see post_worker_init in gunicorn.conf.py), or else
+the first time it draws a plot. They import matplotlib once and then draw
+crossbot.render specs to files, one at a time. A render taking more than
+RENDER_TIMEOUT_SECONDS gets its process killed, each process can only use
+RENDER_MEMORY_BYTES, and a process is replaced after RENDER_MAX_RENDERS
+renders to give its memory back. With RENDER_WORKERS = 0 plots are drawn in the calling thread instead.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from .settings import (RENDER_MAX_RENDERS, RENDER_MEMORY_BYTES,
+                       RENDER_TIMEOUT_SECONDS, RENDER_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+# a new process gets this long to import matplotlib, on top of the timeout
+STARTUP_SECONDS = 30
+
+
+class RenderError(Exception):
+    pass
+
+
+def _serve(conn, memory_bytes):
+    """The render process: draw each (spec, path) sent until told to stop."""
+    if memory_bytes:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    from . import render
+    conn.send('ready')
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        spec, path = job
+        try:
+            conn.send(('ok', render.render(spec, path)))
+        except MemoryError:
+            conn.send(('error', 'ran out of memory'))
+            # who knows what state it left things in
+            return
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+
+
+class RenderProcess:
+    """One render process, and the pipe to it."""
+
+    def __init__(self, context, memory_bytes):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve,
+            args=(child_conn, memory_bytes),
+            name='crossbot-render',
+            daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.renders = 0
+
+    def receive(self, timeout):
+        if not self.conn.poll(timeout):
+            raise RenderError('render took more than {}s'.format(timeout))
+        try:
+            return self.conn.recv()
+        except EOFError:
+            raise RenderError('render process exited with {}'.format(
+                self.process.exitcode))
+
+    def render(self, spec, path, timeout):
+        if not self.ready:
+            self.receive(STARTUP_SECONDS)
+            self.ready = True
+
+        self.conn.send((spec, path))
+        self.renders += 1
+        status, result = self.receive(timeout)
+        if status != 'ok':
+            raise RenderError(result)
+        return result
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class RenderPool:
+    """Draws crossbot.render specs in a pool of render processes."""
+
+    def __init__(self,
+                 workers=RENDER_WORKERS,
+                 timeout=RENDER_TIMEOUT_SECONDS,
+                 memory_bytes=RENDER_MEMORY_BYTES,
+                 max_renders=RENDER_MAX_RENDERS):
+        self.workers = workers
+        self.timeout = timeout
+        self.memory_bytes = memory_bytes
+        self.max_renders = max_renders
+        # spawn, since forking a threaded web worker can copy held locks
+        self.context = multiprocessing.get_context('spawn')
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.started = False
+
+        self._stats = {'renders': 0, 'failed': 0, 'recycled': 0}
+
+    def stats(self):
+        with self.lock:
+            return dict(self._stats)
+
+    def _count(self, stat):
+        with self.lock:
+            self._stats[stat] += 1
+
+    def start(self):
+        """Start the render processes, if they aren't already.
+
+        This doesn't wait for them to import matplotlib, they do that in the
+        background until their first render.
+        """
+        with self.lock:
+            if self.started or not self.workers:
+                return
+            for _ in range(self.workers):
+                self.idle.put(self.spawn())
+            self.started = True
+
+    def spawn(self):
+        return RenderProcess(self.context, self.memory_bytes)
+
+    def render(self, spec, path):
+        """Draw `spec` to `path`, waiting for a free process if need be.
+
+        Raises:
+            RenderError if the render failed, ran out of time or memory.
+        """
+        if not self.workers:
+            from . import render
+            return render.render(spec, path)
+
+        self.start()
+        process = self.idle.get()
+        start = time.monotonic()
+        try:
+            result = process.render(spec, path, self.timeout)
+        except Exception:
+            self._count('failed')
+            logger.exception('render failed after %.1fs',
+                             time.monotonic() - start)
+            process.kill()
+            process = self.spawn()
+            raise
+        else:
+            self._count('renders')
+            if process.renders >= self.max_renders:
+                self._count('recycled')
+                process.stop()
+                process = self.spawn()
+            return result
+        finally:
+            self.idle.put(process)
+
+    def stop(self):
+        """Stop all the render processes, once they're done."""
+        with self.lock:
+            for _ in range(self.workers if self.started else 0):
+                self.idle.get().stop()
+            self.started = False
+
+
+RENDER_POOL = RenderPool()
@@ -0,0 +1,73 @@
+"""Everyone's TimeRollups for a game at once, with numpy.
+
+Like crossbot.userstats, the times are grouped with bincount and a sort
+instead of looping over each user's weeks, and this is imported only when
+rebuilding.
+"""
+
+import datetime
+
+import numpy as np
+
+from .userstats import grouped_percentiles
+
+# date ordinals of 1970-01-01, where numpy's datetime64 days start
+EPOCH = datetime.date(1970, 1, 1).toordinal()
+# more than any date ordinal, to pack (user, start) into one number
+STRIDE = 10**7
+
+
+def period_starts(period, dates):
+    """The ordinal of the Monday, or the 1st of the month, of each of the
+    date ordinals in `dates`.
+    """
+    if period == 'week':
+        # ordinal 1 was a Monday
+        return dates - (dates - 1) % 7
+    days = (dates - EPOCH).astype('datetime64[D]')
+    months = days.astype('datetime64[M]').astype('datetime64[D]')
+    return months.astype(np.int64) + EPOCH
+
+
+def period_stats(users, dates, seconds, period):
+    """Every user's stats for each week or month they played.
+
+    Args:
+        users, dates, seconds: Arrays of each time's user, date ordinal and
+            seconds.
+        period: 'week' or 'month'.
+
+    Returns:
+        (users, starts, stats), where users and starts are arrays with the
+        user and first date ordinal of each (user, period) with a time, and
+        stats is a dict of TimeRollup field name to an array with a value for
+        each, NaN where there are no solves.
+    """
+    starts = period_starts(period, dates)
+    keys, groups = np.unique(
+        users.astype(np.int64) * STRIDE + starts, return_inverse=True)
+    groups = groups.ravel()
+    n_groups = len(keys)
+
+    solved = seconds > 0
+    solved_groups = groups[solved]
+    solved_seconds = seconds[solved].astype(float)
+
+    played = np.bincount(groups, minlength=n_groups)
+    solves = np.bincount(solved_groups, minlength=n_groups)
+    fastest = np.full(n_groups, np.inf)
+    np.minimum.at(fastest, solved_groups, solved_seconds)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(
+            solved_groups, solved_seconds, minlength=n_groups) / solves
+    median, = grouped_percentiles(solved_groups, solved_seconds, solves, [50])
+
+    stats = {
+        'played': played,
+        'solves': solves,
+        'mean': mean,
+        'median': median,
+        'min': np.where(solves > 0, fastest, np.nan),
+    }
+    return keys // STRIDE, keys % STRIDE, stats
@@ -1,5 +1,52 @@
+import os
+
 from django.conf import settings as s
 
 # Placing crossbot settings in here for now
+SLACK_API_URL = getattr(s, 'CROSSBOT_SLACK_API_URL', 'https://slack.com/api/')
 CROSSBUCKS_PER_SOLVE = getattr(s, 'CROSSBOT_CROSSBUCKS_PER_SOLVE', 10)
 ITEM_DROP_RATE = getattr(s, 'CROSSBOT_ITEM_DROP_RATE', 0.1)
+
+# Slow commands are acknowledged right away and finished by this many
+# background threads; 0 runs everything inline
+DEFERRED_WORKERS = getattr(s, 'CROSSBOT_DEFERRED_WORKERS', 2)
+# Once this many slow commands are waiting, new ones run inline instead
+DEFERRED_QUEUE_SIZE = getattr(s, 'CROSSBOT_DEFERRED_QUEUE_SIZE', 16)
+
+# Undeliverable Slack messages are retried with exponential backoff starting
+# at this many seconds, and dropped after this many attempts
+OUTBOX_RETRY_SECONDS = getattr(s, 'CROSSBOT_OUTBOX_RETRY_SECONDS', 5)
+OUTBOX_MAX_ATTEMPTS = getattr(s, 'CROSSBOT_OUTBOX_MAX_ATTEMPTS', 10)
+
+# Each worker saves its metrics here, and /metrics/ merges them. Scrapers
+# authenticate with "Authorization: Bearer <METRICS_TOKEN>", or log in as staff
+METRICS_DIR = getattr(s, 'CROSSBOT_METRICS_DIR',
+                      os.path.join(s.BASE_DIR, 'metrics'))
+METRICS_TOKEN = getattr(s, 'CROSSBOT_METRICS_TOKEN', None)
+
+# Each worker's in-memory copy of the times is updated incrementally, but also
+# reloaded from scratch this often to pick up edits made in the admin
+TIMESERIES_RELOAD_SECONDS = getattr(s, 'CROSSBOT_TIMESERIES_RELOAD_SECONDS',
+                                    10 * 60)
+
+# The cron job recomputing everyone's stats goes this many users at a time,
+# stops starting new chunks after this long, and leaves the rest for the next
+# run
+USER_STATS_CHUNK_SIZE = getattr(s, 'CROSSBOT_USER_STATS_CHUNK_SIZE', 200)
+USER_STATS_BUDGET_SECONDS = getattr(s, 'CROSSBOT_USER_STATS_BUDGET_SECONDS',
+                                    30)
+
+# Generated images in MEDIA_ROOT, like plots, are deleted once they haven't
+# been used for this long (None keeps them), and then the least recently used
+# are deleted once they take up more than this much
+MEDIA_TTL_SECONDS = getattr(s, 'CROSSBOT_MEDIA_TTL_SECONDS', 30 * 24 * 60 * 60)
+MEDIA_MAX_BYTES = getattr(s, 'CROSSBOT_MEDIA_MAX_BYTES', 50 * 1024 * 1024)
+
+# Plots are drawn by this many processes per web worker (0 draws them in the
+# worker), which are killed after a render takes too long, limited to this
+# much memory, and replaced after this many renders
+RENDER_WORKERS = getattr(s, 'CROSSBOT_RENDER_WORKERS', 2)
+RENDER_TIMEOUT_SECONDS = getattr(s, 'CROSSBOT_RENDER_TIMEOUT_SECONDS', 60)
+RENDER_MEMORY_BYTES = getattr(s, 'CROSSBOT_RENDER_MEMORY_BYTES',
+                              1024 * 1024 * 1024)
+RENDER_MAX_RENDERS = getattr(s, 'CROSSBOT_RENDER_MAX_RENDERS', 50)
@@ -15,4 +15,7 @@ def handle_slash_command(slash_command):
     request = SlashCommandRequest(slash_command)
 
     _HANDLER.handle_request(request)
+    if request.deferred:
+        # the real response is posted to request.response_url later
+        return request.ack_json()
     return request.response_json()
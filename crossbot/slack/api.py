@@ -1,52 +1,239 @@
 """Methods for sending requests directly to Slack."""
 
-import requests
-import settings
 import logging
+import threading
+import time
 
-logger = logging.getLogger(__name__)
-
-SLACK_URL = 'https://slack.com/api/'
-
-
-def _slack_api(endpoint, method, **kwargs):
-    assert method in ['GET', 'POST']
-    headers = {'Authorization': 'Bearer ' + settings.SLACK_OAUTH_ACCESS_TOKEN}
-    url = SLACK_URL + endpoint
-
-    if method == 'GET':
-        func = requests.get
-    elif method == 'POST':
-        func = requests.post
-    else:
-        raise ValueError('invalid method: ' + method)
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 
-    return func(url, headers=headers, params=kwargs)
+import settings
 
+from .. import metrics
+from ..settings import SLACK_API_URL
 
-def _slack_api_ok(endpoint, method, key, **kwargs):
-    resp = _slack_api(endpoint, method, **kwargs).json()
-    if resp.get('ok'):
-        return resp[key]
+logger = logging.getLogger(__name__)
 
-    logger.error('bad response: %s', resp)
-    raise ValueError('bad response: ' + resp.get('error'))
+SLACK_URL = SLACK_API_URL
+
+# Slack's per-method rate limit tiers, in requests per minute.
+# https://api.slack.com/docs/rate-limits
+TIER_1 = 1
+TIER_2 = 20
+TIER_3 = 50
+TIER_4 = 100
+
+RATE_LIMITS = {
+    'users.list': TIER_2,
+    'reactions.add': TIER_3,
+    # chat.postMessage is special cased by Slack, about 1 per second
+    'chat.postMessage': 60,
+}
+
+
+class SlackApiError(ValueError):
+    pass
+
+
+def _not_sent(error):
+    """Whether the request that raised `error` never reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is what went wrong
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RateLimiter:
+    """A token bucket allowing `per_minute` calls a minute, in small bursts."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = max(1, per_minute // 10)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Block until a call is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+            delay = max(0, self.blocked_until - now)
+            if self.tokens < 1:
+                delay = max(delay, (1 - self.tokens) / self.rate)
+            # reserve our token now so concurrent callers queue behind us
+            self.tokens -= 1
+
+        if delay:
+            logger.debug('rate limited, sleeping %.2fs', delay)
+            time.sleep(delay)
+
+    def block(self, seconds):
+        """Stop all calls for the next `seconds`, e.g. after a 429."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until,
+                                     time.monotonic() + seconds)
+
+
+class SlackClient:
+    """A Slack Web API client that reuses connections and respects limits.
+
+    Every call goes through one `requests.Session`, so HTTPS connections are
+    kept alive between calls. Calls are spaced out per method according to
+    `RATE_LIMITS`, HTTP 429s are retried after their `Retry-After`, and
+    transient errors are retried with exponential backoff. A POST that timed
+    out or got a 5xx may have gone through anyway (and posted its message),
+    so it's only retried if it never reached Slack, and otherwise left to the
+    caller, e.g. the outbox.
+    """
+
+    def __init__(self,
+                 base_url=SLACK_URL,
+                 timeout=10,
+                 max_retries=3,
+                 backoff=0.5,
+                 pool_size=10,
+                 rate_limits=None,
+                 rate_limited=True):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limits = RATE_LIMITS if rate_limits is None else rate_limits
+        self.rate_limited = rate_limited
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def limiter(self, endpoint):
+        if not self.rate_limited:
+            return None
+        with self._limiters_lock:
+            if endpoint not in self._limiters:
+                per_minute = self.rate_limits.get(endpoint, TIER_3)
+                self._limiters[endpoint] = RateLimiter(per_minute)
+            return self._limiters[endpoint]
+
+    def request(self, method, url, limiter=None, **kwargs):
+        """Make an HTTP request, retrying on 429s and transient errors (for
+        a POST, only those from before it was sent)."""
+        assert method in ['GET', 'POST']
+
+        for attempt in range(self.max_retries + 1):
+            if limiter:
+                limiter.wait()
+
+            last_try = attempt == self.max_retries
+            try:
+                resp = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_try or (method == 'POST' and not _not_sent(e)):
+                    raise
+                delay = self.backoff * 2**attempt
+                logger.warning('%s failed (%s), retrying in %.1fs', url, e,
+                               delay)
+                time.sleep(delay)
+                continue
+
+            if resp.status_code == 429 and not last_try:
+                delay = float(resp.headers.get('Retry-After', 1))
+                logger.warning('%s throttled, retrying in %.1fs', url, delay)
+                if limiter:
+                    limiter.block(delay)
+                else:
+                    time.sleep(delay)
+                continue
+
+            if (resp.status_code >= 500 and method == 'GET' and not last_try):
+                delay = self.backoff * 2**attempt
+                logger.warning('%s returned %s, retrying in %.1fs', url,
+                               resp.status_code, delay)
+                time.sleep(delay)
+                continue
+
+            return resp
+
+    def call(self, endpoint, method, **params):
+        """Call a Web API method, returning the decoded response.
+
+        Raises:
+            SlackApiError if Slack does not respond with ok.
+        """
+        headers = {
+            'Authorization': 'Bearer ' + settings.SLACK_OAUTH_ACCESS_TOKEN
+        }
+        with metrics.track_slack(endpoint):
+            resp = self.request(
+                method,
+                self.base_url + endpoint,
+                limiter=self.limiter(endpoint),
+                headers=headers,
+                params=params)
+
+            data = resp.json() if resp.status_code == 200 else None
+            if not data or not data.get('ok'):
+                logger.error('bad response (%s): %s', resp.status_code, data)
+                error = (data.get('error', 'unknown_error')
+                         if data else str(resp.status_code))
+                raise SlackApiError('bad response: ' + error)
+        return data
+
+    def paginate(self, endpoint, method, key, limit=200, **params):
+        """Call a cursor-paginated method, returning all pages' `key` lists."""
+        results = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            data = self.call(endpoint, method, limit=limit, **params)
+            results.extend(data[key])
+            cursor = data.get('response_metadata', {}).get('next_cursor')
+            if not cursor:
+                return results
+
+    def respond(self, response_url, payload):
+        """Send a delayed response to a slash command's response_url."""
+        with metrics.track_slack('response_url'):
+            resp = self.request('POST', response_url, json=payload)
+            if resp.status_code != 200:
+                logger.error('bad delayed response (%s) for %s',
+                             resp.status_code, response_url)
+                raise SlackApiError('bad delayed response: {}'.format(
+                    resp.status_code))
+
+
+CLIENT = SlackClient()
 
 
 def slack_users():
-    return _slack_api_ok('users.list', 'GET', 'members')
+    return CLIENT.paginate('users.list', 'GET', 'members')
 
 
 def react(emoji, channel, timestamp):
-    return _slack_api_ok(
+    return CLIENT.call(
         'reactions.add',
         'POST',
-        'ok',
         name=emoji,
         channel=channel,
-        timestamp=timestamp)
+        timestamp=timestamp)['ok']
 
 
 def post_message(channel, **kwargs):
-    return _slack_api_ok(
-        'chat.postMessage', 'POST', 'ts', channel=channel, **kwargs)
+    return CLIENT.call(
+        'chat.postMessage', 'POST', channel=channel, **kwargs)['ts']
+
+
+def respond(response_url, payload):
+    return CLIENT.respond(response_url, payload)
@@ -1,20 +1,51 @@
 # Make these utilities available to commands
 from ..parser import date as parse_date
 from ..parser import time as parse_time
+from ..parser import positive_int
 from ..parser import date_fmt
 
 from ... import models
 
 from settings import DATABASES
 
-# from https://stackoverflow.com/a/3365846
 import importlib
 import pkgutil
 
+
+def slow(command):
+    """Mark a command as too slow to answer within Slack's 3 seconds.
+
+    Slow commands are acknowledged right away and run in the background, see
+    crossbot.slack.deferred.
+    """
+    command.slow = True
+    return command
+
+
+class LazyModule:
+    """A stand-in for a module that is only imported when first used.
+
+    Commands with heavy dependencies (like numpy and matplotlib) import them
+    this way, so workers that never run those commands don't pay for them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
 DB_PATH = DATABASES['default']['NAME']
 
-COMMANDS = []
-for _, module_name, _ in pkgutil.walk_packages(__path__):
-    module_full_name = __name__ + '.' + module_name
-    importlib.import_module(module_full_name)
-    COMMANDS.append(module_name)
+# Only find the command modules here, the handler loads them with `load`
+COMMANDS = sorted(
+    module_name for _, module_name, _ in pkgutil.iter_modules(__path__))
+
+
+def load(module_name):
+    """Import and return the command module `module_name`."""
+    return importlib.import_module(__name__ + '.' + module_name)
@@ -1,8 +1,10 @@
+import calendar
 import math
 import logging
 
 from random import choice
 
+from django.db import transaction
 from django.utils import timezone
 
 from . import models, parse_date, parse_time
@@ -35,45 +37,44 @@ def add(request):
 
     args = request.args
 
-    was_added, time = request.user.add_time(args.table, args.time, args.date)
-
-    if not was_added:
-        request.reply(
-            'I could not add this to the database, '
-            'because you already have an entry '
-            '({}) for this date.'.format(time.time_str()),
-            direct=True)
-        return
-
-    day_of_week = request.args.date.weekday()
-    emj = emoji(args.time, args.table, day_of_week)
-
-    request.message_and_react(request.text, emj, as_user=request.user)
-    request.reply('Submitted {} for {}'.format(time.time_str(),
-                                               request.args.date))
-
-    def get_streak_counts(streaks):
-        for streak in streaks:
-            for i, entry in enumerate(streak):
-                if entry.date == args.date:
-                    # i is the old streak count, len is the new one
-                    return i, len(streak)
-        raise ValueError("date wasn't in streaks!")
-
-    streaks = args.table.participation_streaks(request.user)
-    old_sc, new_sc = get_streak_counts(streaks)
-
-    for streak_count in range(old_sc + 1, new_sc + 1):
-        streak_messages = STREAKS.get(streak_count)
-        if streak_messages:
-            msg = choice(streak_messages).format(name=request.user)
-            try:
-                # try here because we might fail if the reaction already exists.
-                emj = "achievement"
-                request.message_and_react(msg, emj)
-            except:
-                logger.warning("Achievement reaction failed!")
-            request.reply(msg)
+    # the time and the messages announcing it are saved together
+    with transaction.atomic():
+        was_added, time = request.user.add_time(args.table, args.time,
+                                                args.date)
+
+        if not was_added:
+            request.reply(
+                'I could not add this to the database, '
+                'because you already have an entry '
+                '({}) for this date.'.format(time.time_str()),
+                direct=True)
+            return
+
+        day_of_week = request.args.date.weekday()
+        emj = emoji(args.time, args.table, day_of_week)
+
+        request.message_and_react(request.text, emj, as_user=request.user)
+        request.reply('Submitted {} for {}'.format(time.time_str(),
+                                                   request.args.date))
+
+        pb = models.PersonalBest
+        if pb.is_new(request.user, args.table, args.date):
+            request.reply('New personal best!')
+        elif pb.is_new(request.user, args.table, args.date, day_of_week):
+            request.reply('New personal best for a {}!'.format(
+                calendar.day_name[day_of_week]))
+
+        # the days before this one were the old streak, now it's the whole run
+        streak = models.ParticipationStreak.containing(request.user,
+                                                       args.table, args.date)
+        old_sc, new_sc = streak.days_before(args.date), streak.length
+
+        for streak_count in range(old_sc + 1, new_sc + 1):
+            streak_messages = STREAKS.get(streak_count)
+            if streak_messages:
+                msg = choice(streak_messages).format(name=request.user)
+                request.message_and_react(msg, "achievement")
+                request.reply(msg)
 
     logger.debug("{} has a streak of {} in {}".format(request.user, new_sc,
                                                       args.table))
@@ -0,0 +1,99 @@
+from . import models, parse_date, positive_int
+from ...timefmt import fmt_seconds
+
+# metric: how to rank by it
+METRICS = {
+    'wins': '-wins',
+    'mean': 'mean',
+    'median': 'median',
+    'played': '-played',
+}
+
+WINDOWS = {
+    '7': 7,
+    '30': 30,
+    '365': 365,
+    'all': models.UserStats.ALL_TIME,
+}
+
+
+def init(client):
+
+    parser = client.parser.subparsers.add_parser(
+        'leaderboard', help='Rank everyone over the last few days.')
+    parser.set_defaults(command=leaderboard)
+
+    parser.add_argument(
+        'metric',
+        nargs='?',
+        default='wins',
+        choices=list(METRICS),
+        help='What to rank by. Mean and median are of solved times. '
+        'Default %(default)s.')
+
+    parser.add_argument(
+        '-w',
+        '--window',
+        default='30',
+        choices=list(WINDOWS),
+        help='Number of days to look back over. Default %(default)s.')
+
+    parser.add_argument(
+        '-n',
+        '--num',
+        type=positive_int,
+        default=10,
+        metavar='N',
+        help='Number of players to show. Default %(default)s.')
+
+
+def describe(stats, metric):
+    if metric == 'wins':
+        return '{} win{}'.format(stats.wins, '' if stats.wins == 1 else 's')
+    if metric == 'played':
+        if stats.window == models.UserStats.ALL_TIME:
+            return '{} days'.format(stats.played)
+        return '{}/{} days'.format(stats.played, stats.window)
+    return '{} {}'.format(fmt_seconds(getattr(stats, metric)), metric)
+
+
+def leaderboard(request):
+    '''Rank players by wins, mean or median time, or days played
+    (`leaderboard median -w 7`).'''
+
+    args = request.args
+    table = args.table
+
+    # the RollUserStats cron job moves the windows along, this only reads them
+    as_of = models.UserStats.as_of_date(table)
+    if as_of is None and table.objects.exists():
+        request.reply('The leaderboard is being updated, '
+                      'try again in a few minutes.')
+        return
+
+    rows = models.UserStats.objects.filter(
+        game=table.game, window=WINDOWS[args.window]).select_related('user')
+    if args.metric in ('mean', 'median'):
+        rows = rows.filter(solves__gt=0)
+    else:
+        rows = rows.filter(played__gt=0)
+    rows = rows.order_by(METRICS[args.metric], 'user_id')[:args.num]
+
+    if args.window == 'all':
+        period = 'all time'
+    else:
+        period = 'last {} days'.format(args.window)
+    title = '*{} leaderboard, {}, by {}*'.format(
+        table.game.replace('_', ' ').capitalize(), period, args.metric)
+
+    lines = [
+        '{}. {} - {}'.format(i, stats.user, describe(stats, args.metric))
+        for i, stats in enumerate(rows, 1)
+    ]
+    if not lines:
+        lines = ['Nobody has played yet.']
+    elif as_of != parse_date('now'):
+        lines.append(
+            '_As of {}, today\'s results are being added._'.format(as_of))
+
+    request.reply('\n'.join([title] + lines))
@@ -1,9 +1,16 @@
+import datetime
+
+from itertools import islice
+
 from django.utils.timezone import timedelta
 
-from . import parse_date
+from . import models, parse_date
 
 MINI_URL = "https://www.nytimes.com/crosswords/game/mini/{:04}/{:02}/{:02}"
 
+# links past this many are just counted, to keep the reply short
+MAX_LINKS = 50
+
 
 def init(client):
 
@@ -19,23 +26,67 @@ def init(client):
         type=int,
         help='Show the nth most recent ones you missed')
 
+    parser.add_argument(
+        '-s',
+        '--since',
+        type=parse_date,
+        metavar='DATE',
+        help='Show every day you missed since DATE.')
+
+    parser.add_argument(
+        '-c',
+        '--count',
+        action='store_true',
+        help='Only count the days you missed, since DATE or since you '
+        'started playing.')
+
+
+def missed_days(gaps):
+    """The days in (first, last) gaps, latest first."""
+    for first, last in gaps:
+        day = last
+        yield day
+        while day > first:
+            day -= timedelta(days=1)
+            yield day
+
+
+def link(date):
+    url = MINI_URL.format(date.year, date.month, date.day)
+    return '<{}|{}>'.format(url, date)
+
 
 def get_missed(request):
+    '''List the days you missed: the most recent (`missed 3`), every one since
+    a date (`missed --since 2018-08-01`), or how many (`missed -c`).'''
+
+    args = request.args
+    streaks = models.ParticipationStreak
+    today = parse_date('now')
+
+    since = args.since
+    if since is None and args.count:
+        first = streaks.streaks(request.user,
+                                args.table).order_by('start').first()
+        since = first.start if first else today
+    if since is None:
+        gaps = streaks.gaps(request.user, args.table, datetime.date.min, today)
+        request.reply(', '.join(
+            link(d) for d in islice(missed_days(gaps), args.n)))
+        return
+
+    gaps = list(streaks.gaps(request.user, args.table, since, today))
+    total = sum((last - first).days + 1 for first, last in gaps)
+    if args.count:
+        request.reply('You missed {} day{} since {}.'.format(
+            total, '' if total == 1 else 's', since.strftime('%b %d, %Y')))
+        return
+    if not total:
+        request.reply('You haven\'t missed any since {}!'.format(
+            since.strftime('%b %d, %Y')))
+        return
 
-    completed = set(
-        request.user.times(request.args.table).values_list('date', flat=True))
-
-    # find missed day
-    date = parse_date('now')
-    n = request.args.n
-    missed = []
-    for i in range(n):
-        while date in completed:
-            date -= timedelta(days=1)
-        missed.append(date)
-        date -= timedelta(days=1)
-
-    urls = [
-        MINI_URL.format(date.year, date.month, date.day) for date in missed
-    ]
-    request.reply('\n'.join(urls))
+    lines = [link(d) for d in islice(missed_days(gaps), MAX_LINKS)]
+    if total > MAX_LINKS:
+        lines.append('...and {} more'.format(total - MAX_LINKS))
+    request.reply(', '.join(lines))
@@ -0,0 +1,36 @@
+import calendar
+
+from . import models
+from ...timefmt import fmt_seconds
+
+
+def init(client):
+
+    parser = client.parser.subparsers.add_parser(
+        'pb', help='Show your personal bests, overall and for each weekday.')
+    parser.set_defaults(command=pb)
+
+
+def fmt_best(best):
+    return '{} on {}'.format(
+        fmt_seconds(best.seconds), best.date.strftime('%a, %b %d, %Y'))
+
+
+def pb(request):
+    '''Show your fastest solves, overall and for each day of the week (`pb`).'''
+
+    args = request.args
+    bests = models.PersonalBest.bests(request.user, args.table)
+
+    title = '*{}\'s {} personal bests*'.format(
+        request.user, args.table.game.replace('_', ' '))
+    if not bests:
+        request.reply('{}\nNo solves yet.'.format(title))
+        return
+
+    lines = [title, 'Overall: ' + fmt_best(bests[models.PersonalBest.ANY_DAY])]
+    for weekday, name in enumerate(calendar.day_name):
+        if weekday in bests:
+            lines.append('{}: {}'.format(name, fmt_best(bests[weekday])))
+
+    request.reply('\n'.join(lines))
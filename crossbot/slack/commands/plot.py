@@ -1,24 +1,35 @@
 import logging
 import datetime
-import statistics
+import math
+import warnings
 
-from collections import defaultdict
-from itertools import cycle, groupby, count
+from collections import defaultdict, namedtuple
+from itertools import cycle, groupby
 
-import numpy as np
+from . import parse_date, date_fmt, models, slow, LazyModule
+from ...plotcache import PLOT_CACHE, plot_key
+from ...renderpool import RENDER_POOL, RenderError
 
-# don't use matplotlib gui
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+# numpy takes a while to import, so only do it when plotting. matplotlib is
+# only imported by the render processes, see crossbot.render
+np = LazyModule('numpy')
+timeseries = LazyModule('crossbot.timeseries')
+userstats = LazyModule('crossbot.userstats')
 
-from . import parse_date, date_fmt, models
-
-from settings import MEDIA_URL, MEDIA_ROOT
+from settings import MEDIA_URL
 
 logger = logging.getLogger(__name__)
 
+# plots of more days than there's room for are drawn with a point per week or
+# month instead, at most one every this many pixels of the figure's width
+PIXELS_PER_POINT = 5
+DAY = 'day'
+RESOLUTION_DAYS = {
+    DAY: 1,
+    models.TimeRollup.WEEK: 7,
+    models.TimeRollup.MONTH: 30,
+}
+
 
 def init(client):
     parser = client.parser.subparsers.add_parser('plot', help='plot something')
@@ -86,6 +97,21 @@ def init(client):
         help='Transparency for plotted points.'
         ' Default %(default)s.')
 
+    add_date_arguments(parser)
+
+    parser.add_argument(
+        '-f',
+        '--focus',
+        action='append',
+        type=str,
+        metavar='USER',
+        help=
+        'Slack name of player to focus the plot on. Can be used multiple times.'
+    )
+
+
+def add_date_arguments(parser):
+    """Add the --start-date, --end-date and --num-days options."""
     dates = parser.add_argument_group('Date range')
 
     def date_none(date_str):
@@ -110,21 +136,6 @@ def init(client):
         ' Ignored if both start-date and end-date given.'
         ' Default %(default)s.')
 
-    parser.add_argument(
-        '-f',
-        '--focus',
-        action='append',
-        type=str,
-        metavar='USER',
-        help=
-        'Slack name of player to focus the plot on. Can be used multiple times.'
-    )
-
-
-def fmt_min(sec, pos):
-    minutes, seconds = divmod(int(sec), 60)
-    return '{}:{:02}'.format(minutes, seconds)
-
 
 # "date" means a date string, "dt" means a datetime object
 def date_dt(date):
@@ -135,15 +146,122 @@ def date_dt(date):
     return datetime.datetime.strptime(date, date_fmt).date()
 
 
-def username_from_slackid(slackid):
-    user = models.CBUser.from_slackid(slackid, create=False)
-    if user:
-        return str(user)
+def get_date_range(args):
+    """The (start, end) dates from the add_date_arguments options.
+
+    If we have both dates, use them and correct num_days. If we have one, use
+    that and num_days. Otherwise, end is today and use num_days.
+    """
+    delta = datetime.timedelta(days=args.num_days)
+
+    if args.start_date:
+        start_dt = date_dt(args.start_date)
+        if args.end_date:
+            end_dt = date_dt(args.end_date)
+            args.num_days = (end_dt - start_dt).days
+        else:
+            end_dt = start_dt + delta
     else:
-        logger.debug("Can't find slack name for %s", slackid)
-    return slackid
+        end_dt = date_dt(args.end_date or parse_date('now'))
+        start_dt = end_dt - delta
+
+    return start_dt, end_dt
+
+
+def plot_url(fname):
+    return 'https://crossbot.uwplse.org' + MEDIA_URL + fname
+
+
+def attach_cached(request, key, name='plot'):
+    """Attach the plot for `key` if it's already been rendered.
+
+    Returns:
+        Whether it was, otherwise render it with `figure`.
+    """
+    fname = PLOT_CACHE.get(key)
+    if fname:
+        request.attach(name, plot_url(fname))
+    return fname is not None
+
+
+def resolution_for(num_days, width):
+    """The DAY, WEEK or MONTH to plot `num_days` at in `width` pixels."""
+    max_points = width // PIXELS_PER_POINT
+    for resolution in (DAY, models.TimeRollup.WEEK):
+        if num_days / RESOLUTION_DAYS[resolution] <= max_points:
+            return resolution
+    return models.TimeRollup.MONTH
+
+
+def rollup_lines(table, period, first, last):
+    """Each user's median solve in each week or month from `first` to `last`.
+
+    Returns:
+        A list of (user, dates, values) sorted by user name, with a point in
+        the middle of each period, NaN if they didn't solve any.
+    """
+    rows = list(
+        models.TimeRollup.between(
+            table, period, first,
+            last).filter(median__isnull=False).values_list(
+                'user_id', 'start', 'median'))
+    starts = sorted({start for _, start, _ in rows})
+    index = {start: i for i, start in enumerate(starts)}
+    dates = []
+    for start in starts:
+        days = models.TimeRollup.period_days(period, start)
+        middle = start + datetime.timedelta(days=(days - 1) // 2)
+        # the first and last periods can stick out of the plot
+        dates.append(min(max(first, middle), last))
+
+    values = defaultdict(lambda: [math.nan] * len(starts))
+    for slackid, start, median in rows:
+        values[slackid][index[start]] = median
+    users = models.CBUser.objects.in_bulk(list(values))
+    return sorted(
+        ((users[slackid], dates, row) for slackid, row in values.items()),
+        key=lambda line: str(line[0]))
+
+
+def downsampled(dates, values, max_points, max_gap):
+    """(dates, values) of a line downsampled to about `max_points`, see
+    crossbot.downsample.
+    """
+    # numpy is slow to import, so only do it when plotting
+    from ...downsample import downsample
+
+    x, y = downsample(
+        np.array([date.toordinal() for date in dates]),
+        np.array(values, dtype=float), max_points, max_gap)
+    return [datetime.date.fromordinal(o) for o in x.tolist()], y.tolist()
+
+
+def figure_size(num_days):
+    """The (width, height, dpi) of a plot of `num_days`."""
+    width, height, dpi = (120 * num_days), 600, 100
+    return max(400, min(width, 1000)), height, dpi
+
+
+def render(request, key, spec, name='plot'):
+    """Draw a crossbot.render spec in a render process, save it as the plot
+    for `key` (see crossbot.plotcache) and attach it.
+    """
+    try:
+        fname = PLOT_CACHE.save(key,
+                                lambda path: RENDER_POOL.render(spec, path))
+    except RenderError:
+        request.reply(
+            'Sorry, that plot was too big to draw. Try fewer days?',
+            direct=True)
+        return
+    request.attach(name, plot_url(fname))
+
+
+def username_from_slackid(slackid):
+    return models.CBUser.name_from_slackid(slackid)
 
 
+@slow
 def plot(request):
     '''Plot everyone's times in a date range.
     `smoothing` is between 0 (no smoothing) and 1 exclusive. .6 default
@@ -153,28 +271,7 @@ def plot(request):
 
     args = request.args
 
-    start_date = args.start_date
-    end_date = args.end_date
-
-    delta = datetime.timedelta(days=args.num_days)
-
-    # if we have both dates, use them and correct num days
-    # if we have one, use that and num_days
-    # otherwise, end_date is today and use num_days
-    if start_date:
-        start_dt = date_dt(start_date)
-        if end_date:
-            end_dt = date_dt(end_date)
-            args.num_days = (end_dt - start_dt).days
-        else:
-            end_dt = start_dt + delta
-    else:
-        end_dt = date_dt(end_date if end_date else parse_date('now'))
-        start_dt = end_dt - delta
-
-    # reformat the dates based on the above dt calculations
-    start_date = start_dt.strftime(date_fmt)
-    end_date = end_dt.strftime(date_fmt)
+    start_dt, end_dt = get_date_range(args)
 
     if not 0 <= args.smooth <= 0.95:
         request.reply('smooth should be between 0 and 0.95', direct=True)
@@ -188,6 +285,9 @@ def plot(request):
         request.reply('start date should be before end_date', direct=True)
         return
 
+    size = figure_size(args.num_days)
+    resolution = resolution_for(args.num_days + 1, size[0])
+
     dt_range = [
         start_dt + datetime.timedelta(days=i) for i in range(args.num_days + 1)
     ]
@@ -199,66 +299,78 @@ def plot(request):
     # plotted to be "overweighted" because there's no history
     if args.score_function is get_normalized_scores:
         start_dt -= datetime.timedelta(days=int(1 / (1 - args.smooth)))
-        start_date = start_dt.strftime(date_fmt)
 
-    entries = (args.table.all_times().filter(
-        date__gte=start_date, date__lte=end_date).order_by(
-            'date', 'user__slackid'))
+    # long plots of the times show each week or month's median, once there
+    # are rollups of them
+    rollups = (resolution != DAY and args.score_function is get_times
+               and models.TimeRollup.built(args.table))
+
+    columns_start, columns_end = start_dt, end_dt
+    if rollups:
+        # the first and last weeks or months are plotted whole, so the key
+        # has to change with the times in all of them
+        columns_start = models.TimeRollup.period_start(resolution, start_dt)
+        columns_end = models.TimeRollup.period_end(resolution, end_dt)
+    columns = timeseries.series(args.table).between(columns_start, columns_end)
+    # smoothing only changes the normalized scores
+    smooth = None
+    if args.score_function is get_normalized_scores:
+        smooth = args.smooth
+    key = plot_key('plot', args.table.game, date_range[0], date_range[-1],
+                   args.score_function.__name__, smooth, args.scale,
+                   args.alpha, sorted(args.focus or []), resolution, rollups,
+                   *columns_digest(columns))
+    if attach_cached(request, key):
+        return
 
-    logger.debug('all entries %s', entries)
+    times = columns_matrix(columns)
 
-    scores_by_user, ticker, formatter = args.score_function(entries, args)
+    logger.debug('all times %s', times)
 
-    # find contiguous sequences of dates
-    user_seqs = [(user, [
-        list(g) for k, g in groupby((
-            (date, date_scores.get(date))
-            for date in date_range), lambda ds: ds[1] is not None) if k
-    ]) for user, date_scores in scores_by_user.items()]
+    scores, ticker, formatter = args.score_function(times, args)
 
     # sort by actual username
-    user_seqs.sort(key=lambda tup: str(tup[0]))
-
-    logger.debug('by user %s', scores_by_user)
-    logger.debug('seqs %s', user_seqs)
-
-    width, height, dpi = (120 * args.num_days), 600, 100
-    width = max(400, min(width, 1000))
+    user_rows = sorted(scores.rows(date_range), key=lambda tup: str(tup[0]))
 
-    fig = plt.figure(figsize=(width / dpi, height / dpi), dpi=dpi)
-    ax = fig.add_subplot(1, 1, 1)
-
-    cmap = plt.get_cmap('nipy_spectral')
-    markers = cycle(['-o', '-X', '-s', '-^'])
-
-    n_users = len(user_seqs)
-    colors = [cmap(i / n_users) for i in range(n_users)]
+    logger.debug('by user %s', scores)
 
     if args.score_function in [get_streaks, get_win_streaks]:
-        thickness = 1
+        kind, colormap = 'bars', None
+        # find contiguous sequences of dates
+        user_seqs = [(user, [
+            list(g) for k, g in groupby(
+                zip(date_range, row), lambda ds: ds[1] is not None) if k
+        ]) for user, row in user_rows]
+        logger.debug('seqs %s', user_seqs)
+
         # sort by first date appeared
         user_seqs.sort(key=lambda x: min(x[1][0]))
-
-        for (user, date_seqs), i, color in zip(user_seqs, count(), colors):
-            label = str(user)
-            starts_and_lens = [((date_dt(min(seq)[0]) - start_dt).days,
-                                len(seq)) for seq in date_seqs]
-            starts, lens = zip(*starts_and_lens)
-            ax.barh(i, lens, thickness, starts, tick_label=label)
-
-        plt.yticks(
-            np.arange(len(user_seqs)) * thickness,
-            [str(user) for user, seq in user_seqs],
-            size=6,
-        )
+        plot_series = [{
+            'label': str(user),
+            'starts': [seq[0][0] for seq in date_seqs],
+            'lengths': [len(seq) for seq in date_seqs],
+        } for user, date_seqs in user_seqs]
 
     else:
-        max_score = -100000
-
-        for (user, date_seqs), color, marker in zip(user_seqs, colors,
-                                                    markers):
+        kind, colormap = 'lines', 'nipy_spectral'
+        markers = cycle(['-o', '-X', '-s', '-^'])
+        if rollups:
+            user_lines = rollup_lines(args.table, resolution, date_range[0],
+                                      date_range[-1])
+        else:
+            user_lines = [(user, date_range,
+                           [math.nan if s is None else s for s in row])
+                          for user, row in user_rows]
+            if resolution != DAY:
+                max_points = size[0] // PIXELS_PER_POINT
+                user_lines = [(user, ) + downsampled(
+                    dates, values, max_points, RESOLUTION_DAYS[resolution])
+                              for user, dates, values in user_lines]
+
+        plot_series = []
+        for (user, dates, values), marker in zip(user_lines, markers):
             name = str(user)
-            label = name
+            color = None
             alpha = args.alpha
 
             if args.focus:
@@ -268,159 +380,210 @@ def plot(request):
                     color = 'gray'
                     alpha = 0.3
 
-            for date_seq in date_seqs:
-                dates, scores = zip(*date_seq)
-                max_score = max(max_score, max(scores))
-
-                ax.plot_date(
-                    mdates.date2num(dates),
-                    scores,
-                    marker,
-                    label=label,
-                    color=color,
-                    alpha=alpha)
+            plot_series.append({
+                'label': name,
+                'dates': dates,
+                # the line is broken where there's no score
+                'values': values,
+                'fmt': marker,
+                'color': color,
+                'alpha': alpha,
+            })
+
+    render(
+        request, key, {
+            'size': size,
+            'series': plot_series,
+            'kind': kind,
+            'colormap': colormap,
+            'first': date_range[0],
+            'last': date_range[-1],
+            'yscale': args.scale,
+            'ytick': ticker,
+            'yformat': formatter,
+            'ylabel': None,
+        })
 
-                # make sure that we don't but anyone in the legend twice
-                label = '_nolegend_'
 
-        ax.set_yscale(args.scale)
-        ax.yaxis.set_major_locator(ticker)
-        ax.yaxis.set_major_formatter(formatter)
+#########################
+### Scoring Functions ###
+#########################
 
-    fig.autofmt_xdate()
-    ax.xaxis.set_major_locator(mdates.DayLocator())
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %-d'))  # May 3
+# these should all take a ScoreMatrix of times and the args object, and
+# return a ScoreMatrix of scores and also the y tick spacing and format for
+# crossbot.render
+#
+# The matrices are users x dates, with NaN where a user has no time, so each
+# step is one numpy operation for all the days at once rather than a loop
+# over the entries.
+
+
+class ScoreMatrix(namedtuple('ScoreMatrix', ['users', 'dates', 'scores'])):
+    """A users x dates array of scores, NaN where a user has no score."""
+
+    def rows(self, dates):
+        """Yield each user with a score, and their scores (or None) on `dates`.
+        """
+        index = {date: i for i, date in enumerate(self.dates)}
+        # dates we have no scores for all use the extra NaN column at the end
+        cols = [index.get(date, -1) for date in dates]
+        padded = np.hstack(
+            [self.scores, np.full((len(self.users), 1), np.nan)])
+        scored = ~np.isnan(self.scores).all(axis=1)
+        for user, row, keep in zip(self.users, padded[:, cols].tolist(),
+                                   scored):
+            if keep:
+                yield user, [None if math.isnan(s) else s for s in row]
+
+    def as_dict(self):
+        """Return the scores as scores[user][date], skipping NaNs."""
+        scores = defaultdict(dict)
+        rows, cols = np.nonzero(~np.isnan(self.scores))
+        for row, col, score in zip(rows, cols,
+                                   self.scores[rows, cols].tolist()):
+            scores[self.users[row]][self.dates[col]] = score
+        return scores
+
+
+def time_matrix(entries):
+    """Return a ScoreMatrix of the entries' times, with the dates sorted."""
+    users = {}
+    rows, dates, seconds = [], [], []
+    for e in entries:
+        rows.append(users.setdefault(e.user, len(users)))
+        dates.append(e.date)
+        seconds.append(e.seconds)
 
-    # hack to prevent crashes on the regular crosswords
-    ax.xaxis.get_major_locator().MAXTICKS = 10000
+    unique_dates = sorted(set(dates))
+    date_index = {date: i for i, date in enumerate(unique_dates)}
+    cols = [date_index[date] for date in dates]
 
-    ax.legend(fontsize=6, loc='upper left')
+    matrix = np.full((len(users), len(unique_dates)), np.nan)
+    matrix[rows, cols] = seconds
+    return ScoreMatrix(list(users), unique_dates, matrix)
 
-    fname = 'plot_{}.png'.format(datetime.datetime.now().timestamp())
 
-    with open(MEDIA_ROOT + '/' + fname, 'wb') as f:
-        fig.savefig(f, format='png', bbox_inches='tight')
-    plt.close(fig)
+def columns_matrix(columns):
+    """Return a ScoreMatrix of the times in crossbot.timeseries Columns."""
+    user_index, rows = np.unique(columns.user_index, return_inverse=True)
+    ordinals, cols = np.unique(columns.dates, return_inverse=True)
+    slackids = [columns.users[i] for i in user_index.tolist()]
+    users = models.CBUser.objects.in_bulk(slackids)
 
-    request.attach('plot', 'https://crossbot.uwplse.org' + MEDIA_URL + fname)
+    matrix = np.full((len(slackids), len(ordinals)), np.nan)
+    matrix[rows, cols] = columns.seconds
+    return ScoreMatrix(
+        [users[slackid] for slackid in slackids],
+        [datetime.date.fromordinal(o) for o in ordinals.tolist()], matrix)
 
 
-#########################
-### Scoring Functions ###
-#########################
+def columns_digest(columns):
+    """The times in crossbot.timeseries Columns as (slackids, dates, seconds)
+    arrays in a canonical order, to key the plot of them.
 
-# these should all take a list of Entry objects and the args object, and a
-# return a dict that looks like this:
-#   scores[userid][date] = score
-# and also a ticker and a formatter
+    The user indexes and row order differ between workers, the slackids
+    don't.
+    """
+    slackids = np.array(columns.users, dtype=str)[columns.user_index]
+    order = np.lexsort((columns.dates, slackids))
+    return slackids[order], columns.dates[order], columns.seconds[order]
 
 
-def get_normalized_scores(entries, args):
+def get_normalized_scores(times, args):
     """Generate smoothed scores based on mean, stdev of that days times. """
 
-    times_by_date = defaultdict(dict)
-    for e in entries:
-        x = e.seconds
-        # if x > 0:
-        #     x = np.log(x)
-        times_by_date[e.date][e.user] = x
+    ticker = 0.25
+    formatter = 'plain'
 
-    sorted_dates = sorted(times_by_date.keys())
+    users, dates, times = times
+    if not dates:
+        return ScoreMatrix(users, dates, times), ticker, formatter
+    played = ~np.isnan(times)
+    failed = times < 0
 
     # failures come with a heaver ranking penalty
     MAX_SCORE = 1.5
     FAILURE_PENALTY = -2
 
-    def mk_score(mean, t, stdev):
-        if t < 0:
-            return FAILURE_PENALTY
-        if stdev == 0:
-            return 0
-
-        score = (mean - t) / stdev
-        return np.clip(score, -MAX_SCORE, MAX_SCORE)
-
-    # scores are the stdev away from mean of that day
-    scores = {}
-    for date, user_times in times_by_date.items():
-        times = [t for t in user_times.values() if t is not None]
-        # make failures 1 minute worse than the worst time
-        times = [t if t >= 0 else max(times) + 60 for t in times]
-        q1, q3 = np.percentile(times, [25, 75])
-        stdev = statistics.pstdev(times)
-        o1, o3 = q1 - stdev, q3 + stdev
-        times = [t for t in times if o1 <= t <= o3]
-        mean = statistics.mean(times)
-        stdev = statistics.pstdev(times, mean)
-        scores[date] = {
-            userid: mk_score(mean, t, stdev)
-            for userid, t in user_times.items() if t is not None
-        }
-
+    # make failures 1 minute worse than the worst time
+    times_fixed = np.where(failed, np.nanmax(times, axis=0) + 60, times)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # drop the outliers more than a stdev outside the quartiles
+        # each date's times, grouped by column
+        q1, q3 = userstats.grouped_percentiles(
+            np.nonzero(played)[1], times_fixed[played],
+            np.count_nonzero(played, axis=0), [25, 75])
+        stdev = np.nanstd(times_fixed, axis=0)
+        outlier = (times_fixed < q1 - stdev) | (times_fixed > q3 + stdev)
+        trimmed = np.where(outlier, np.nan, times_fixed)
+
+        # scores are the stdev away from mean of that day
+        mean = np.nanmean(trimmed, axis=0)
+        stdev = np.nanstd(trimmed, axis=0)
+        scores = np.clip((mean - times) / stdev, -MAX_SCORE, MAX_SCORE)
+
+    scores[:, stdev == 0] = 0
+    scores[failed] = FAILURE_PENALTY
+    scores[~played] = np.nan
+
+    # exponential smoothing over the days each user played, all users at once
     new_score_weight = 1 - args.smooth
-    running = defaultdict(list)
-
-    weighted_scores = defaultdict(dict)
-    for date in sorted_dates:
-        for user, score in scores[date].items():
-
-            old_score = running.get(user)
-
-            new_score = score * new_score_weight + old_score * (1 - new_score_weight) \
-                        if old_score is not None else score
-
-            weighted_scores[user][date] = running[user] = new_score
+    running = np.full(len(users), np.nan)
+    weighted_scores = np.full_like(scores, np.nan)
+    for i in range(len(dates)):
+        score = scores[:, i]
+        running = np.where(
+            np.isnan(score), running,
+            np.where(
+                np.isnan(running), score,
+                score * new_score_weight + running * (1 - new_score_weight)))
+        weighted_scores[played[:, i], i] = running[played[:, i]]
 
-    ticker = matplotlib.ticker.MultipleLocator(base=0.25)
-    formatter = matplotlib.ticker.ScalarFormatter(useOffset=False)
+    return ScoreMatrix(users, dates, weighted_scores), ticker, formatter
 
-    return weighted_scores, ticker, formatter
 
-
-def get_times(entries, args):
+def get_times(times, args):
     """Just get the times, removing any failures."""
 
-    times = defaultdict(dict)
-    for e in entries:
-        if e.seconds >= 0:
-            # don't add failures to the times plot
-            times[e.user][e.date] = e.seconds
+    users, dates, times = times
+    # don't add failures to the times plot
+    times = np.where(times < 0, np.nan, times)
 
     # Set base to 30s for mini crossword, 5 min for regular or sudoku
     sec = 30 if args.table == models.MiniCrosswordTime else 60 * 5
-    ticker = matplotlib.ticker.MultipleLocator(base=sec)
-    formatter = matplotlib.ticker.FuncFormatter(fmt_min)  # 1:30
-
-    return times, ticker, formatter
+    ticker = sec
+    formatter = 'minutes'  # 1:30
 
+    return ScoreMatrix(users, dates, times), ticker, formatter
 
-def get_win_streaks(entries, args):
-    """Just get the times, keeping failures because we're just going for completion"""
-
-    best_time = defaultdict(lambda: 99999999999999)
-    for e in entries:
-        if e.seconds >= 0:
-            best_time[e.date] = min(best_time[e.date], e.seconds)
 
-    times = defaultdict(dict)
-    for e in entries:
-        if e.seconds == best_time[e.date]:
-            times[e.user][e.date] = e.seconds
+def get_win_streaks(times, args):
+    """Just get the winning times, failures never win"""
 
     ticker = None
     formatter = None
 
-    return times, ticker, formatter
+    users, dates, times = times
+    if not dates:
+        return ScoreMatrix(users, dates, times), ticker, formatter
+
+    solved = np.where(times >= 0, times, np.nan)
+    # days where everyone failed have no best time, and so no winners
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        best_time = np.nanmin(solved, axis=0)
+    times = np.where(times == best_time, times, np.nan)
 
+    return ScoreMatrix(users, dates, times), ticker, formatter
 
-def get_streaks(entries, args):
+
+def get_streaks(times, args):
     """Just get the times, keeping failures because we're just going for completion"""
 
-    times = defaultdict(dict)
-    for e in entries:
-        times[e.user][e.date] = e.seconds
+    users, dates, times = times
 
     ticker = None
     formatter = None
 
-    return times, ticker, formatter
+    return ScoreMatrix(users, dates, times), ticker, formatter
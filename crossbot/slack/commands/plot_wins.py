@@ -0,0 +1,173 @@
+import datetime
+import html
+import re
+
+from django.db.models import Q
+
+from . import models, slow
+from .plot import (add_date_arguments, attach_cached, figure_size,
+                   get_date_range, np, render)
+from ...plotcache import plot_key
+
+# how a Slack mention like `@alice` arrives in a command
+MENTION_RX = re.compile(r'<@(\w+)(?:\|[^>]*)?>')
+
+
+def init(client):
+
+    parser = client.parser.subparsers.add_parser(
+        'plot-wins',
+        aliases=['vs'],
+        help='Race players to the most wins, and show their head to heads.')
+    parser.set_defaults(
+        command=plot_wins,
+        alpha=0.7,
+        num_days=7,
+    )
+
+    appearance = parser.add_argument_group('Plot appearance')
+
+    appearance.add_argument(
+        '--alpha',
+        type=float,
+        help='Transparency for plotted lines.'
+        ' Default %(default)s.')
+
+    add_date_arguments(parser)
+
+    parser.add_argument(
+        'users',
+        nargs='+',
+        metavar='USER',
+        help='Slack names of players. With just one, you play them.')
+
+
+def find_user(name):
+    """The CBUser for a mention, slackid or slack name, or None."""
+    match = MENTION_RX.fullmatch(html.unescape(name))
+    if match:
+        return models.CBUser.from_slackid(match.group(1), create=False)
+    bare = name.lstrip('@')
+    return models.CBUser.objects.filter(
+        Q(slackid=name) | Q(slackname__in=[bare, '@' + bare])).first()
+
+
+def win_matrix(times):
+    """Count wins in a users x dates array of times, all at once.
+
+    Args:
+        times: NaN where a user has no time, and negative for a fail.
+
+    Returns:
+        (race, pairwise, ties). race is a users x dates array of cumulative
+        wins on the days everyone played, pairwise[i, j] is the cumulative
+        number of days user i beat user j, and ties[i, j] is how many days
+        they tied in total.
+    """
+    played = ~np.isnan(times)
+    # fails lose to every solve and tie each other, and the inf for not
+    # playing is always masked out by `played`
+    solved = np.where(played & (times >= 0), times, np.inf)
+
+    best = solved.min(axis=0)
+    everyone = played.all(axis=0) & np.isfinite(best)
+    race = np.cumsum(everyone & (solved == best), axis=1)
+
+    both = played[:, None, :] & played[None, :, :]
+    a, b = solved[:, None, :], solved[None, :, :]
+    pairwise = np.cumsum(both & (a < b), axis=2)
+    ties = (both & (a == b)).sum(axis=2)
+    return race, pairwise, ties
+
+
+@slow
+def plot_wins(request):
+    '''Race players to the most wins and show their head to head records
+    (`vs @alice @bob -n 30`).'''
+
+    args = request.args
+
+    if not 0 <= args.alpha <= 1:
+        request.reply('alpha should be between 0 and 1', direct=True)
+        return
+
+    start_dt, end_dt = get_date_range(args)
+    if start_dt > end_dt:
+        request.reply('start date should be before end_date', direct=True)
+        return
+
+    users = []
+    for name in args.users:
+        user = find_user(name)
+        if user is None:
+            request.reply('I don\'t know who {} is'.format(name), direct=True)
+            return
+        users.append(user)
+    if len(users) == 1:
+        users.insert(0, request.user)
+    users = list(dict.fromkeys(users))
+    if len(users) < 2:
+        request.reply('I need 2 or more users', direct=True)
+        return
+
+    dates = [
+        start_dt + datetime.timedelta(days=i)
+        for i in range((end_dt - start_dt).days + 1)
+    ]
+    rows = {user.pk: i for i, user in enumerate(users)}
+    times = np.full((len(users), len(dates)), np.nan)
+    entries = args.table.objects.filter(
+        user__in=users, date__range=(start_dt, end_dt)).values_list(
+            'user_id', 'date', 'seconds')
+    for user_id, date, seconds in entries:
+        times[rows[user_id], (date - start_dt).days] = seconds
+
+    race, pairwise, ties = win_matrix(times)
+
+    lines = [
+        '*{} head to head, {} to {}*'.format(
+            args.table.game.replace('_', ' ').capitalize(), start_dt, end_dt)
+    ]
+    for i, a in enumerate(users):
+        for j in range(i + 1, len(users)):
+            line = '{} {} - {} {}'.format(a, pairwise[i, j, -1],
+                                          pairwise[j, i, -1], users[j])
+            if ties[i, j]:
+                line += ' ({} tied)'.format(ties[i, j])
+            lines.append(line)
+    request.reply('\n'.join(lines))
+
+    key = plot_key('plot-wins', args.table.game, start_dt, end_dt, args.alpha,
+                   [user.pk for user in users], times)
+    if attach_cached(request, key, 'wins'):
+        return
+
+    render(
+        request, key, {
+            'size':
+            figure_size(len(dates) - 1),
+            'series': [{
+                'label': str(user),
+                'dates': dates,
+                'values': wins.tolist(),
+                'fmt': '-',
+                'color': None,
+                'alpha': args.alpha,
+            } for user, wins in zip(users, race)],
+            'kind':
+            'lines',
+            'colormap':
+            None,
+            'first':
+            dates[0],
+            'last':
+            dates[-1],
+            'yscale':
+            'linear',
+            'ytick':
+            None,
+            'yformat':
+            None,
+            'ylabel':
+            'wins',
+        }, 'wins')
@@ -1,7 +1,7 @@
 import logging
 import re
 
-from . import sql, models
+from . import sql, models, slow
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +31,7 @@ def linkify_dates(s):
         r'<https://www.nytimes.com/crosswords/game/mini/\2/\3/\4|\1>', s)
 
 
+@slow
 def query(request):
     args = request.args
 
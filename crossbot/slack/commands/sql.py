@@ -5,7 +5,7 @@ import re
 import sqlite3
 import traceback
 
-from . import models, DB_PATH
+from . import models, slow, DB_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -84,13 +84,7 @@ def _do_sql(cmd, *args):
 
             # Replace slackids with slacknames
             def username_from_slackid(m):
-                slackid = m.group(1)
-                user = models.CBUser.from_slackid(slackid, create=False)
-                if user:
-                    return str(user)
-                else:
-                    logger.debug("Can't find slack name for %s", slackid)
-                return slackid
+                return models.CBUser.name_from_slackid(m.group(1))
 
             logger.debug('result %s', result)
             result = re.sub(r'(U[A-Z0-9]{8})', username_from_slackid, result)
@@ -136,6 +130,7 @@ def run_sql_command(raw_cmd, args):
         return "dont try to dos me, this incident has been reported"
 
 
+@slow
 def sql(request):
     '''Run a sql command.'''
     if request.args.sql_command:
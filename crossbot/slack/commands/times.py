@@ -1,6 +1,6 @@
 from django.utils import timezone
 
-from . import parse_date
+from . import models, parse_date
 from .add import emoji
 
 
@@ -27,15 +27,20 @@ def times(request):
 
     day_of_week = timezone.now().weekday()
 
-    for item in args.table.times_for_date(args.date).order_by('seconds'):
+    # no summary means no times, so don't bother looking
+    summary = models.ResultsSummary.for_date(args.table, args.date)
+    items = []
+    if summary:
+        items = args.table.times_for_date(args.date).select_related('user')
+        items = items.order_by('seconds')
+
+    for item in items:
         name = str(item.user)
         if item.seconds < 0:
             failures += ':facepalm: - {}\n'.format(name)
         else:
             emj = emoji(item.seconds, args.table, day_of_week)
-            minutes, seconds = divmod(item.seconds, 60)
-            response += ':{}: - {}:{:02d} - {}\n'.format(
-                emj, minutes, seconds, name)
+            response += ':{}: - {} - {}\n'.format(emj, item.time_str(), name)
 
     # append now so failures at the end
     response += failures
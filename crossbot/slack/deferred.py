@@ -0,0 +1,114 @@
+"""Run slow slash commands in the background and answer via response_url.
+
+Slack gives us 3 seconds to acknowledge a slash command. Commands marked with
+`crossbot.slack.commands.slow` are instead handed to a `DeferredExecutor`,
+which runs them on a small pool of threads and posts the finished response to
+the request's `response_url`.
+"""
+
+import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django import db
+
+from .api import respond
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_slow(command):
+    return getattr(command, 'slow', False)
+
+
+class DeferredExecutor:
+    """A bounded pool of background threads for slow commands."""
+
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='crossbot-deferred')
+
+        self._lock = threading.Lock()
+        self._stats = {
+            'queued': 0,
+            'running': 0,
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'overflowed': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'run_seconds_total': 0.0,
+            'run_seconds_max': 0.0,
+        }
+
+    def stats(self):
+        """Return a snapshot of the queue depth and run-time counters."""
+        with self._lock:
+            return dict(self._stats)
+
+    def submit(self, request, command):
+        """Queue `command(request)` to run in the background.
+
+        Returns:
+            True if the command was queued, False if the queue is full and the
+            caller should run the command itself.
+        """
+        with self._lock:
+            if self._stats['queued'] >= self.max_queue:
+                self._stats['overflowed'] += 1
+                logger.warning('deferred queue full (%s), running %s inline',
+                               self._stats['queued'], command.__name__)
+                return False
+            self._stats['queued'] += 1
+            self._stats['submitted'] += 1
+
+        self.pool.submit(self._run, request, command, time.monotonic())
+        return True
+
+    def _run(self, request, command, submitted_at):
+        started_at = time.monotonic()
+        wait = started_at - submitted_at
+        with self._lock:
+            self._stats['queued'] -= 1
+            self._stats['running'] += 1
+            self._stats['wait_seconds_total'] += wait
+            self._stats['wait_seconds_max'] = max(
+                self._stats['wait_seconds_max'], wait)
+
+        failed = False
+        try:
+            with metrics.track_command(command):
+                command(request)
+        except:
+            failed = True
+            logger.exception('deferred command %s failed', command.__name__)
+            request.reply(
+                'Sorry, something went wrong running that command.',
+                direct=True)
+        finally:
+            # this thread's connection would otherwise stay open forever
+            db.connection.close()
+
+        try:
+            respond(request.response_url, request.response_json())
+        except:
+            failed = True
+            logger.exception('could not deliver deferred response for %s',
+                             command.__name__)
+
+        run = time.monotonic() - started_at
+        with self._lock:
+            self._stats['running'] -= 1
+            self._stats['failed' if failed else 'completed'] += 1
+            self._stats['run_seconds_total'] += run
+            self._stats['run_seconds_max'] = max(
+                self._stats['run_seconds_max'], run)
+
+        logger.debug('deferred %s waited %.3fs, ran %.3fs', command.__name__,
+                     wait, run)
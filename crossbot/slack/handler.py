@@ -1,24 +1,38 @@
 import logging
 import traceback
 
-from . import commands
+from django.db import transaction
+
+from . import commands, outbox
+from .. import metrics
 from .commands import COMMANDS
 from .parser import Parser, ParserException
 from .api import *
-from ..models import CBUser
+from .deferred import DeferredExecutor, is_slow
+from ..models import CBUser, OutboxMessage
+from ..settings import DEFERRED_WORKERS, DEFERRED_QUEUE_SIZE
 
 logger = logging.getLogger(__name__)
 
 
 class Handler:
-    def __init__(self, limit_commands=False):
+    def __init__(self, limit_commands=False, deferred_workers=None):
         self.parser = Parser(limit_commands)
         self.init_plugins()
+        self.parser.compile_fast_paths()
+
+        if deferred_workers is None:
+            deferred_workers = DEFERRED_WORKERS
+        if deferred_workers > 0:
+            self.deferred = DeferredExecutor(deferred_workers,
+                                             DEFERRED_QUEUE_SIZE)
+        else:
+            self.deferred = None
 
     def init_plugins(self):
         for mod_name in COMMANDS:
             try:
-                mod = getattr(commands, mod_name)
+                mod = commands.load(mod_name)
 
                 # hopefully the plugins will add themselves to subparsers
                 if hasattr(mod, 'init'):
@@ -44,10 +58,22 @@ class Handler:
 
                 command = request.command
 
-            return command(request)
+            if self.should_defer(request, command):
+                if self.deferred.submit(request, command):
+                    request.deferred = True
+                    return None
+
+            with metrics.track_command(command):
+                return command(request)
         except ParserException as exn:
+            metrics.parse_error()
             request.reply(str(exn), direct=True)
 
+    def should_defer(self, request, command):
+        """Slow commands are deferred if the request can be answered later."""
+        return (self.deferred is not None and is_slow(command)
+                and getattr(request, 'response_url', None))
+
 
 class Request:
     userid = 'command-line-user'
@@ -78,14 +104,18 @@ class SlashCommandRequest:
             slackid=post_data['user_id'], slackname=post_data['user_name'])
 
         self.in_channel = in_channel
+        self.deferred = False
         self.replies = []
         self.attachments = []
 
     def reply(self, msg, direct=False):
         self.replies.append(msg)
 
-    # note, this one is not delayed
     def message_and_react(self, msg, emoji, as_user=None):
+        """Queue a message to the channel and a reaction to it.
+
+        Both are sent by the outbox once the current transaction commits.
+        """
         if as_user:
             name = as_user.slack_fullname or as_user.slackname or 'crossbot'
             kwargs = {
@@ -96,8 +126,8 @@ class SlashCommandRequest:
         else:
             kwargs = {}
 
-        timestamp = post_message(self.channel, text=msg, **kwargs)
-        react(emoji, self.channel, timestamp)
+        OutboxMessage.enqueue(self.channel, msg, emoji, **kwargs)
+        transaction.on_commit(outbox.wake)
 
     def attach(self, name, path):
         self.attachments.append({
@@ -106,6 +136,13 @@ class SlashCommandRequest:
             'image_url': path
         })
 
+    def ack_json(self):
+        """The immediate response for a deferred request."""
+        return {
+            'response_type': 'ephemeral',
+            'text': 'Working on it...',
+        }
+
     def response_json(self):
         return {
             'response_type': 'in_channel' if self.in_channel else 'ephemeral',
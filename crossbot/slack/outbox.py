@@ -0,0 +1,86 @@
+"""Deliver queued Slack messages from the OutboxMessage table.
+
+Commands queue messages with `SlashCommandRequest.message_and_react`, which
+wakes this process's drainer thread once the surrounding transaction commits.
+The `crossbot.cron.DrainOutbox` job also drains periodically, picking up
+retries and anything left behind by a worker that died.
+"""
+
+import logging
+import threading
+
+from django import db
+from django.utils import timezone
+
+from ..models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+def drain():
+    """Deliver every message that is due, in order within each channel.
+
+    A channel stops at its first message that can't be delivered yet, so
+    later messages never overtake it.
+
+    Returns:
+        The number of messages delivered (or given up on).
+    """
+    done = 0
+    channels = (OutboxMessage.objects.values_list('channel',
+                                                  flat=True).distinct())
+    for channel in list(channels):
+        pending = OutboxMessage.objects.filter(channel=channel).order_by('id')
+        while True:
+            now = timezone.now()
+            head = pending.first()
+            if head is None or head.next_attempt > now:
+                break
+            if not head.claim(now):
+                # someone else is delivering this channel
+                break
+            if not head.deliver():
+                break
+            done += 1
+
+    if done:
+        logger.debug('delivered %s outbox messages', done)
+    return done
+
+
+class Drainer:
+    """A background thread that drains the outbox whenever it is woken."""
+
+    def __init__(self, interval=30):
+        self.interval = interval
+        self.event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name='crossbot-outbox', daemon=True)
+                self.thread.start()
+        self.event.set()
+
+    def _run(self):
+        while True:
+            # also wake up every so often to retry failed messages
+            self.event.wait(self.interval)
+            self.event.clear()
+            try:
+                drain()
+            except:
+                logger.exception('error draining outbox')
+            finally:
+                db.connection.close()
+
+
+_DRAINER = Drainer()
+
+
+def wake():
+    """Have this process's drainer deliver any pending messages."""
+    _DRAINER.wake()
@@ -75,6 +75,7 @@ class Parser:
             help='Use the scores from the easy sudoku.')
 
         self.subparsers = self.parser.add_subparsers(help='subparsers help')
+        self.fast_paths = {}
 
         help_parser = self.subparsers.add_parser('help')
         help_parser.set_defaults(command='help')
@@ -100,10 +101,42 @@ class Parser:
             # no subcommands specified, just print the regular message
             self.parser.print_help()
 
+    def compile_fast_paths(self):
+        """Precompile fast paths for every subcommand simple enough for one.
+
+        Call this once all the subparsers have been added.
+        """
+        table_flags = {}
+        for action in self.parser._actions:
+            if isinstance(action, argparse._StoreConstAction):
+                for flag in action.option_strings:
+                    table_flags[flag] = (action.dest, action.const)
+
+        self.fast_paths = {}
+        for name, subparser in self.subparsers.choices.items():
+            fast_path = FastPath.compile(self.parser, subparser, table_flags)
+            if fast_path:
+                self.fast_paths[name] = fast_path
+
+    def parse_fast(self, tokens):
+        """Parse without argparse if we can, returning None if we can't."""
+        for i, token in enumerate(tokens):
+            if not token.startswith('-'):
+                fast_path = self.fast_paths.get(token)
+                if fast_path:
+                    return fast_path.parse(tokens[:i], tokens[i + 1:])
+                return None
+        return None
+
     def parse(self, string):
         # will raise ParserException if it fails or prints help
 
-        args = self.parser.parse_args(string.split())
+        tokens = string.split()
+        args = self.parse_fast(tokens)
+        if args is not None:
+            return args.command, args
+
+        args = self.parser.parse_args(tokens)
         command = getattr(args, 'command', None)
 
         if command is None or command == 'help':
@@ -113,6 +146,116 @@ class Parser:
         return command, args
 
 
+class FastPath:
+    """A precompiled parser for a subcommand called with only positionals.
+
+    This covers the high volume commands like `add :32` and `times`, and
+    builds the same Namespace that argparse would, but without going through
+    the whole argparse tree. Anything unusual (options, help, a bad value,
+    the wrong number of arguments) makes `parse` return None, and the caller
+    should fall back to the full parser, which also produces the right error
+    message.
+    """
+
+    def __init__(self, defaults, table_flags, positionals):
+        self.defaults = defaults
+        self.table_flags = table_flags
+        # (dest, type, required, default) for each positional
+        self.positionals = positionals
+        self.num_required = sum(1 for p in positionals if p[2])
+
+    @classmethod
+    def compile(cls, parser, subparser, table_flags):
+        """Returns a FastPath for subparser, or None if it's too complex."""
+        positionals = []
+        options = {}
+        for action in subparser._actions:
+            if isinstance(action, argparse._HelpAction):
+                continue
+            if action.option_strings and not action.required:
+                # options fall back to argparse, we only need their defaults
+                if action.default is argparse.SUPPRESS:
+                    continue
+                if isinstance(action.default, str):
+                    return None
+                options[action.dest] = action.default
+                continue
+            if (action.option_strings
+                    or not isinstance(action, argparse._StoreAction)
+                    or action.nargs not in (None, '?') or action.choices):
+                return None
+
+            required = action.nargs is None
+            default = action.default
+            # argparse runs string defaults through the type at parse time
+            if isinstance(default, str) and action.type:
+                default = DeferredDefault(action.type, default)
+            positionals.append((action.dest, action.type, required, default))
+
+        # required positionals must come first, otherwise we'd need argparse's
+        # pattern matching to split up the arguments
+        required = [p[2] for p in positionals]
+        if required != sorted(required, reverse=True):
+            return None
+
+        defaults = {}
+        for action in parser._actions:
+            if argparse.SUPPRESS not in (action.dest, action.default):
+                defaults[action.dest] = action.default
+        defaults.update(parser._defaults)
+        defaults.update(options)
+        defaults.update(subparser._defaults)
+
+        return cls(defaults, table_flags, positionals)
+
+    def parse(self, flags, tokens):
+        args = dict(self.defaults)
+
+        # the table flags are mutually exclusive, leave repeats to argparse
+        if len(flags) > 1:
+            return None
+        for flag in flags:
+            if flag not in self.table_flags:
+                return None
+            dest, const = self.table_flags[flag]
+            args[dest] = const
+
+        if not self.num_required <= len(tokens) <= len(self.positionals):
+            return None
+
+        for i, (dest, type_func, required,
+                default) in enumerate(self.positionals):
+            if i < len(tokens):
+                if tokens[i].startswith('-'):
+                    return None
+                try:
+                    value = type_func(tokens[i]) if type_func else tokens[i]
+                except (argparse.ArgumentTypeError, TypeError, ValueError):
+                    return None
+            elif isinstance(default, DeferredDefault):
+                value = default()
+            else:
+                value = default
+            args[dest] = value
+
+        return argparse.Namespace(**args)
+
+
+class DeferredDefault:
+    """A string default that argparse would convert when parsing.
+
+    Defaults like `'now'` depend on when they're parsed, so the conversion
+    can't happen at compile time.
+    """
+
+    def __init__(self, type_func, value):
+        self.type_func = type_func
+        self.value = value
+
+    def __call__(self):
+        return self.type_func(self.value)
+
+
 # helper functions that can be used in the `type` field of
 # parser.add_argument()
 m_time_rx = re.compile(r'(\d*):(\d\d)')
@@ -148,6 +291,19 @@ def time(time_str):
     return total
 
 
+def positive_int(num_str):
+    """An int of at least 1, for counts of things to show."""
+    try:
+        num = int(num_str)
+    except ValueError:
+        num = 0
+    if num < 1:
+        raise argparse.ArgumentTypeError(
+            'Cannot parse "{}", should be a number of at least 1.'.format(
+                num_str))
+    return num
+
+
 date_fmt = '%Y-%m-%d'
 nyt_timezone = pytz.timezone('US/Eastern')
 
@@ -1,78 +1,164 @@
+import argparse
 import hashlib
 import hmac
+import itertools
 import json
+import random
+import runpy
+import shutil
+import socket
+import threading
 import time
 import os.path
-from datetime import datetime
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 
 import unittest
+from io import StringIO
+from concurrent.futures import Future, ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
+import numpy as np
+from matplotlib.image import imread
+import requests
+
 from django.conf import settings
-from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.test.client import RequestFactory
 from django.urls import reverse
 from django.contrib.staticfiles import finders
+from django.db import connection, transaction
 from django.utils import timezone
 
-from crossbot.slack.commands import parse_date
-from crossbot.slack.api import SLACK_URL
-from crossbot.views import slash_command
+import crossbot.slack
+from crossbot import metrics, render
+from crossbot.downsample import downsample, lttb
+from crossbot.mediastore import TMP_SECONDS, MediaStore, SweepStats
+from crossbot.plotcache import PLOT_CACHE, PlotCache, plot_key
+from crossbot.renderpool import RENDER_POOL, RenderError, RenderPool
+from crossbot.timeseries import series
+from crossbot.slack.commands import parse_date, plot, plot_wins
+from crossbot.slack.parser import ParserException
+from crossbot.slack import outbox
+from crossbot.slack.api import SLACK_URL, SlackClient
+from crossbot.management.commands import (bench_plot_scores, bench_render,
+                                          bench_startup, loadtest)
+from crossbot.views import slash_command, validate_slack_request
 from crossbot.models import (
     CBUser,
+    DataVersion,
+    IdentityCache,
     MiniCrosswordTime,
     CrosswordTime,
     EasySudokuTime,
     QueryShorthand,
     Item,
     ItemOwnershipRecord,
+    OutboxMessage,
+    ParticipationStreak,
+    PersonalBest,
+    TimeRollup,
+    ResultsSummary,
+    UserStats,
+    WinStreaks,
 )
-from crossbot.cron import ReleaseAnnouncement, MorningAnnouncement
+from crossbot.cron import (ReleaseAnnouncement, MorningAnnouncement,
+                           RollUserStats, RollupTimes, SweepMedia)
 from crossbot.settings import CROSSBUCKS_PER_SOLVE
 
+# the tests keep their cache in memory, so they don't see each other's (or a
+# dev server's) entries in the file based one, or leave files in cache/
+TEST_CACHES = override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+
+
+def setUpModule():
+    TEST_CACHES.enable()
+
+
+def tearDownModule():
+    TEST_CACHES.disable()
+
 
 class MockResponse:
-    def __init__(self, json_data, status_code):
+    def __init__(self, json_data, status_code, headers=None):
         self.json_data = json_data
         self.status_code = status_code
+        self.headers = headers or {}
 
     def json(self):
         return self.json_data
 
 
+def patch_metrics(test):
+    """Keep `test`'s metrics in a fresh registry in a temporary directory."""
+    tmp = tempfile.TemporaryDirectory()
+    test.addCleanup(tmp.cleanup)
+    registry = metrics.Registry(tmp.name)
+    patcher = patch('crossbot.metrics.REGISTRY', registry)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return registry
+
+
 class MockedRequestTestCase(TestCase):
     def setUp(self):
         super().setUp()
+        self.metrics = patch_metrics(self)
         self.router = {}
-        self._patcher_get = patch(
-            'requests.get', side_effect=self.mocked_requests_get)
-        self._patcher_post = patch(
-            'requests.post', side_effect=self.mocked_requests_post)
-        self._patcher_get.start()
-        self._patcher_post.start()
+        self._patcher_request = patch(
+            'requests.Session.request', side_effect=self.mocked_request)
+        self._patcher_request.start()
+        # don't make the tests wait on Slack's rate limits
+        self._patcher_client = patch('crossbot.slack.api.CLIENT',
+                                     SlackClient(rate_limited=False))
+        self._patcher_client.start()
 
     def tearDown(self):
         super().tearDown()
         self.router = {}
-        self._patcher_get.stop()
-        self._patcher_post.stop()
-
-    def mocked_requests_get(self, url, **kwargs):
-        return self.mocked_request('GET', url, **kwargs)
-
-    def mocked_requests_post(self, url, **kwargs):
-        return self.mocked_request('POST', url, **kwargs)
+        self._patcher_request.stop()
+        self._patcher_client.stop()
 
     def check_headers(self, method, url, headers):
         pass
 
-    def mocked_request(self, method, url, *, headers, params):
+    def mocked_request(self,
+                       method,
+                       url,
+                       *,
+                       headers=None,
+                       params=None,
+                       json=None,
+                       timeout=None):
         self.check_headers(method, url, headers)
         func = self.router.get(url)
         if func:
-            return func(method, url, headers, params)
+            return func(method, url, headers, params or json)
         else:
-            MockResponse(None, 404)
+            return MockResponse(None, 404)
+
+
+class InlinePool:
+    """Stands in for the deferred thread pool, running jobs right away."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
 
 
 class SlackTestCase(MockedRequestTestCase):
@@ -82,15 +168,36 @@ class SlackTestCase(MockedRequestTestCase):
 
         self.router[SLACK_URL + 'chat.postMessage'] = self.slack_chat_post
         self.router[SLACK_URL + 'reactions.add'] = self.slack_reaction_add
+        self.router[self.response_url] = self.slack_delayed_response
 
         self.slack_timestamp = 0
         self.messages = []
+        self.delayed_responses = []
+
+        # plots go in a directory of their own, so the tests never hit the
+        # cache of an earlier run, or sweep away real plots
+        self.media_root = tempfile.mkdtemp()
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
 
         self.slack_sk = b'8f742231b10e8888abcd99yyyzzz85a5'
 
         self.patch('settings.SLACK_SECRET_SIGNING_KEY', self.slack_sk)
         self.patch('settings.SLACK_OAUTH_ACCESS_TOKEN', 'oauth_token')
 
+        # run deferred commands synchronously so their responses are checkable
+        patcher = patch.object(crossbot.slack._HANDLER.deferred, 'pool',
+                               InlinePool())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.media.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    response_url = 'https://hooks.slack.com/commands/foobar'
+
     def patch(self, *args, **kwargs):
         patcher = patch(*args, **kwargs)
         patcher.start()
@@ -104,6 +211,11 @@ class SlackTestCase(MockedRequestTestCase):
     def slack_reaction_add(self, method, url, headers, params):
         return MockResponse({'ok': True}, 200)
 
+    def slack_delayed_response(self, method, url, headers, params):
+        self.assertEquals(method, 'POST')
+        self.delayed_responses.append(params)
+        return MockResponse(None, 200)
+
     def slack_chat_post(self, method, url, headers, params):
         self.assertEquals(method, 'POST')
         self.messages.append(params)
@@ -125,11 +237,12 @@ class SlackTestCase(MockedRequestTestCase):
                    text,
                    who='alice',
                    expected_status_code=200,
-                   expected_response_type='ephemeral'):
+                   expected_response_type='ephemeral',
+                   deliver=True):
         response = self.post_valid_request({
             'type': 'event_callback',
             'text': text,
-            'response_url': 'foobar',
+            'response_url': self.response_url,
             'trigger_id': 'foobar',
             'channel_id': 'foobar',
             'user_id': 'U' + who.upper(),
@@ -141,8 +254,264 @@ class SlackTestCase(MockedRequestTestCase):
         body = json.loads(response.content)
         self.assertEqual(body['response_type'], expected_response_type)
 
+        # the test transaction never commits, so do the drainer's job here
+        if deliver:
+            outbox.drain()
+
         return body
 
+    def slack_post_deferred(self, text, who='alice'):
+        """Post a slow command, returning the response sent to response_url."""
+        num_responses = len(self.delayed_responses)
+        ack = self.slack_post(text, who=who)
+        self.assertIn('Working on it', ack['text'])
+        self.assertEqual(len(self.delayed_responses), num_responses + 1)
+        return self.delayed_responses[-1]
+
+
+class StubSlackHandler(BaseHTTPRequestHandler):
+    """A tiny stand-in for slack.com, see StubSlackServer."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.calls.append((url.path, params))
+        status, headers, body = self.server.route(url.path, params)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        for header, value in headers.items():
+            self.send_header(header, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_POST = do_GET
+
+
+class StubSlackServer(ThreadingHTTPServer):
+    def __init__(self, route):
+        super().__init__(('127.0.0.1', 0), StubSlackHandler)
+        self.route = route
+        self.connections = 0
+        self.calls = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/api/'.format(self.server_port)
+
+
+class SlackClientTests(SimpleTestCase):
+    def setUp(self):
+        patch_metrics(self)
+
+    def start_server(self, route):
+        server = StubSlackServer(route)
+        thread = threading.Thread(
+            target=server.serve_forever, args=(0.05, ), daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_connection_reuse(self):
+        def route(path, params):
+            return 200, {}, {'ok': True, 'ts': '1'}
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url, rate_limited=False)
+        for _ in range(10):
+            client.call('chat.postMessage', 'POST', channel='C1', text='hi')
+        self.assertEqual(len(server.calls), 10)
+        self.assertEqual(server.connections, 1)
+
+        # compare with the bare requests calls we used to make
+        for _ in range(10):
+            requests.post(server.url + 'chat.postMessage')
+        self.assertEqual(server.connections, 11)
+
+    def test_retry_after(self):
+        responses = [
+            (429, {
+                'Retry-After': '3'
+            }, {
+                'ok': False,
+                'error': 'ratelimited'
+            }),
+            (200, {}, {
+                'ok': True
+            }),
+        ]
+
+        def route(path, params):
+            return responses.pop(0)
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url)
+        with patch('crossbot.slack.api.time.sleep') as sleep:
+            self.assertTrue(
+                client.call('reactions.add', 'POST', name='fire')['ok'])
+
+        self.assertEqual(len(server.calls), 2)
+        # we waited out (roughly) the Retry-After before calling again
+        self.assertAlmostEqual(sleep.call_args[0][0], 3, places=1)
+
+    def test_gives_up_when_throttled(self):
+        def route(path, params):
+            return 429, {'Retry-After': '1'}, {'ok': False}
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url, max_retries=2)
+        with patch('crossbot.slack.api.time.sleep'):
+            with self.assertRaises(ValueError):
+                client.call('chat.postMessage', 'POST', channel='C1')
+        self.assertEqual(len(server.calls), 3)
+
+    def test_error_without_reason(self):
+        def route(path, params):
+            return 200, {}, {'ok': False}
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url, rate_limited=False)
+        with self.assertRaisesRegex(ValueError, 'unknown_error'):
+            client.call('chat.postMessage', 'POST', channel='C1')
+
+    def test_post_not_retried_once_sent(self):
+        def route(path, params):
+            return 500, {}, {'ok': False}
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url, rate_limited=False)
+        with patch('crossbot.slack.api.time.sleep'):
+            with self.assertRaises(ValueError):
+                client.call('chat.postMessage', 'POST', channel='C1')
+            self.assertEqual(len(server.calls), 1)
+
+            # reads are safe to repeat
+            with self.assertRaises(ValueError):
+                client.call('users.list', 'GET')
+            self.assertEqual(len(server.calls), 1 + 4)
+
+    def test_post_not_retried_after_timeout(self):
+        def route(path, params):
+            # not time.sleep, which is patched
+            threading.Event().wait(0.2)
+            return 200, {}, {'ok': True}
+
+        server = self.start_server(route)
+        client = SlackClient(
+            base_url=server.url, timeout=0.05, rate_limited=False)
+        with patch('crossbot.slack.api.time.sleep'):
+            with self.assertRaises(requests.Timeout):
+                client.call('chat.postMessage', 'POST', channel='C1')
+        self.assertEqual(len(server.calls), 1)
+
+    def test_post_retried_if_never_sent(self):
+        # a port that nothing is listening on
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            url = 'http://127.0.0.1:{}/api/'.format(sock.getsockname()[1])
+
+        client = SlackClient(base_url=url, max_retries=2, rate_limited=False)
+        with patch('crossbot.slack.api.time.sleep') as sleep:
+            with self.assertRaises(requests.ConnectionError):
+                client.call('chat.postMessage', 'POST', channel='C1')
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_rate_limit(self):
+        def route(path, params):
+            return 200, {}, {'ok': True}
+
+        server = self.start_server(route)
+        client = SlackClient(
+            base_url=server.url, rate_limits={'reactions.add': 60})
+        with patch('crossbot.slack.api.time.sleep') as sleep:
+            for _ in range(7):
+                client.call('reactions.add', 'POST')
+        # 60 a minute allows a burst of 6, then we have to wait up to a second
+        self.assertEqual(sleep.call_count, 1)
+        self.assertGreater(sleep.call_args[0][0], 0)
+        self.assertLessEqual(sleep.call_args[0][0], 1)
+
+    def test_pagination(self):
+        pages = {
+            None: (['alice', 'bob'], 'c1'),
+            'c1': (['carol'], 'c2'),
+            'c2': (['dave'], ''),
+        }
+
+        def route(path, params):
+            self.assertEqual(path, '/api/users.list')
+            members, cursor = pages[params.get('cursor')]
+            return 200, {}, {
+                'ok': True,
+                'members': members,
+                'response_metadata': {
+                    'next_cursor': cursor
+                },
+            }
+
+        server = self.start_server(route)
+        client = SlackClient(base_url=server.url, rate_limited=False)
+        users = client.paginate('users.list', 'GET', 'members')
+        self.assertEqual(users, ['alice', 'bob', 'carol', 'dave'])
+        self.assertEqual(server.connections, 1)
+
+
+class ParserTests(SimpleTestCase):
+    def setUp(self):
+        self.parser = crossbot.slack._HANDLER.parser
+
+    def test_fast_path_matches_argparse(self):
+        for text in [
+                'add :32',
+                'add fail 2018-08-01',
+                '-r add 1:02:03',
+                '--sudoku add :45 2018-08-01',
+                'times',
+                'times 2018-08-01',
+                'delete',
+                'missed',
+                'missed 4',
+                'announce 2018-08-01',
+        ]:
+            tokens = text.split()
+            fast = self.parser.parse_fast(tokens)
+            self.assertIsNotNone(fast, text)
+            self.assertEqual(fast, self.parser.parser.parse_args(tokens), text)
+
+    def test_fast_path_falls_back(self):
+        for text in [
+                '',
+                'help',
+                'add',
+                'add :3x',
+                'add :10 -1',
+                'add :10 2018-08-01 extra',
+                'add -h',
+                '-r -s times',
+                '--reg times',
+                'plot',
+                'sql select 1',
+                'missed --since 2018-08-01',
+        ]:
+            self.assertIsNone(self.parser.parse_fast(text.split()), text)
+
+        # the full parser still handles the fallbacks
+        command, args = self.parser.parse('add :10 -1')
+        self.assertEqual(args.time, 10)
+        self.assertEqual(args.date, parse_date('-1'))
+        with self.assertRaises(ParserException):
+            self.parser.parse('add :3x')
+
 
 class ModelTests(TestCase):
     def test_add_user(self):
@@ -218,6 +587,273 @@ class ModelTests(TestCase):
         streaks = MiniCrosswordTime.participation_streaks(alice)
         self.assertListEqual(streaks, [[t1], [t3, t4, t5, t6, t7, t8, t9, t0]])
 
+    def streak_table(self, user, time_model=MiniCrosswordTime):
+        return [(str(s.start), s.length) for s in ParticipationStreak.streaks(
+            user, time_model).order_by('start')]
+
+    def test_streak_table(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        for day in [1, 2, 3, 4, 6, 7, 8, 9, 10]:
+            alice.add_mini_crossword_time(10, parse_date('2018-01-%02d' % day))
+        self.assertEqual(
+            self.streak_table(alice), [('2018-01-01', 4), ('2018-01-06', 5)])
+
+        # the backfilled day joins the two streaks
+        alice.add_mini_crossword_time(10, parse_date('2018-01-05'))
+        self.assertEqual(self.streak_table(alice), [('2018-01-01', 10)])
+        streak = ParticipationStreak.containing(alice, MiniCrosswordTime,
+                                                parse_date('2018-01-05'))
+        self.assertEqual(streak.days_before(parse_date('2018-01-05')), 4)
+
+        # removing days shortens or splits streaks
+        alice.remove_mini_crossword_time(parse_date('2018-01-01'))
+        alice.remove_mini_crossword_time(parse_date('2018-01-04'))
+        alice.remove_mini_crossword_time(parse_date('2018-01-10'))
+        self.assertEqual(
+            self.streak_table(alice), [('2018-01-02', 2), ('2018-01-05', 5)])
+        self.assertEqual(
+            ParticipationStreak.current(alice, MiniCrosswordTime).length, 5)
+        self.assertEqual(
+            str(ParticipationStreak.longest(alice, MiniCrosswordTime).start),
+            '2018-01-05')
+
+        # other games and users are separate
+        alice.add_crossword_time(10, parse_date('2018-01-06'))
+        bob = CBUser.from_slackid('UBOB', 'bob')
+        bob.add_mini_crossword_time(10, parse_date('2018-01-04'))
+        self.assertEqual(
+            self.streak_table(alice), [('2018-01-02', 2), ('2018-01-05', 5)])
+        self.assertEqual(
+            self.streak_table(alice, CrosswordTime), [('2018-01-06', 1)])
+        self.assertEqual(self.streak_table(bob), [('2018-01-04', 1)])
+
+    def test_streak_table_matches_rebuild(self):
+        rng = random.Random(1)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(3)]
+        start = parse_date('2018-01-01')
+        for _ in range(300):
+            user = rng.choice(users)
+            date = start + timedelta(days=rng.randrange(40))
+            if rng.random() < 0.7:
+                user.add_mini_crossword_time(rng.randint(1, 100), date)
+            else:
+                user.remove_mini_crossword_time(date)
+
+        maintained = {u: self.streak_table(u) for u in users}
+        for user in users:
+            self.assertEqual(
+                maintained[user],
+                [(str(streak[0].date), len(streak))
+                 for streak in MiniCrosswordTime.participation_streaks(user)])
+
+        out = StringIO()
+        call_command('rebuild_tables', 'streaks', stdout=out)
+        self.assertIn('Rebuilt', out.getvalue())
+        self.assertEqual({u: self.streak_table(u) for u in users}, maintained)
+
+    def personal_bests(self, user, weekday=PersonalBest.ANY_DAY):
+        """The KEEP fastest, the rest are a reserve."""
+        ranked = PersonalBest.ranked(user, MiniCrosswordTime, weekday)
+        return [(str(pb.date), pb.seconds)
+                for pb in ranked[:PersonalBest.KEEP]]
+
+    def test_personal_best(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        # Mondays
+        alice.add_mini_crossword_time(30, parse_date('2018-01-01'))
+        alice.add_mini_crossword_time(20, parse_date('2018-01-08'))
+        alice.add_mini_crossword_time(-1, parse_date('2018-01-15'))
+        alice.add_mini_crossword_time(25, parse_date('2018-01-22'))
+        alice.add_mini_crossword_time(40, parse_date('2018-01-29'))
+        # a Saturday
+        alice.add_mini_crossword_time(10, parse_date('2018-01-06'))
+
+        # only the fastest few solves are kept
+        self.assertEqual(
+            self.personal_bests(alice),
+            [('2018-01-06', 10), ('2018-01-08', 20), ('2018-01-22', 25)])
+        self.assertEqual(
+            self.personal_bests(alice, 0), [('2018-01-08', 20),
+                                            ('2018-01-22', 25),
+                                            ('2018-01-01', 30)])
+        bests = PersonalBest.bests(alice, MiniCrosswordTime)
+        self.assertEqual(
+            {weekday: pb.seconds
+             for weekday, pb in bests.items()}, {
+                 PersonalBest.ANY_DAY: 10,
+                 0: 20,
+                 5: 10
+             })
+
+        self.assertTrue(
+            PersonalBest.is_new(alice, MiniCrosswordTime,
+                                parse_date('2018-01-06')))
+        self.assertTrue(
+            PersonalBest.is_new(alice, MiniCrosswordTime,
+                                parse_date('2018-01-08'), 0))
+        # the first solve of a day didn't beat anything
+        self.assertFalse(
+            PersonalBest.is_new(alice, MiniCrosswordTime,
+                                parse_date('2018-01-06'), 5))
+
+        # removing a best falls back to the next, and tops the list up
+        alice.remove_mini_crossword_time(parse_date('2018-01-08'))
+        self.assertEqual(
+            self.personal_bests(alice, 0), [('2018-01-22', 25),
+                                            ('2018-01-01', 30),
+                                            ('2018-01-29', 40)])
+        self.assertEqual(
+            self.personal_bests(alice),
+            [('2018-01-06', 10), ('2018-01-22', 25), ('2018-01-01', 30)])
+
+        alice.remove_mini_crossword_time(parse_date('2018-01-06'))
+        self.assertNotIn(5, PersonalBest.bests(alice, MiniCrosswordTime))
+
+    def test_personal_best_reserve(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        mondays = [
+            parse_date('2018-01-01') + timedelta(weeks=i) for i in range(8)
+        ]
+        for i, date in enumerate(mondays):
+            alice.add_mini_crossword_time(10 * (i + 1), date)
+
+        def remove(date):
+            """Whether removing the time on `date` looked through the times
+            for the next fastest."""
+            with CaptureQueriesContext(connection) as queries:
+                alice.remove_mini_crossword_time(date)
+            return any('crossbot_minicrosswordtime' in q['sql']
+                       and '"seconds" > 0' in q['sql']
+                       for q in queries.captured_queries)
+
+        def kept():
+            return [
+                pb.seconds
+                for pb in PersonalBest.ranked(alice, MiniCrosswordTime)
+            ]
+
+        # slower solves than the kept ones aren't added, in case some were
+        # removed, so this list is topped up with the reserve too
+        self.assertEqual(kept(), [10, 20, 30])
+        self.assertTrue(remove(mondays[0]))
+        self.assertEqual(kept(), [20, 30, 40, 50, 60, 70])
+
+        # and then the next removals are covered by the reserve
+        for date in mondays[1:4]:
+            self.assertFalse(remove(date))
+        self.assertEqual(kept(), [50, 60, 70])
+
+        self.assertTrue(remove(mondays[4]))
+        self.assertEqual(kept(), [60, 70, 80])
+
+    def test_personal_best_matches_rebuild(self):
+        rng = random.Random(2)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(3)]
+        start = parse_date('2018-01-01')
+        for _ in range(300):
+            user = rng.choice(users)
+            date = start + timedelta(days=rng.randrange(40))
+            if rng.random() < 0.7:
+                user.add_mini_crossword_time(rng.randint(-1, 60), date)
+            else:
+                user.remove_mini_crossword_time(date)
+
+        maintained = {(u, weekday): self.personal_bests(u, weekday)
+                      for u in users for weekday in range(8)}
+        for user in users:
+            solves = sorted((t.seconds, t.date)
+                            for t in user.minicrosswordtime_set.all()
+                            if t.seconds > 0)
+            self.assertEqual(maintained[user, PersonalBest.ANY_DAY],
+                             [(str(d), s) for s, d in solves[:3]])
+
+        out = StringIO()
+        call_command('rebuild_tables', 'personal_bests', stdout=out)
+        self.assertIn('Rebuilt', out.getvalue())
+        self.assertEqual({(u, weekday): self.personal_bests(u, weekday)
+                          for u in users for weekday in range(8)}, maintained)
+
+    def rollups(self, period):
+        return sorted((r.user_id, str(r.start), r.played, r.participation,
+                       r.solves, r.mean, r.median, r.min)
+                      for r in TimeRollup.objects.filter(period=period))
+
+    def test_time_rollups(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        # Monday the 1st to Sunday the 7th, and Monday the 8th
+        for day, seconds in [(1, 10), (2, 20), (3, -1), (7, 60), (8, 30)]:
+            alice.add_mini_crossword_time(seconds,
+                                          parse_date('2018-01-%02d' % day))
+        # not kept up to date until they're built
+        self.assertFalse(TimeRollup.built(MiniCrosswordTime))
+        self.assertEqual(TimeRollup.rebuild(MiniCrosswordTime), 3)
+
+        self.assertEqual(
+            self.rollups(TimeRollup.WEEK),
+            [('UALICE', '2018-01-01', 4, 4 / 7, 3, 30, 20, 10),
+             ('UALICE', '2018-01-08', 1, 1 / 7, 1, 30, 30, 30)])
+        self.assertEqual(
+            self.rollups(TimeRollup.MONTH),
+            [('UALICE', '2018-01-01', 5, 5 / 31, 4, 30, 25, 10)])
+
+        alice.remove_mini_crossword_time(parse_date('2018-01-08'))
+        alice.add_mini_crossword_time(-1, parse_date('2018-02-28'))
+        self.assertEqual(
+            self.rollups(TimeRollup.MONTH),
+            [('UALICE', '2018-01-01', 4, 4 / 31, 3, 30, 20, 10),
+             ('UALICE', '2018-02-01', 1, 1 / 28, 0, None, None, None)])
+
+    def test_time_rollups_match_rebuild(self):
+        rng = random.Random(3)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(3)]
+        start = parse_date('2018-01-01')
+        users[0].add_mini_crossword_time(10, start)
+        TimeRollup.rebuild(MiniCrosswordTime)
+        for _ in range(300):
+            user = rng.choice(users)
+            date = start + timedelta(days=rng.randrange(100))
+            if rng.random() < 0.7:
+                user.add_mini_crossword_time(rng.randint(-1, 60), date)
+            else:
+                user.remove_mini_crossword_time(date)
+
+        maintained = [self.rollups(period) for period in TimeRollup.PERIODS]
+        out = StringIO()
+        call_command('rebuild_tables', 'time_rollups', stdout=out)
+        self.assertIn('Rebuilt', out.getvalue())
+        rebuilt = [self.rollups(period) for period in TimeRollup.PERIODS]
+        # numpy's floats are a little different
+        for a, b in zip(maintained, rebuilt):
+            self.assertEqual(len(a), len(b))
+            for x, y in zip(a, b):
+                self.assertEqual(x[:5], y[:5])
+                for mx, my in zip(x[5:], y[5:]):
+                    self.assertAlmostEqual(mx, my)
+
+    def test_streak_gaps(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        for day in [2, 3, 6, 9, 10]:
+            alice.add_mini_crossword_time(10, parse_date('2018-01-%02d' % day))
+
+        def gaps(start, end):
+            return [(str(first), str(last))
+                    for first, last in ParticipationStreak.gaps(
+                        alice, MiniCrosswordTime, parse_date(start),
+                        parse_date(end))]
+
+        self.assertEqual(
+            gaps('2018-01-01', '2018-01-12'), [('2018-01-11', '2018-01-12'),
+                                               ('2018-01-07', '2018-01-08'),
+                                               ('2018-01-04', '2018-01-05'),
+                                               ('2018-01-01', '2018-01-01')])
+        # ranges can start and end inside streaks
+        self.assertEqual(
+            gaps('2018-01-03', '2018-01-09'), [('2018-01-07', '2018-01-08'),
+                                               ('2018-01-04', '2018-01-05')])
+        self.assertEqual(gaps('2018-01-09', '2018-01-10'), [])
+        self.assertEqual(
+            gaps('2018-02-01', '2018-02-03'), [('2018-02-01', '2018-02-03')])
+
     def test_crossbucks_add_remove(self):
         # Checks that removing a time actually removes crossbucks
         alice = CBUser.from_slackid('UALICE', 'alice')
@@ -290,6 +926,214 @@ class ModelTests(TestCase):
         }, MiniCrosswordTime.current_win_streaks(d[3]))
         self.assertEqual({}, MiniCrosswordTime.current_win_streaks(d[5]))
 
+        # both streaks at once, from one query
+        with self.assertNumQueries(1):
+            stats = MiniCrosswordTime.win_streak_stats(d[4])
+        self.assertEqual(
+            stats, {
+                alice.pk: WinStreaks(d[4], 1, d[1], 2),
+                bob.pk: WinStreaks(None, 0, d[2], 2),
+            })
+        self.assertEqual(
+            MiniCrosswordTime.win_streak_stats(d[2])[bob.pk],
+            WinStreaks(d[2], 1, d[2], 1))
+
+        # cron jobs pass datetimes
+        self.assertEqual({
+            bob: [b2, b3]
+        }, MiniCrosswordTime.current_win_streaks(datetime(2018, 1, 3, 19, 30)))
+
+    def test_announcement_cache(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        bob = CBUser.from_slackid('UBOB', 'bob')
+        d1, d2 = parse_date('2018-01-01'), parse_date('2018-01-02')
+
+        alice.add_mini_crossword_time(10, d1)
+        alice.add_mini_crossword_time(10, d2)
+        bob.add_mini_crossword_time(12, d2)
+
+        data = MiniCrosswordTime.announcement_data(d2)
+        self.assertEqual(data['streaks'], [('alice', 2)])
+        self.assertEqual(data['winners_today'], [])
+
+        # only the data version is looked up the second time
+        with self.assertNumQueries(1):
+            self.assertEqual(data, MiniCrosswordTime.announcement_data(d2))
+
+        # new times bump the version, so the snapshot is recomputed
+        version = DataVersion.get('mini_crossword')
+        bob.remove_mini_crossword_time(d2)
+        bob.add_mini_crossword_time(9, d2)
+        self.assertNotEqual(version, DataVersion.get('mini_crossword'))
+        data = MiniCrosswordTime.announcement_data(d2)
+        self.assertEqual(data['streaks'], [])
+        self.assertEqual(data['winners_today'], ['bob'])
+        self.assertIn('bob won.', MiniCrosswordTime.announcement_message(d2))
+
+        # other games have their own version
+        self.assertNotEqual(
+            DataVersion.get('crossword'), DataVersion.get('mini_crossword'))
+
+    def test_win_streaks_match_loop(self):
+        rng = random.Random(3)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(4)]
+        start = parse_date('2018-01-01')
+        days = [start + timedelta(days=i) for i in range(60)]
+        for day in days:
+            for user in users:
+                if rng.random() < 0.8:
+                    user.add_mini_crossword_time(rng.randint(5, 8), day)
+
+        for day in days:
+            expected = {}
+            qs = MiniCrosswordTime.objects.filter(date__lte=day)
+            for user in users:
+                streaks = MiniCrosswordTime.win_streaks(user, qs)
+                if streaks and streaks[-1][-1].date == day:
+                    expected[user] = streaks[-1]
+            self.assertEqual(
+                MiniCrosswordTime.current_win_streaks(day), expected)
+
+    def test_results_summary(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        bob = CBUser.from_slackid('UBOB', 'bob')
+        carol = CBUser.from_slackid('UCAROL', 'carol')
+        date = parse_date('2018-01-01')
+
+        alice.add_mini_crossword_time(20, date)
+        bob.add_mini_crossword_time(10, date)
+        carol.add_mini_crossword_time(-1, date)
+
+        summary = ResultsSummary.for_date(MiniCrosswordTime, date)
+        self.assertEqual(summary.winning_time, 10)
+        self.assertEqual(list(summary.winners.all()), [bob])
+        self.assertEqual(summary.solvers, 2)
+        self.assertEqual(summary.fails, 1)
+        self.assertEqual(summary.median, 15)
+
+        # bob's removal makes alice the winner
+        bob.remove_mini_crossword_time(date)
+        summary = ResultsSummary.for_date(MiniCrosswordTime, date)
+        self.assertEqual(summary.winning_time, 20)
+        self.assertEqual(list(summary.winners.all()), [alice])
+        self.assertEqual([t.user for t in MiniCrosswordTime.winners(date)],
+                         [alice])
+
+        # nobody solving means no winners
+        alice.remove_mini_crossword_time(date)
+        summary = ResultsSummary.for_date(MiniCrosswordTime, date)
+        self.assertIsNone(summary.winning_time)
+        self.assertEqual(summary.fails, 1)
+        self.assertEqual(MiniCrosswordTime.winners(date), [])
+
+        # and no times means no summary
+        carol.remove_mini_crossword_time(date)
+        self.assertIsNone(ResultsSummary.for_date(MiniCrosswordTime, date))
+        self.assertIsNone(ResultsSummary.for_date(CrosswordTime, date))
+
+    def test_results_summary_matches_rebuild(self):
+        rng = random.Random(2)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(4)]
+        start = parse_date('2018-01-01')
+        for _ in range(200):
+            user = rng.choice(users)
+            date = start + timedelta(days=rng.randrange(10))
+            if rng.random() < 0.7:
+                user.add_mini_crossword_time(rng.choice([-1, 5, 6, 7]), date)
+            else:
+                user.remove_mini_crossword_time(date)
+
+        def summaries():
+            return [(str(s.date), s.winning_time, s.solvers, s.fails, s.median,
+                     sorted(u.slackid for u in s.winners.all()))
+                    for s in ResultsSummary.objects.order_by('date')]
+
+        maintained = summaries()
+        call_command('rebuild_tables', 'results', stdout=StringIO())
+        self.assertEqual(summaries(), maintained)
+
+        out = StringIO()
+        call_command('rebuild_tables', 'results', 'streaks', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_tables', 'winners', stdout=StringIO())
+
+    def test_user_stats(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        bob = CBUser.from_slackid('UBOB', 'bob')
+        as_of = parse_date('2018-01-31')
+        alice.add_mini_crossword_time(20, parse_date('2017-12-01'))
+        # without any stats yet, there's nothing to keep up to date
+        self.assertIsNone(UserStats.as_of_date(MiniCrosswordTime))
+        UserStats.rebuild(MiniCrosswordTime, as_of)
+
+        alice.add_mini_crossword_time(10, parse_date('2018-01-30'))
+        alice.add_mini_crossword_time(-1, parse_date('2018-01-31'))
+        bob.add_mini_crossword_time(30, parse_date('2018-01-31'))
+
+        def stats(user, window):
+            return UserStats.objects.get(
+                user=user, game='mini_crossword', window=window)
+
+        # adding times only queues the users, for the cron job
+        self.assertEqual(
+            RollUserStats.users(MiniCrosswordTime), ['UALICE', 'UBOB'])
+        self.assertEqual(stats(alice, 7).played, 0)
+        self.assertEqual(stats(bob, UserStats.ALL_TIME).played, 0)
+        self.assertIsNone(bob.stats(MiniCrosswordTime, 7))
+
+        def recompute():
+            UserStats.rebuild(MiniCrosswordTime, as_of,
+                              RollUserStats.users(MiniCrosswordTime))
+
+        recompute()
+        self.assertEqual(RollUserStats.users(MiniCrosswordTime), [])
+        week = stats(alice, 7)
+        self.assertEqual((week.played, week.solves, week.wins), (2, 1, 1))
+        self.assertEqual(week.mean, 10)
+        self.assertEqual(alice.stats(MiniCrosswordTime, 7), week)
+        ever = alice.stats(MiniCrosswordTime, UserStats.ALL_TIME)
+        self.assertEqual((ever.p25, ever.median, ever.p75, ever.stdev),
+                         (12.5, 15, 17.5, 5))
+        self.assertEqual(stats(bob, 30).wins, 1)
+
+        # alice taking the day from bob updates bob too
+        alice.remove_mini_crossword_time(parse_date('2018-01-31'))
+        alice.add_mini_crossword_time(25, parse_date('2018-01-31'))
+        recompute()
+        self.assertEqual(stats(alice, 7).wins, 2)
+        self.assertEqual(stats(bob, 7).wins, 0)
+
+        # the windows move with the date
+        UserStats.rebuild(MiniCrosswordTime, parse_date('2018-03-01'))
+        self.assertEqual(stats(alice, 30).played, 1)
+        self.assertEqual(stats(alice, 365).played, 3)
+
+    def test_user_stats_match_rebuild(self):
+        rng = random.Random(4)
+        users = [CBUser.from_slackid('U%s' % i, str(i)) for i in range(4)]
+        start = parse_date('2018-01-01')
+        as_of = start + timedelta(days=40)
+        users[0].add_mini_crossword_time(10, start)
+        UserStats.rebuild(MiniCrosswordTime, as_of)
+        for _ in range(200):
+            user = rng.choice(users)
+            date = start + timedelta(days=rng.randrange(45))
+            if rng.random() < 0.7:
+                user.add_mini_crossword_time(rng.choice([-1, 5, 6, 7]), date)
+            else:
+                user.remove_mini_crossword_time(date)
+
+        def stats():
+            return sorted((s.user_id, s.window, s.played, s.solves, s.wins,
+                           s.mean, s.median) for s in UserStats.objects.all())
+
+        UserStats.rebuild(MiniCrosswordTime, as_of,
+                          RollUserStats.users(MiniCrosswordTime))
+        maintained = stats()
+        UserStats.rebuild(MiniCrosswordTime, as_of)
+        self.assertEqual(stats(), maintained)
+
     def test_items(self):
         # Just add one item
         alice = CBUser.from_slackid('UALICE', 'alice')
@@ -320,6 +1164,163 @@ class ModelTests(TestCase):
         path = finders.find(url)
         self.assertTrue(os.path.isfile(path))
 
+    def test_items_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            items_json = os.path.join(tmp, 'items.json')
+            with patch('crossbot.models.ITEMS_JSON', items_json):
+                # a missing cache gets compiled from the yaml
+                Item.load_items()
+                with open(items_json) as f:
+                    self.assertIn('tophat', json.load(f)['items'])
+
+                # an up to date cache is used as is
+                with patch('crossbot.models.compile_items') as compile_items:
+                    Item.load_items()
+                compile_items.assert_not_called()
+
+                # a stale cache is recompiled
+                with open(items_json, 'w') as f:
+                    json.dump({'sha1': 'stale', 'items': {}}, f)
+                Item.load_items()
+                with open(items_json) as f:
+                    self.assertIn('tophat', json.load(f)['items'])
+
+        self.assertEqual(Item.from_key('tophat').name, 'Tophat')
+
+
+class IdentityCacheTests(TransactionTestCase):
+    # the cache only holds committed rows, so these tests need real commits
+
+    def setUp(self):
+        CBUser.identity_cache.clear()
+        self.addCleanup(CBUser.identity_cache.clear)
+
+    def test_no_writes_when_unchanged(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        alice.add_mini_crossword_time(10, parse_date('2018-08-01'))
+        # creating alice invalidated the cache, this lookup fills it
+        CBUser.from_slackid('UALICE', 'alice')
+
+        with self.assertNumQueries(0):
+            user = CBUser.from_slackid('UALICE', 'alice')
+        self.assertEqual(user, alice)
+        self.assertEqual(user.slackname, 'alice')
+        with self.assertNumQueries(0):
+            self.assertEqual(CBUser.name_from_slackid('UALICE'), 'alice')
+
+        # a new name is written through, and cached again after
+        with self.assertNumQueries(1):
+            CBUser.from_slackid('UALICE', 'bob')
+        self.assertEqual(CBUser.objects.get(slackid='UALICE').slackname, 'bob')
+        CBUser.from_slackid('UALICE', 'bob')
+        with self.assertNumQueries(0):
+            self.assertEqual(CBUser.from_slackid('UALICE').slackname, 'bob')
+
+    def test_other_workers_changes(self):
+        CBUser.from_slackid('UALICE', 'alice')
+        CBUser.from_slackid('UALICE', 'alice')
+
+        # pretend another worker renamed alice
+        CBUser.objects.filter(slackid='UALICE').update(slack_fullname='Al')
+        cache.set(IdentityCache.GENERATION_KEY, 'another worker', None)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(CBUser.name_from_slackid('UALICE'), 'Al')
+
+    def test_rollback_is_not_cached(self):
+        try:
+            with transaction.atomic():
+                CBUser.from_slackid('UALICE', 'alice')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertIsNone(CBUser.from_slackid('UALICE', create=False))
+
+
+class TimeSeriesTests(TransactionTestCase):
+    # like the identity cache, only committed rows are kept
+
+    def setUp(self):
+        self.series = series(MiniCrosswordTime)
+        self.series.clear()
+        self.addCleanup(self.series.clear)
+        self.alice = CBUser.from_slackid('UALICE', 'alice')
+        self.bob = CBUser.from_slackid('UBOB', 'bob')
+        self.d = [parse_date('2018-01-0' + str(x)) for x in range(1, 6)]
+
+    def assertColumns(self, expected):
+        columns = self.series.refresh()
+        self.assertEqual(
+            sorted(
+                zip([columns.users[i] for i in columns.user_index.tolist()],
+                    columns.dates.tolist(), columns.seconds.tolist())),
+            sorted(
+                (t.user_id, t.date.toordinal(), t.seconds) for t in expected))
+
+    def test_incremental_refresh(self):
+        _, a1 = self.alice.add_mini_crossword_time(10, self.d[0])
+        _, b1 = self.bob.add_mini_crossword_time(12, self.d[0])
+        self.assertColumns([a1, b1])
+
+        # nothing changed, so only the version is checked
+        with self.assertNumQueries(1):
+            self.series.refresh()
+
+        # new rows and the count
+        _, a2 = self.alice.add_mini_crossword_time(-1, self.d[1])
+        with self.assertNumQueries(3):
+            self.assertColumns([a1, b1, a2])
+
+        # deletes are found from the count
+        self.bob.remove_mini_crossword_time(self.d[0])
+        _, b3 = self.bob.add_mini_crossword_time(30, self.d[2])
+        self.assertColumns([a1, a2, b3])
+        self.assertEqual(self.series.dates(self.alice), {self.d[0], self.d[1]})
+        self.assertEqual(
+            self.series.between(self.d[1], self.d[4]).ids.tolist(),
+            sorted([a2.pk, b3.pk]))
+
+    def test_rollback_is_not_kept(self):
+        _, a1 = self.alice.add_mini_crossword_time(10, self.d[0])
+        self.assertColumns([a1])
+
+        try:
+            with transaction.atomic():
+                _, b1 = self.bob.add_mini_crossword_time(12, self.d[0])
+                self.assertColumns([a1, b1])
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertColumns([a1])
+
+    def test_times_rest_api(self):
+        self.alice.add_mini_crossword_time(10, self.d[1])
+        self.bob.add_mini_crossword_time(-1, self.d[0])
+        user = User.objects.create_user('viewer', password='password')
+        self.client.force_login(user)
+
+        response = self.client.get('/rest-api/times/')
+        self.assertEqual(
+            response.json(), {
+                'times': [{
+                    'user': 'bob',
+                    'date': '2018-01-01',
+                    'seconds': -1
+                }, {
+                    'user': 'alice',
+                    'date': '2018-01-02',
+                    'seconds': 10
+                }],
+                'timemodel':
+                'minicrossword',
+                'start':
+                '2018-01-01',
+                'end':
+                '2018-01-02',
+            })
+
 
 class SlackAuthTests(SlackTestCase):
     def test_bad_signature(self):
@@ -369,6 +1370,113 @@ class SlackAppTests(SlackTestCase):
         self.assertIn('alice', lines[1])
         self.assertIn(':fire:', lines[1])
 
+    def test_leaderboard(self):
+        cache.delete(RollUserStats.ROLLED_KEY)
+        self.addCleanup(cache.delete, RollUserStats.ROLLED_KEY)
+        response = self.slack_post('leaderboard')
+        self.assertIn('Nobody has played yet.', response['text'])
+
+        today = parse_date('now')
+        self.slack_post('add :15 {}'.format(today), who='alice')
+        self.slack_post('add :40 {}'.format(today), who='bob')
+        self.slack_post('add :10 2018-08-01', who='bob')
+
+        # the cron job hasn't computed the stats yet, and the view won't
+        response = self.slack_post('leaderboard')
+        self.assertIn('being updated', response['text'])
+        self.assertFalse(UserStats.objects.exists())
+
+        RollUserStats().do()
+        lines = self.slack_post('leaderboard')['text'].split('\n')
+        self.assertEqual(
+            lines[0], '*Mini crossword leaderboard, last 30 days, by wins*')
+        self.assertEqual(lines[1:], ['1. @alice - 1 win', '2. @bob - 0 wins'])
+
+        lines = self.slack_post('leaderboard mean -w all')['text'].split('\n')
+        self.assertEqual(lines[1:],
+                         ['1. @alice - 0:15 mean', '2. @bob - 0:25 mean'])
+
+        lines = self.slack_post('leaderboard played -n 1')['text'].split('\n')
+        self.assertEqual(lines[1:], ['1. @alice - 1/30 days'])
+        for num in ['0', '-1', 'lots']:
+            response = self.slack_post('leaderboard -n ' + num)
+            self.assertIn('Parse Error', response['text'])
+
+        # new results show up once the cron job gets to them
+        self.slack_post('add :05 {}'.format(today), who='carol')
+        lines = self.slack_post('leaderboard')['text'].split('\n')
+        self.assertEqual(lines[1:], ['1. @alice - 1 win', '2. @bob - 0 wins'])
+        RollUserStats().do()
+        lines = self.slack_post('leaderboard')['text'].split('\n')
+        self.assertEqual(
+            lines[1:],
+            ['1. @carol - 1 win', '2. @alice - 0 wins', '3. @bob - 0 wins'])
+
+        # yesterday's stats are shown until the cron job rolls them
+        with patch(
+                'crossbot.slack.commands.leaderboard.parse_date',
+                return_value=today + timedelta(days=1)):
+            lines = self.slack_post('leaderboard')['text'].split('\n')
+        self.assertEqual(lines[1:], [
+            '1. @carol - 1 win', '2. @alice - 0 wins', '3. @bob - 0 wins',
+            "_As of {}, today's results are being added._".format(today)
+        ])
+
+    def test_personal_best(self):
+        response = self.slack_post('pb')
+        self.assertIn('No solves yet.', response['text'])
+
+        self.slack_post('add :30 2018-08-04')
+        response = self.slack_post('add :20 2018-08-11')
+        self.assertIn('New personal best!', response['text'])
+        response = self.slack_post('add :25 2018-08-05')
+        self.assertNotIn('New personal best', response['text'])
+        response = self.slack_post('add :22 2018-08-12')
+        self.assertIn('New personal best for a Sunday!', response['text'])
+
+        lines = self.slack_post('pb')['text'].split('\n')
+        self.assertEqual(lines, [
+            "*@alice's mini crossword personal bests*",
+            'Overall: 0:20 on Sat, Aug 11, 2018',
+            'Saturday: 0:20 on Sat, Aug 11, 2018',
+            'Sunday: 0:22 on Sun, Aug 12, 2018',
+        ])
+
+    def test_missed(self):
+        today = parse_date('now')
+        for days_ago in [0, 1, 3, 6]:
+            self.slack_post(
+                'add :15 {}'.format(today - timedelta(days=days_ago)))
+
+        def dates(text):
+            return [
+                parse_date(link.split('|')[1].rstrip('>'))
+                for link in text.split(', ')
+            ]
+
+        self.assertEqual(
+            dates(self.slack_post('missed')['text']),
+            [today - timedelta(days=2)])
+        self.assertEqual(
+            dates(self.slack_post('missed 3')['text']),
+            [today - timedelta(days=d) for d in [2, 4, 5]])
+
+        since = today - timedelta(days=8)
+        response = self.slack_post('missed --since {}'.format(since))
+        self.assertEqual(
+            dates(response['text']),
+            [today - timedelta(days=d) for d in [2, 4, 5, 7, 8]])
+        self.assertIn(
+            'mini/{:04}/{:02}/{:02}'.format(since.year, since.month,
+                                            since.day), response['text'])
+
+        response = self.slack_post('missed -c')
+        self.assertIn('You missed 3 days since', response['text'])
+        response = self.slack_post('missed -c -s {}'.format(since))
+        self.assertIn('You missed 5 days since', response['text'])
+        response = self.slack_post('missed -s {}'.format(today))
+        self.assertIn('You haven\'t missed any', response['text'])
+
     def test_help(self):
         response = self.slack_post(text='')
         self.assertIn('usage:', response['text'])
@@ -400,33 +1508,34 @@ class SlackAppTests(SlackTestCase):
     @unittest.skipUnless(os.path.isfile('crossbot.db'), 'No existing db found')
     def test_sql(self):
         # should be able to handle an empty query
-        response = self.slack_post(text='sql')
+        response = self.slack_post_deferred(text='sql')
         self.assertIn('Please type', response['text'])
-        response = self.slack_post(text='sql  ')
+        response = self.slack_post_deferred(text='sql  ')
         self.assertIn('Please type', response['text'])
 
         query_text = 'select count(*) from mini_crossword_time'
-        response = self.slack_post(text='sql ' + query_text)
+        response = self.slack_post_deferred(text='sql ' + query_text)
         self.assertIn(query_text, response['text'])
         # just check that we can turn the response into an int
         # because we are just making raw sqlite, the django testing thing
         # doesn't clear out the model
         int(response['text'].split('\n')[-1])
 
-        response = self.slack_post(
+        response = self.slack_post_deferred(
             text='sql select * from mini_crossword_time')
         self.assertNotIn('reported', response['text'])
 
     @unittest.skipUnless(os.path.isfile('crossbot.db'), 'No existing db found')
     def test_query(self):
         # make sure the command tells you how to do it if there are no saved queries
-        response = self.slack_post(text='query')
+        response = self.slack_post_deferred(text='query')
         self.assertIn('no saved', response['text'])
         self.assertIn('query --save', response['text'])
 
         # make sure we can save a new query
         query_text = 'select count(*) from mini_crossword_time'
-        response = self.slack_post('query --save num_minis ' + query_text)
+        response = self.slack_post_deferred('query --save num_minis ' +
+                                            query_text)
         self.assertIn('Saved new', response['text'])
 
         # make sure it's the right command
@@ -435,13 +1544,13 @@ class SlackAppTests(SlackTestCase):
         self.assertEqual(query.user_id, 'UALICE')
 
         # make sure the empty query tells you about queries
-        response = self.slack_post('query')
+        response = self.slack_post_deferred('query')
         self.assertIn('num_minis', response['text'])
 
         # make sure we can run it
         # again, we can only check that the result is an int because we aren't
         # going through the django testing thing
-        response = self.slack_post('query num_minis')
+        response = self.slack_post_deferred('query num_minis')
         int(response['text'].split('\n')[-1])
 
     def test_add_streak(self):
@@ -468,9 +1577,707 @@ class SlackAppTests(SlackTestCase):
         self.slack_post(text='add :10 2018-08-02')
         self.slack_post(text='add :10 2018-08-03')
         self.slack_post(text='add :10 2018-08-04')
-        response = self.slack_post(text='plot')
+        response = self.slack_post_deferred(text='plot')
+        self.assertIn(settings.MEDIA_URL,
+                      response['attachments'][0]['image_url'])
+
+        for ptype in ['--normalized', '--times', '--streaks', '--win-streaks']:
+            response = self.slack_post_deferred(
+                text='plot --start-date 2018-08-01 --end-date 2018-08-04 ' +
+                ptype)
+            self.assertIn(settings.MEDIA_URL,
+                          response['attachments'][0]['image_url'])
+
+    def test_long_plot(self):
+        for day in range(0, 400, 3):
+            date = parse_date('2018-01-01') + timedelta(days=day)
+            self.slack_post(text='add :{} {}'.format(10 + day % 50, date))
+        text = 'plot -n 400 --end-date 2019-02-01'
+
+        # downsampled, until there are rollups of the times
+        urls = set()
+        for ptype in ['--times', '--normalized', '--times']:
+            response = self.slack_post_deferred(text + ' ' + ptype)
+            urls.add(response['attachments'][0]['image_url'])
+            TimeRollup.rebuild(MiniCrosswordTime)
+        self.assertEqual(len(urls), 3)
+
+        # the last week or month is plotted whole, past the end date
+        self.slack_post(text='add :05 2019-02-02')
+        response = self.slack_post_deferred(text + ' --times')
+        self.assertNotIn(response['attachments'][0]['image_url'], urls)
+
+    def test_plot_cache(self):
+        self.slack_post(text='add :10 2018-08-01')
+        text = 'plot --times --start-date 2018-08-01 --end-date 2018-08-04'
+
+        hits = PLOT_CACHE.hits
+        url = self.slack_post_deferred(text)['attachments'][0]['image_url']
+        self.assertEqual(
+            self.slack_post_deferred(text)['attachments'][0]['image_url'], url)
+        self.assertEqual(PLOT_CACHE.hits, hits + 1)
+
+        # different arguments or data make a different plot
+        self.assertNotEqual(
+            self.slack_post_deferred(text +
+                                     ' --log')['attachments'][0]['image_url'],
+            url)
+        self.slack_post(text='add :20 2018-08-02', who='bob')
+        self.assertNotEqual(
+            self.slack_post_deferred(text)['attachments'][0]['image_url'], url)
+
+    def test_plot_wins(self):
+        for who, times in [('alice', [':10', ':20', ':15']),
+                           ('bob', [':20', ':10', ':15']),
+                           ('carol', [':30', ':30', 'fail'])]:
+            for day, time in enumerate(times, 1):
+                self.slack_post(
+                    'add {} 2018-08-0{}'.format(time, day), who=who)
+
+        response = self.slack_post_deferred(
+            'vs @bob --start-date 2018-08-01 --end-date 2018-08-04')
+        self.assertEqual(response['text'].split('\n'), [
+            '*Mini crossword head to head, 2018-08-01 to 2018-08-04*',
+            '@alice 1 - 1 @bob (1 tied)',
+        ])
+        self.assertIn(settings.MEDIA_URL,
+                      response['attachments'][0]['image_url'])
+
+        response = self.slack_post_deferred(
+            'plot-wins @alice @bob @carol --start-date 2018-08-01', who='bob')
+        self.assertIn('@bob 3 - 0 @carol', response['text'])
+
+        response = self.slack_post_deferred('vs @nobody', who='bob')
+        self.assertIn("I don't know who @nobody is", response['text'])
+
+    def test_deferred_stats(self):
+        deferred = crossbot.slack._HANDLER.deferred
+        before = deferred.stats()
+
+        # fast commands are answered inline
+        response = self.slack_post(text='times 2018-08-01')
+        self.assertIn('No times', response['text'])
+        self.assertEqual(deferred.stats()['submitted'], before['submitted'])
+
+        self.slack_post_deferred(text='plot')
+        after = deferred.stats()
+        self.assertEqual(after['submitted'], before['submitted'] + 1)
+        self.assertEqual(after['completed'], before['completed'] + 1)
+        self.assertEqual(after['queued'], 0)
+        self.assertEqual(after['running'], 0)
+        self.assertGreater(after['run_seconds_total'],
+                           before['run_seconds_total'])
+
+    def test_deferred_queue_full(self):
+        deferred = crossbot.slack._HANDLER.deferred
+        with patch.object(deferred, 'max_queue', 0):
+            response = self.slack_post(text='plot')
+        # with no room in the queue, the plot is made inline
         self.assertIn(settings.MEDIA_URL,
                       response['attachments'][0]['image_url'])
+        self.assertEqual(self.delayed_responses, [])
+
+
+class MetricsTests(SlackTestCase):
+    def get_metrics(self, **extra):
+        return self.client.get(reverse('metrics'), **extra)
+
+    def test_authentication(self):
+        with patch('crossbot.views.METRICS_TOKEN', None):
+            self.assertEqual(self.get_metrics().status_code, 403)
+            self.assertEqual(
+                self.get_metrics(HTTP_AUTHORIZATION='Bearer ').status_code,
+                403)
+
+        with patch('crossbot.views.METRICS_TOKEN', 'secret'):
+            self.assertEqual(
+                self.get_metrics(
+                    HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(
+                self.get_metrics(
+                    HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.get_metrics().status_code, 200)
+
+    def test_commands(self):
+        self.slack_post('add :10 2018-08-01')
+        self.slack_post('times 2018-08-01')
+        self.slack_post('bogus')
+
+        # pretend another worker ran add too
+        other = metrics.Registry(self.metrics.directory)
+        other.observe('crossbot_command_seconds', {'command': 'add'}, 100)
+        other.inc('crossbot_command_errors_total', {'command': 'add'})
+        with patch('os.getpid', return_value=os.getppid()):
+            other.flush(force=True)
+
+        with patch('crossbot.views.METRICS_TOKEN', 'secret'):
+            response = self.get_metrics(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = response.content.decode().splitlines()
+
+        self.assertIn('# TYPE crossbot_command_seconds histogram', lines)
+        self.assertIn('crossbot_command_seconds_count{command="add"} 2', lines)
+        self.assertIn('crossbot_command_seconds_count{command="times"} 1',
+                      lines)
+        self.assertIn(
+            'crossbot_command_seconds_bucket{command="add",le="30"} 1', lines)
+        self.assertIn(
+            'crossbot_command_seconds_bucket{command="add",le="+Inf"} 2',
+            lines)
+        self.assertIn('crossbot_command_errors_total{command="add"} 1', lines)
+        self.assertIn('crossbot_parse_errors_total 1', lines)
+        self.assertIn(
+            'crossbot_slack_seconds_count{endpoint="chat.postMessage"} 1',
+            lines)
+
+        queries = [
+            l for l in lines
+            if l.startswith('crossbot_command_db_queries_total{command="add"}')
+        ]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(int(queries[0].split()[-1]), 0)
+
+    def test_dead_workers(self):
+        def flush(pid, seconds):
+            registry = metrics.Registry(self.metrics.directory)
+            registry.observe('crossbot_command_seconds', {'command': 'add'},
+                             seconds)
+            with patch('os.getpid', return_value=pid):
+                registry.flush(force=True)
+                return registry.path()
+
+        dead = subprocess.Popen([sys.executable, '-c', ''])
+        dead.wait()
+        dead_path = flush(dead.pid, 1)
+        # an earlier worker that had the same pid as a running one
+        reused_path = flush(os.getppid(), 2)
+        os.utime(reused_path, (0, 0))
+        live_path = flush(os.getppid(), 3)
+
+        histogram = self.metrics.collect(
+        )['histograms']['crossbot_command_seconds']['{"command": "add"}']
+        self.assertEqual(histogram['count'], 1)
+        self.assertEqual(histogram['sum'], 3)
+        self.assertFalse(os.path.exists(dead_path))
+        self.assertFalse(os.path.exists(reused_path))
+        self.assertTrue(os.path.exists(live_path))
+
+    def test_slack_errors(self):
+        self.router[SLACK_URL + 'chat.postMessage'] = (
+            lambda *args: MockResponse({'ok': False, 'error': 'nope'}, 200))
+        self.slack_post('add :10 2018-08-01')
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters']['crossbot_slack_errors_total'],
+                         {'{"endpoint": "chat.postMessage"}': 1})
+
+
+class LoadTestTests(SlackTestCase):
+    def test_signature(self):
+        body = b'text=add+%3A32&user_id=UALICE'
+        ts = str(time.time())
+        request = self.factory.post(
+            reverse('slash_command'),
+            body,
+            content_type='application/x-www-form-urlencoded',
+            HTTP_X_SLACK_REQUEST_TIMESTAMP=ts,
+            HTTP_X_SLACK_SIGNATURE=loadtest.sign(body, ts))
+        self.assertTrue(validate_slack_request(request))
+
+    def test_mix(self):
+        self.assertEqual(
+            loadtest.parse_mix('add=3,times=1'), (['add', 'times'], [3, 1]))
+        with self.assertRaises(CommandError):
+            loadtest.parse_mix('add=lots')
+        with self.assertRaises(CommandError):
+            loadtest.parse_mix('add=1,dance=1')
+
+    def test_local_sender(self):
+        send = loadtest.Command().local_sender()
+        data = {
+            'type': 'event_callback',
+            'text': loadtest.make_text('add', random.Random(0)),
+            'response_url': self.response_url,
+            'trigger_id': 'loadtest',
+            'channel_id': 'CLOADTEST',
+            'user_id': 'ULOAD0',
+            'user_name': 'uload0',
+        }
+        self.assertEqual(send(None, data), 'ok')
+        self.assertEqual(
+            len(CBUser.from_slackid('ULOAD0').times(MiniCrosswordTime)), 1)
+
+        # a faster time than alice's, which the cleanup takes back
+        self.slack_post('add :30 2018-08-01', who='alice')
+        data.update(text='add :20 2018-08-01', user_id='ULOAD1')
+        self.assertEqual(send(None, data), 'ok')
+        self.assertEqual(
+            ResultsSummary.for_date(MiniCrosswordTime,
+                                    parse_date('2018-08-01')).solvers, 2)
+
+        self.assertEqual(loadtest.delete_load_rows(), 2)
+        self.assertFalse(
+            CBUser.objects.filter(slackid__startswith='ULOAD').exists())
+        summary = ResultsSummary.for_date(MiniCrosswordTime,
+                                          parse_date('2018-08-01'))
+        self.assertEqual(summary.solvers, 1)
+        self.assertEqual([u.slackid for u in summary.winners.all()],
+                         ['UALICE'])
+
+    def test_scratch_database(self):
+        self.assertTrue(loadtest.is_scratch_database({'NAME': ':memory:'}))
+        self.assertTrue(
+            loadtest.is_scratch_database({
+                'NAME': '/tmp/scratch.db'
+            }))
+        self.assertFalse(
+            loadtest.is_scratch_database({
+                'NAME': '/srv/crossbot.db'
+            }))
+        with patch.dict(connection.settings_dict, NAME='/srv/crossbot.db'):
+            with self.assertRaises(CommandError):
+                call_command('loadtest', stdout=StringIO())
+
+
+class PlotScoreTests(SimpleTestCase):
+    def test_scores_match_loops(self):
+        args = argparse.Namespace(smooth=0.7, table=MiniCrosswordTime)
+        entries = bench_plot_scores.make_entries(60, 8, fail_rate=0.2)
+        # a day where everyone failed
+        day = entries[0].date - timedelta(days=1)
+        entries[:0] = [
+            bench_plot_scores.Entry('user1', day, -1),
+            bench_plot_scores.Entry('user2', day, -1),
+        ]
+
+        for name, old, new in bench_plot_scores.SCORE_FUNCTIONS:
+            with self.subTest(name):
+                scores = new(plot.time_matrix(entries), args)[0]
+                self.assertTrue(
+                    bench_plot_scores.same_scores(
+                        old(entries, args), scores.as_dict()))
+                self.assertEqual(
+                    new(plot.time_matrix([]), args)[0].as_dict(), {})
+
+    def test_rows(self):
+        args = argparse.Namespace(smooth=0.7, table=MiniCrosswordTime)
+        d1, d2, d3 = (parse_date('2018-01-0' + str(x)) for x in range(1, 4))
+        entries = [
+            bench_plot_scores.Entry('alice', d1, 10),
+            bench_plot_scores.Entry('bob', d1, -1),
+            bench_plot_scores.Entry('alice', d3, 20),
+        ]
+        scores = plot.get_times(plot.time_matrix(entries), args)[0]
+        self.assertEqual(
+            list(scores.rows([d1, d2, d3])), [('alice', [10, None, 20])])
+
+    def test_resolution(self):
+        self.assertEqual(plot.resolution_for(200, 1000), plot.DAY)
+        self.assertEqual(plot.resolution_for(201, 1000), TimeRollup.WEEK)
+        self.assertEqual(plot.resolution_for(2000, 1000), TimeRollup.MONTH)
+
+    def test_draw_lines(self):
+        spec = bench_render.make_spec(30, 5)
+        lines = []
+
+        def draw(ax, spec, colors):
+            render.draw_lines(ax, spec, colors)
+            lines.extend(ax.lines)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            old, new = (os.path.join(tmp, name) for name in ('old', 'new'))
+            render.render(spec, old, bench_render.draw_segments)
+            render.render(spec, new, draw)
+            self.assertTrue(bench_render.same_picture(old, new))
+        # one line per player
+        self.assertEqual(len(lines), 5)
+
+    def test_win_matrix(self):
+        nan = float('nan')
+        times = np.array([
+            [10, 20, -1, 30, -1],
+            [20, 20, 15, nan, -1],
+            [30, 10, 15, 20, nan],
+        ])
+        race, pairwise, ties = plot_wins.win_matrix(times)
+        # only the first three days did everyone play
+        self.assertEqual(race[:, -1].tolist(), [1, 1, 2])
+        self.assertEqual(race[2].tolist(), [0, 1, 2, 2, 2])
+        self.assertEqual(pairwise[:, :, -1].tolist(),
+                         [[0, 1, 1], [1, 0, 1], [3, 1, 0]])
+        self.assertEqual(pairwise[0, 2].tolist(), [1, 1, 1, 1, 1])
+        self.assertEqual(ties.tolist(), [[5, 2, 0], [2, 4, 1], [0, 1, 4]])
+
+
+def fake_plot(size):
+    def write(path):
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+
+    return write
+
+
+class DownsampleTests(SimpleTestCase):
+    def test_lttb(self):
+        x = np.arange(100.0)
+        y = np.zeros(100)
+        y[37] = 10
+        indexes = lttb(x, y, 10)
+        self.assertEqual(len(indexes), 10)
+        self.assertEqual((indexes[0], indexes[-1]), (0, 99))
+        self.assertIn(37, indexes)
+        self.assertTrue((np.diff(indexes) > 0).all())
+
+        # too few to bother
+        self.assertEqual(lttb(x[:5], y[:5], 10).tolist(), [0, 1, 2, 3, 4])
+
+    def test_downsample(self):
+        x = np.arange(200)
+        y = np.sin(x / 10)
+        # missing a day, which won't show, and then a month, which will
+        y[50] = np.nan
+        y[100:130] = np.nan
+        dx, dy = downsample(x, y, 20, 7)
+
+        gaps = np.flatnonzero(np.isnan(dy))
+        self.assertEqual(len(gaps), 1)
+        self.assertEqual(dx[gaps[0]], 99)
+        self.assertLessEqual(abs(len(dx) - 21), 2)
+        self.assertEqual((dx[0], dx[-1]), (0, 199))
+
+        self.assertEqual(
+            downsample(x, np.full(200, np.nan), 20, 7)[0].tolist(), [])
+
+
+class PlotCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.metrics = patch_metrics(self)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = PlotCache(tmp.name, max_bytes=250)
+
+    def test_key(self):
+        a = np.array([1, 2, 3])
+        self.assertEqual(
+            plot_key('plot', parse_date('2018-08-01'), a),
+            plot_key('plot', parse_date('2018-08-01'), a.copy()))
+        self.assertNotEqual(plot_key('plot', a), plot_key('plot', a[:2]))
+        self.assertNotEqual(
+            plot_key('plot', a), plot_key('plot', a.astype(float)))
+
+    def test_hits_and_misses(self):
+        self.assertIsNone(self.cache.get('a'))
+        fname = self.cache.save('a', fake_plot(100))
+        self.assertEqual(self.cache.get('a'), fname)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(
+            self.metrics.snapshot()['counters']['crossbot_plot_cache_total'], {
+                '{"result": "hit"}': 1,
+                '{"result": "miss"}': 1
+            })
+        self.assertEqual(os.listdir(self.cache.directory), [fname])
+
+    def test_lru_eviction(self):
+        for key in 'abc':
+            self.cache.save(key, fake_plot(100))
+            # make sure the times are different
+            time.sleep(0.01)
+        # `a` was evicted to fit `c`
+        self.assertIsNone(self.cache.get('a'))
+
+        # using `b` makes `c` the least recently used
+        self.assertIsNotNone(self.cache.get('b'))
+        time.sleep(0.01)
+        self.cache.save('d', fake_plot(100))
+        self.assertIsNone(self.cache.get('c'))
+        self.assertIsNotNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('d'))
+
+        # a plot bigger than the cache is kept anyway, until the next one
+        self.cache.save('e', fake_plot(1000))
+        self.assertIsNotNone(self.cache.get('e'))
+        self.assertEqual(len(os.listdir(self.cache.directory)), 1)
+
+
+class MediaStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = MediaStore(
+            'img_', '.png', tmp.name, ttl_seconds=100, max_bytes=250)
+
+    def age(self, name, seconds):
+        path = self.store.path(name)
+        when = time.time() - seconds
+        os.utime(path, (when, when))
+
+    def test_ttl(self):
+        for name in 'abc':
+            self.store.save(name, fake_plot(10))
+        self.age('a', 200)
+        self.age('b', 50)
+        # not ours
+        other = os.path.join(self.store.directory, 'plot_old.png')
+        fake_plot(10)(other)
+        os.utime(other, (0, 0))
+
+        with self.assertLogs('crossbot.mediastore', 'INFO'):
+            stats = self.store.sweep()
+        self.assertEqual(stats, SweepStats(1, 0, 2, 20))
+        self.assertFalse(self.store.touch('a'))
+        self.assertTrue(self.store.touch('b'))
+        self.assertTrue(os.path.exists(other))
+
+        # b was just used, so c is the older one now
+        self.age('c', 90)
+        self.assertEqual(
+            self.store.sweep(now=time.time() + 75), SweepStats(1, 0, 1, 10))
+        self.assertTrue(self.store.touch('b'))
+
+    def test_quota_and_tmp_files(self):
+        for name in 'abc':
+            self.store.save(name, fake_plot(100))
+            time.sleep(0.01)
+        abandoned = self.store.path('d') + '.123.456.tmp'
+        fake_plot(100)(abandoned)
+
+        self.assertEqual(
+            sorted(os.listdir(self.store.directory)),
+            ['img_b.png', 'img_c.png', 'img_d.png.123.456.tmp'])
+        self.store.sweep(now=time.time() + TMP_SECONDS + 1)
+        self.assertEqual(os.listdir(self.store.directory), [])
+
+    def test_cron(self):
+        with patch('crossbot.cron.PLOT_CACHE',
+                   PlotCache(self.store.directory, ttl_seconds=100)):
+            path = os.path.join(self.store.directory, 'plot_a.png')
+            fake_plot(10)(path)
+            os.utime(path, (0, 0))
+            self.assertEqual(
+                SweepMedia().do(),
+                'Deleted 1 expired and 0 least recently used plots, '
+                '0 left (0 bytes)')
+
+
+SPEC = {
+    'size': (400, 600, 100),
+    'series': [{
+        'label': 'alice',
+        'dates': [parse_date('2018-08-01'),
+                  parse_date('2018-08-02')],
+        'values': [10, 20],
+        'fmt': '-o',
+        'color': None,
+        'alpha': 0.7,
+    }],
+    'kind':
+    'lines',
+    'colormap':
+    'nipy_spectral',
+    'first':
+    parse_date('2018-08-01'),
+    'last':
+    parse_date('2018-08-03'),
+    'yscale':
+    'linear',
+    'ytick':
+    30,
+    'yformat':
+    'minutes',
+    'ylabel':
+    None,
+}
+
+
+class StartupTests(SimpleTestCase):
+    def test_lazy_imports(self):
+        worker = bench_startup.Command().run_worker(eager=False)
+        self.assertFalse(worker['numpy'])
+
+
+class RenderTests(SimpleTestCase):
+    def test_threads(self):
+        specs = [
+            bench_render.make_spec(days, users, seed=seed)
+            for seed, (days, users) in enumerate([(7, 3), (30, 8), (120, 5)])
+        ]
+        specs.append(
+            dict(
+                specs[0],
+                kind='bars',
+                series=[{
+                    'label': 'alice',
+                    'starts': [parse_date('2018-12-26')],
+                    'lengths': [3],
+                }]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+
+            def draw(job):
+                i, spec = job
+                path = os.path.join(tmp, '{}.png'.format(i))
+                return imread(render.render(spec, path))
+
+            expected = [
+                draw(('expected{}'.format(i), spec))
+                for i, spec in enumerate(specs)
+            ]
+            jobs = list(enumerate(specs * 4))
+            with ThreadPoolExecutor(8) as executor:
+                images = list(executor.map(draw, jobs))
+
+        for (i, _), image in zip(jobs, images):
+            self.assertTrue(np.array_equal(image, expected[i % len(specs)]))
+
+
+class RenderPoolTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def pool(self, **kwargs):
+        pool = RenderPool(workers=1, **kwargs)
+        self.addCleanup(pool.stop)
+        return pool
+
+    def render(self, pool, spec=SPEC):
+        path = os.path.join(self.directory, 'plot.png')
+        self.assertEqual(pool.render(spec, path), path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(4), b'\x89PNG')
+        os.remove(path)
+
+    def test_not_started_on_import(self):
+        # only gunicorn's workers should start render processes
+        worker = bench_startup.Command().run_worker(eager=False)
+        self.assertEqual(worker['children'], 0)
+
+    def test_started_by_gunicorn_workers(self):
+        conf = runpy.run_path(
+            os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+        with patch.object(RENDER_POOL, 'start') as start:
+            conf['post_worker_init'](None)
+        start.assert_called_once_with()
+
+    def test_render(self):
+        pool = self.pool(max_renders=2)
+        for _ in range(3):
+            self.render(pool)
+        self.assertEqual(pool.stats(), {
+            'renders': 3,
+            'failed': 0,
+            'recycled': 1
+        })
+
+        # or in this process
+        self.render(RenderPool(workers=0))
+
+    def test_errors(self):
+        pool = self.pool()
+        with self.assertRaises(RenderError) as cm:
+            self.render(pool, dict(SPEC, kind='bars'))
+        self.assertIn('KeyError', str(cm.exception))
+        # the process is replaced
+        self.render(pool)
+        self.assertEqual(pool.stats()['failed'], 1)
+
+    def test_timeout(self):
+        pool = self.pool(timeout=0.001)
+        with self.assertRaisesRegex(RenderError, 'took more than'):
+            self.render(pool)
+        pool.timeout = 30
+        self.render(pool)
+
+    def test_memory_limit(self):
+        # not even enough to import matplotlib
+        pool = self.pool(memory_bytes=64 * 1024 * 1024)
+        with self.assertRaisesRegex(RenderError, 'exited'):
+            self.render(pool)
+
+
+class OutboxTests(SlackTestCase):
+    def setUp(self):
+        super().setUp()
+        self.slack_down = False
+
+    def slack_chat_post(self, method, url, headers, params):
+        if self.slack_down:
+            return MockResponse({'ok': False, 'error': 'fatal_error'}, 200)
+        return super().slack_chat_post(method, url, headers, params)
+
+    def retry_now(self):
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+
+    def test_add_while_slack_is_down(self):
+        self.slack_down = True
+        response = self.slack_post(text='add :10 2018-08-01')
+        self.assertIn('Submitted', response['text'])
+
+        # the time is saved, the message is waiting
+        alice = CBUser.objects.get(slackid='UALICE')
+        self.assertEqual(len(alice.minicrosswordtime_set.all()), 1)
+        pending = OutboxMessage.objects.get()
+        self.assertEqual(pending.attempts, 1)
+        self.assertEqual(pending.text, 'add :10 2018-08-01')
+        self.assertEqual(self.messages, [])
+
+        # not due yet, so nothing happens
+        self.slack_down = False
+        self.assertEqual(outbox.drain(), 0)
+
+        self.retry_now()
+        self.assertEqual(outbox.drain(), 1)
+        self.assertEqual(self.messages[-1]['text'], 'add :10 2018-08-01')
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_channel_order(self):
+        OutboxMessage.enqueue('C1', 'first', 'fire')
+        OutboxMessage.enqueue('C2', 'other channel')
+        OutboxMessage.enqueue('C1', 'second')
+
+        # a failing message holds back the rest of its channel only
+        self.slack_down = True
+        outbox.drain()
+        self.slack_down = False
+        OutboxMessage.objects.filter(channel='C2').update(
+            next_attempt=timezone.now())
+        outbox.drain()
+        self.assertEqual([m['text'] for m in self.messages], ['other channel'])
+
+        self.retry_now()
+        outbox.drain()
+        self.assertEqual([m['text'] for m in self.messages],
+                         ['other channel', 'first', 'second'])
+
+    def test_claimed_messages_are_skipped(self):
+        msg = OutboxMessage.enqueue('C1', 'hello')
+        self.assertTrue(msg.claim(timezone.now()))
+        self.assertFalse(msg.claim(timezone.now()))
+
+        # another drainer holds the lease
+        self.assertEqual(outbox.drain(), 0)
+        self.assertEqual(self.messages, [])
+
+    def test_gives_up(self):
+        self.slack_down = True
+        OutboxMessage.enqueue('C1', 'doomed')
+        OutboxMessage.enqueue('C1', 'fine')
+        with patch('crossbot.models.OUTBOX_MAX_ATTEMPTS', 2):
+            outbox.drain()
+            self.retry_now()
+            # the second failure drops the first message
+            outbox.drain()
+            self.assertEqual(OutboxMessage.objects.get().text, 'fine')
+
+            self.slack_down = False
+            self.retry_now()
+            outbox.drain()
+        self.assertEqual([m['text'] for m in self.messages], ['fine'])
+        self.assertFalse(OutboxMessage.objects.exists())
 
 
 class AnnouncementTests(SlackTestCase):
@@ -503,3 +2310,57 @@ class AnnouncementTests(SlackTestCase):
     def test_morning_announcement_run(self):
         self.morning_announcement.do()
         self.assertEquals(len(self.messages), 1)
+
+
+class UserStatsCronTests(TestCase):
+    def setUp(self):
+        cache.delete(RollUserStats.ROLLED_KEY)
+        self.addCleanup(cache.delete, RollUserStats.ROLLED_KEY)
+
+    def test_roll(self):
+        users = [
+            CBUser.from_slackid(slackid, slackid.lower())
+            for slackid in ['UALICE', 'UBOB', 'UCAROL']
+        ]
+        yesterday = parse_date('now') - timedelta(days=1)
+        for user in users:
+            user.add_mini_crossword_time(10, yesterday)
+        users[0].add_easy_sudoku_time(100, yesterday)
+        UserStats.rebuild(MiniCrosswordTime, yesterday)
+        # carol's times are all deleted
+        users[2].remove_mini_crossword_time(yesterday)
+
+        with self.assertLogs('crossbot.cron', 'WARNING'):
+            message = RollUserStats().do(budget=-1)
+        self.assertIn('0 users, out of time at mini_crossword', message)
+        self.assertEqual(UserStats.as_of_date(MiniCrosswordTime), yesterday)
+
+        # every call to the clock takes a second, so there's time for the
+        # first chunk, and not the second
+        with patch(
+                'crossbot.cron.time.monotonic', side_effect=itertools.count()):
+            with self.assertLogs('crossbot.cron', 'WARNING'):
+                message = RollUserStats().do(budget=2.5, chunk_size=1)
+        self.assertIn('1 users, out of time at mini_crossword', message)
+        self.assertEqual(users[0].stats(MiniCrosswordTime).as_of,
+                         parse_date('now'))
+        self.assertEqual(users[1].stats(MiniCrosswordTime).as_of, yesterday)
+
+        # the next run picks up from there
+        with self.assertLogs('crossbot.cron', 'INFO') as logs:
+            message = RollUserStats().do(chunk_size=1)
+        self.assertIn('recomputed 3 users', message)
+        self.assertEqual(len(logs.output), 3)
+        self.assertEqual(
+            UserStats.as_of_date(MiniCrosswordTime), parse_date('now'))
+        self.assertEqual(users[0].stats(MiniCrosswordTime).played, 1)
+        self.assertIsNone(users[2].stats(MiniCrosswordTime))
+        self.assertEqual(users[0].stats(EasySudokuTime).median, 100)
+
+        self.assertIn('recomputed 0 users', RollUserStats().do())
+
+    def test_rollups(self):
+        alice = CBUser.from_slackid('UALICE', 'alice')
+        alice.add_mini_crossword_time(10, parse_date('now'))
+        self.assertIn('mini_crossword 2, crossword 0', RollupTimes().do())
+        self.assertTrue(TimeRollup.built(MiniCrosswordTime))
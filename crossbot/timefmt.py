@@ -0,0 +1,10 @@
+"""Solve times as people read them, like 1:05.
+
+Without Django, so crossbot.render can use it in its own processes.
+"""
+
+
+def fmt_seconds(seconds):
+    """`seconds` as m:ss, rounded to the second."""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return '{}:{:02}'.format(minutes, seconds)
@@ -0,0 +1,145 @@
+"""Per-worker columnar copies of each game's times, for analytics.
+
+Each process keeps a game's times as a few numpy arrays (see Columns), so
+commands like plot don't have to query and build a model instance
+for every time, every time. Before each use the copy is brought up to date:
+if the game's DataVersion has changed, only the rows added since are pulled,
+and deleted rows are found by comparing row counts. Every so often the whole
+thing is reloaded anyway, to pick up edits made outside of add_time and
+remove_time (e.g. in the admin).
+"""
+
+import datetime
+import threading
+import time
+
+from collections import namedtuple
+
+import numpy as np
+
+from django.db import transaction
+
+from .models import DataVersion
+from .settings import TIMESERIES_RELOAD_SECONDS
+
+# `users` is a list of slackids, and the rest are arrays with an entry per
+# time: its id, the index of its user in `users`, the date as an ordinal, the
+# seconds, and when it was added in microseconds since the epoch (0 if unknown)
+Columns = namedtuple(
+    'Columns',
+    ['users', 'ids', 'user_index', 'dates', 'seconds', 'timestamps'])
+
+DTYPES = (np.int64, np.int32, np.int32, np.int32, np.int64)
+
+
+def _take(columns, index):
+    return Columns(columns.users, *(column[index] for column in columns[1:]))
+
+
+def _concat(a, b):
+    return Columns(b.users,
+                   *(np.concatenate(pair) for pair in zip(a[1:], b[1:])))
+
+
+class TimeSeries:
+    """The times of `time_model`, as Columns kept up to date on demand.
+
+    Columns are never changed in place, so callers can keep using the ones
+    they got while other threads refresh. Like IdentityCache, nothing read
+    inside a transaction is kept until it commits.
+    """
+
+    def __init__(self, time_model):
+        self.time_model = time_model
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # users are only ever appended, so old Columns' indexes stay valid
+        self.users = []
+        self.user_indexes = {}
+        # (columns, version, when they were last loaded from scratch)
+        self.state = (None, None, 0)
+
+    def user_index(self, slackid):
+        if slackid not in self.user_indexes:
+            self.user_indexes[slackid] = len(self.users)
+            self.users.append(slackid)
+        return self.user_indexes[slackid]
+
+    def load(self, qs):
+        rows = [(pk, self.user_index(slackid), date.toordinal(), seconds,
+                 round(ts.timestamp() * 1e6) if ts else 0)
+                for pk, slackid, date, seconds, ts in qs.values_list(
+                    'id', 'user_id', 'date', 'seconds', 'timestamp')]
+        columns = zip(*rows) if rows else [()] * len(DTYPES)
+        return Columns(
+            self.users,
+            *(np.array(column, dtype=dtype)
+              for column, dtype in zip(columns, DTYPES)))
+
+    def refresh(self):
+        """Bring the columns up to date, and return them."""
+        # read the version first, so a change while we load isn't missed
+        version = DataVersion.get(self.time_model.game)
+        with self.lock:
+            columns, old_version, loaded_at = self.state
+            now = time.monotonic()
+            if (columns is None
+                    or now - loaded_at > TIMESERIES_RELOAD_SECONDS):
+                columns = self.load(self.time_model.objects.all())
+                loaded_at = now
+            elif version != old_version:
+                columns = self.update(columns)
+            else:
+                return columns
+
+            def save(state=(columns, version, loaded_at)):
+                self.state = state
+
+            # rows from an uncommitted transaction might get rolled back
+            transaction.on_commit(save)
+            return columns
+
+    def update(self, columns):
+        objects = self.time_model.objects
+        last_id = columns.ids.max() if len(columns.ids) else 0
+        columns = _concat(columns, self.load(objects.filter(id__gt=last_id)))
+
+        count = objects.count()
+        if len(columns.ids) != count:
+            # some were deleted
+            ids = np.fromiter(objects.values_list('id', flat=True), np.int64)
+            columns = _take(columns, np.isin(columns.ids, ids))
+        if len(columns.ids) != count:
+            # some were added out of id order, so just start over
+            columns = self.load(objects.all())
+        return columns
+
+    def between(self, start, end):
+        """The columns for dates from `start` to `end`, inclusive."""
+        columns = self.refresh()
+        dates = columns.dates
+        return _take(columns,
+                     (dates >= start.toordinal()) & (dates <= end.toordinal()))
+
+    def dates(self, user):
+        """The set of dates that `user` has a time for."""
+        columns = self.refresh()
+        if user.pk not in self.user_indexes:
+            return set()
+        index = self.user_indexes[user.pk]
+        ordinals = columns.dates[columns.user_index == index]
+        return {datetime.date.fromordinal(o) for o in ordinals.tolist()}
+
+
+_SERIES = {}
+_SERIES_LOCK = threading.Lock()
+
+
+def series(time_model):
+    """This process's TimeSeries for `time_model`."""
+    with _SERIES_LOCK:
+        if time_model not in _SERIES:
+            _SERIES[time_model] = TimeSeries(time_model)
+        return _SERIES[time_model]
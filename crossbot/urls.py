@@ -8,6 +8,7 @@ urlpatterns = [
     path('slack/', views.slash_command, name='slash_command'),
     path('rest-api/times/<time_model>/', views.times_rest_api),
     path('rest-api/times/', views.times_rest_api),
+    path('metrics/', views.metrics_view, name='metrics'),
     path(
         'plot/',
         login_required(
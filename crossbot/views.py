@@ -1,9 +1,11 @@
+import datetime
 import hashlib
 import hmac
 import time
 import logging
 
-from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.http import (HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden, JsonResponse)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.gzip import gzip_page
 from django.views.decorators.cache import cache_control
@@ -11,8 +13,10 @@ from django.contrib.auth.decorators import login_required
 
 import settings
 
+from . import metrics
 from .slack import handle_slash_command
-from .models import MiniCrosswordTime, CrosswordTime, EasySudokuTime
+from .models import CBUser, MiniCrosswordTime, CrosswordTime, EasySudokuTime
+from .settings import METRICS_TOKEN
 
 logger = logging.getLogger(__name__)
 
@@ -74,19 +78,50 @@ def times_rest_api(request, time_model='minicrossword'):
     # if 'start' in request.GET:
     #     start_date = datetime.datetime.strptime(request.GET['start'], '%Y-%m-%d').date()
 
-    times = (TIME_MODELS[time_model].all_times().order_by('date').
-             select_related('user'))
+    # only import numpy when this is used
+    from .timeseries import series
+
+    columns = series(TIME_MODELS[time_model]).refresh()
+    order = columns.dates.argsort(kind='stable')
+    slackids = [columns.users[i] for i in columns.user_index[order].tolist()]
+    ordinals = columns.dates[order].tolist()
+    seconds = columns.seconds[order].tolist()
+
+    names = {
+        pk: str(user)
+        for pk, user in CBUser.objects.in_bulk(set(slackids)).items()
+    }
+    dates = {o: datetime.date.fromordinal(o) for o in set(ordinals)}
 
     return JsonResponse({
         'times': [{
-            'user': str(t.user),
-            'date': t.date,
-            'seconds': t.seconds
-        } for t in times],
+            'user': names[pk],
+            'date': dates[o],
+            'seconds': s
+        } for pk, o, s in zip(slackids, ordinals, seconds)],
         'timemodel':
         time_model,
         'start':
-        times[0].date,
+        dates[ordinals[0]],
         'end':
-        times[len(times) - 1].date,
+        dates[ordinals[-1]],
     })
+
+
+def metrics_authorized(request):
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(METRICS_TOKEN) and hmac.compare_digest(
+        auth, 'Bearer ' + METRICS_TOKEN)
+
+
+def metrics_view(request):
+    """Serve every worker's metrics in the Prometheus text format."""
+    if not metrics_authorized(request):
+        return HttpResponseForbidden('Not allowed')
+
+    return HttpResponse(
+        metrics.render(metrics.REGISTRY.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8')
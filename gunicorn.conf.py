@@ -0,0 +1,11 @@
+"""Gunicorn settings, passed with --config by `make deploy` and the Dockerfile.
+"""
+
+
+def post_worker_init(worker):
+    """Start the worker's render processes as soon as it has loaded the app,
+    so they're done importing matplotlib by the time the first plot comes in.
+    Only the web workers do this, not every process that imports crossbot.
+    """
+    from crossbot.renderpool import RENDER_POOL
+    RENDER_POOL.start()
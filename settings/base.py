@@ -105,6 +105,15 @@ DATABASES = {
     },
 }
 
+# Shared by all the gunicorn workers on this machine, which use it to
+# invalidate each other's in-process caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -193,6 +202,10 @@ warnings.filterwarnings(
 CRON_CLASSES = [
     "crossbot.cron.ReleaseAnnouncement",
     "crossbot.cron.MorningAnnouncement",
+    "crossbot.cron.DrainOutbox",
+    "crossbot.cron.RollUserStats",
+    "crossbot.cron.RollupTimes",
+    "crossbot.cron.SweepMedia",
 ]
 
 # OAuth setup
@@ -8,6 +8,9 @@ SECRET_KEY = 'my_django_secret_key'
 SLACK_SECRET_SIGNING_KEY = b'my_secret_slack_key'
 SLACK_OAUTH_ACCESS_TOKEN = 'my_slack_oauth'
 SLACK_OAUTH_BOT_ACCESS_TOKEN = 'my_slack_bot_oauth'
+# point this at a stub, like the one `./manage.py loadtest` runs
+CROSSBOT_SLACK_API_URL = os.environ.get('CROSSBOT_SLACK_API_URL',
+                                        'https://slack.com/api/')
 
 # Slack OAuth stuff
 SOCIAL_AUTH_SLACK_KEY = 'slack-client-id'